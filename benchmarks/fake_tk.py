@@ -0,0 +1,125 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: A stand-in for tkinter so the GUI can be built and timed without a screen (like FakeLCD and FakeGPIO
+# for the hardware). Widgets just remember their options, the text in Text widgets and what after() was asked to run.
+# Message boxes answer yes straight away. Call install() before anything from smartbank.gui is imported.
+#####################################################################################################################
+
+import sys
+import types
+
+N, S, E, W = "n", "s", "e", "w"
+NSEW = "nsew"
+END = "end"
+
+
+class TclError(Exception):
+    pass
+
+
+# every widget (and the window itself) is one of these
+class Widget:
+    def __init__(self, master=None, *args, **options):
+        self.master = master
+        self.options = {"text": ""}
+        self.options.update(options)
+        self.content = ""  # what a Text widget has in it
+        self.value = ""  # what a Combobox has picked
+        self.scheduled = []  # (ms, function) for each after() call
+        self.shown = True
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def __getitem__(self, key):
+        return self.options.get(key)
+
+    def configure(self, *args, **options):
+        self.options.update(options)
+
+    config = configure
+
+    def grid(self, *args, **options):
+        pass
+
+    place = pack = bind = protocol = grid
+
+    def title(self, text=None):
+        self.options["title"] = text
+
+    def geometry(self, size=None):
+        pass
+
+    def lift(self):
+        pass
+
+    focus_set = update = update_idletasks = mainloop = lift
+
+    def destroy(self):
+        self.shown = False
+
+    def withdraw(self):
+        self.shown = False
+
+    def deiconify(self):
+        self.shown = True
+
+    def after(self, ms, function=None, *args):
+        self.scheduled.append((ms, function))
+        return "after#{}".format(len(self.scheduled))
+
+    def after_cancel(self, after_id):
+        pass
+
+    def delete(self, first, last=None):
+        self.content = ""
+
+    def insert(self, index, text):
+        self.content += text
+
+    def set(self, *args):
+        self.value = args[0] if len(args) == 1 else args
+
+    def get(self):
+        return self.value
+
+
+class Variable:
+    def __init__(self, master=None, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def answer(*args, **options):
+    return True
+
+
+# makes "import tkinter" (and tkinter.ttk & tkinter.messagebox) give these stand-ins from now on
+def install():
+    tkinter = types.ModuleType("tkinter")
+    ttk = types.ModuleType("tkinter.ttk")
+    messagebox = types.ModuleType("tkinter.messagebox")
+    for name in ("N", "S", "E", "W", "NSEW", "END", "TclError"):
+        setattr(tkinter, name, globals()[name])
+    for name in ("Tk", "Toplevel", "Frame", "Label", "Button", "Radiobutton", "Entry", "Text", "Canvas",
+                 "Scrollbar"):
+        setattr(tkinter, name, type(name, (Widget,), {}))
+    for name in ("StringVar", "IntVar", "DoubleVar", "BooleanVar"):
+        setattr(tkinter, name, type(name, (Variable,), {}))
+    for name in ("Style", "Frame", "Label", "Button", "Radiobutton", "Entry", "Scrollbar", "Progressbar",
+                 "Combobox"):
+        setattr(ttk, name, type(name, (Widget,), {}))
+    for name in ("askokcancel", "askyesno", "showwarning", "showinfo", "showerror"):
+        setattr(messagebox, name, answer)
+    tkinter.__all__ = [name for name in vars(tkinter) if not name.startswith("_")]  # for "from tkinter import *"
+    ttk.__all__ = [name for name in vars(ttk) if not name.startswith("_")]
+    tkinter.ttk = ttk
+    tkinter.messagebox = messagebox
+    sys.modules["tkinter"] = tkinter
+    sys.modules["tkinter.ttk"] = ttk
+    sys.modules["tkinter.messagebox"] = messagebox
@@ -0,0 +1,58 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Measures how long the Smart Piggy Bank takes to start, from launching python to the first frame being
+# drawn (the LCD in headless mode, the window in GUI mode). Each mode is started fresh several times in an empty
+# folder and the best and median times are printed.
+# Run it from the top folder: python benchmarks/startup.py [--runs 10] [--gui]
+#####################################################################################################################
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # the folder with the smartbank package in it
+
+MODES = {
+    "headless": ["--headless", "--lcd", "fake", "--gpio", "fake"],
+    "gui": ["--lcd", "fake", "--gpio", "fake"],
+}
+
+
+# starts the bank once and returns (total ms including python starting up, ms reported by the bank itself)
+def start_once(args, folder):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    begin = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "smartbank", "--startup-only"] + args, cwd=folder, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - begin) * 1000
+    for line in result.stdout.splitlines():
+        if line.startswith("startup_ms="):
+            return wall, float(line.split("=", 1)[1])
+    raise RuntimeError("no startup time printed:\n" + result.stdout + result.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Piggy Bank startup benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--gui", action="store_true", help="also time the GUI (needs a display)")
+    args = parser.parse_args(argv)
+
+    modes = ["headless", "gui"] if args.gui else ["headless"]
+    print("{:<10}{:>14}{:>14}{:>14}{:>14}".format("mode", "best total", "median total", "best bank", "median bank"))
+    for mode in modes:
+        walls, inside = [], []
+        with tempfile.TemporaryDirectory() as folder:
+            for _ in range(args.runs):
+                wall, ms = start_once(MODES[mode], folder)
+                walls.append(wall)
+                inside.append(ms)
+        print("{:<10}{:>11.1f} ms{:>11.1f} ms{:>11.1f} ms{:>11.1f} ms".format(
+            mode, min(walls), statistics.median(walls), min(inside), statistics.median(inside)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Times the paths every coin goes through, with no screen or hardware needed (fake Tk, FakeGPIO and
+# FakeLCD). The results are saved as JSON and compared with a saved baseline, so a change that slows down coin
+# handling shows up before it gets onto the piggy banks.
+#   coin_latency    - from the GPIO edge to buttonpress() being done (the GUI's poll wait of up to COIN_POLL_MS
+#                     comes on top of this)
+#   history_insert  - adding one entry to the history box once it already has 0 to 100,000 entries
+#   budget_window   - building the budget window the first time, and showing it again after that
+#   lcd_writes      - LCD line writes per coin, one coin at a time and with coins coming in all at once
+#   persistence     - saving one transaction in the journal (batched syncs & a sync every time) and in SQLite
+#   replication     - bytes sent to a local sync hub per transaction, and what syncing adds to each deposit
+#   bulk            - exporting a database to CSV and importing it back, per transaction
+#   parent_api      - what a deposit takes while hundreds of parents' apps keep asking for the balance, and how long
+#                     the API takes per request
+#   rules           - checking the rules on each deposit with 100,000 jar amounts to reach, against no rules at all
+#   schedule        - catching up on the allowance & interest when the bank starts after a week off and after 10
+#                     years off (it should be the same)
+#   tracing         - recording one event in the ring, and skipping one whose level isn't wanted, in nanoseconds
+#   vision          - counting a photo of a tray of 100 coins (only if NumPy & OpenCV are installed)
+#   trace_replay    - replaying made-up coin traces through the coin buttons (with bounce) and the coin acceptor,
+#                     per pin transition
+#   shared_coins    - from a separate coin process sending a coin (shm.py) to the bank having it, one coin every ms
+# Run it from the top folder:
+#   python benchmarks/suite.py                    prints the results and compares them with baseline.json
+#   python benchmarks/suite.py --save-baseline    makes the current results the new baseline (do this on a pi)
+#   python benchmarks/suite.py --output new.json  also saves the results
+# It exits with 1 if anything got slower than the baseline by more than --tolerance (or SMALL_TOLERANCE for results
+# under a millisecond, which one busy moment on the machine can make much slower).
+#####################################################################################################################
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)  # the folder with the smartbank package in it
+sys.path.insert(0, ROOT)
+
+import fake_tk
+
+fake_tk.install()  # has to happen before smartbank.gui imports tkinter
+
+from smartbank import gui
+from smartbank.bank import Bank
+from smartbank.coin_input import CoinInput, FakeGPIO
+from smartbank.history_view import HistoryView
+from smartbank.journal import Journal
+from smartbank.lcd_render import LCDRenderer, FakeLCD
+from smartbank.ledger import Ledger
+
+BASELINE_FILE = os.path.join(HERE, "baseline.json")
+TOLERANCE = 0.5  # how much slower (50%) a result can be than the baseline before it counts as a regression
+NOISE = 1.0  # differences smaller than this (in the result's own unit) are never counted
+SMALL_TOLERANCE = 1.0  # results under a millisecond (in _us) can be twice the baseline, a busy moment is most of them
+SMALL_US = 1000.0
+PENNY = 24  # the pin for the penny button
+
+
+# a clock for the coin buttons that moves a whole second on every press, so no press is ever thrown away as a bounce
+class SteppingClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+# the median and 95th percentile of a list of times (in seconds), in microseconds
+def summary(times, name, results):
+    times = sorted(times)
+    results[name + "_us_p50"] = statistics.median(times) * 1e6
+    results[name + "_us_p95"] = times[int(len(times) * 0.95) - 1] * 1e6
+
+
+# builds the whole GUI on the fake Tk, saving to a journal in the current folder. max_rate is how often the LCD
+# can be written
+def make_gui(max_rate=10):
+    lcd = LCDRenderer(FakeLCD(), max_rate=max_rate)
+    coins = CoinInput(FakeGPIO(), clock=SteppingClock())
+    bank = Bank(lcd, coins)
+    bank.open()
+    window = gui.Tk()
+    app = gui.GUI(window, bank)
+    app.setupGUI()
+    return bank, app
+
+
+def coin_latency(folder, results, coins=2000):
+    bank, app = make_gui()
+    times = []
+    for _ in range(coins):
+        begin = time.perf_counter()
+        bank.coins.gpio.press(PENNY)  # what the GPIO thread does on a real edge
+        app.poll_coins()  # what the GUI's next poll does
+        times.append(time.perf_counter() - begin)
+    summary(times, "coin_latency", results)
+    bank.close()
+
+
+# the median time per insert of the quickest of rounds batches at each size (the quickest, so a batch that the
+# machine happened to be busy for doesn't count as the history box getting slower)
+def history_insert(results, sizes=(0, 1000, 10000, 100000), batch=100, rounds=25):
+    view = HistoryView(gui.Tk())
+    view.reset("$0.00")
+    added = 0
+    for size in sizes:
+        while added < size:
+            view.add("+ $0.01", "\t$0.00")
+            added += 1
+        medians = []
+        for _ in range(rounds):
+            times = []
+            for _ in range(batch):
+                begin = time.perf_counter()
+                view.add("+ $0.01", "\t$0.00")
+                times.append(time.perf_counter() - begin)
+            added += batch
+            medians.append(statistics.median(times))
+        results["history_insert_at_{}_us_p50".format(size)] = min(medians) * 1e6
+
+
+# building the window is timed on builds new windows and the quickest is kept, since it's one call of a few hundred
+# microseconds that one busy moment could double
+def budget_window(folder, results, reopens=200, builds=50):
+    bank, app = make_gui()
+    times = []
+    for _ in range(builds):
+        if app.budget is not None:  # thrown away so the next open builds it again
+            bank.ledger.unsubscribe(app.budget.changed)
+            app.budget = None
+        begin = time.perf_counter()
+        app.open_window2()
+        times.append(time.perf_counter() - begin)
+    results["budget_window_build_us"] = min(times) * 1e6
+    times = []
+    for _ in range(reopens):
+        app.budget.hide()
+        begin = time.perf_counter()
+        app.open_window2()
+        times.append(time.perf_counter() - begin)
+    summary(times, "budget_window_reopen", results)
+    times = []
+    for _ in range(reopens):  # a coin with the budget window open (it updates its labels & bar)
+        begin = time.perf_counter()
+        app.buttonpress(1, mode="1")
+        times.append(time.perf_counter() - begin)
+    summary(times, "buttonpress_budget_open", results)
+    bank.close()
+
+
+def lcd_writes(folder, results, coins=200):
+    # one coin at a time, letting the LCD catch up after each (a child dropping coins in one by one)
+    bank, app = make_gui(max_rate=10000)
+    bank.lcd.flush()
+    before = bank.lcd.lcd.writes
+    for _ in range(coins):
+        app.buttonpress(25, mode="1")
+        bank.lcd.flush()
+    results["lcd_writes_per_coin_paced"] = (bank.lcd.lcd.writes - before) / coins
+    bank.close()
+    # all the coins at once (a jar being emptied in), at the normal LCD rate
+    bank, app = make_gui()
+    bank.lcd.flush()
+    before = bank.lcd.lcd.writes
+    for _ in range(coins):
+        app.buttonpress(25, mode="1")
+    bank.lcd.flush()
+    results["lcd_writes_per_coin_burst"] = (bank.lcd.lcd.writes - before) / coins
+    results["lcd_requests_per_coin"] = bank.lcd.requested / (coins + 1)
+    bank.close()
+
+
+def persistence(folder, results, transactions=2000):
+    setups = [
+        ("journal", lambda: Journal(os.path.join(folder, "j1.txt"), os.path.join(folder, "s1.txt"))),
+        ("journal_sync_each", lambda: Journal(os.path.join(folder, "j2.txt"), os.path.join(folder, "s2.txt"),
+                                              sync_batch=1)),
+    ]
+    for name, make in setups:
+        journal = make()
+        journal.load()
+        ledger = Ledger.from_journal(journal)
+        syncs = journal.syncs
+        times = []
+        for _ in range(transactions):
+            begin = time.perf_counter()
+            ledger.deposit(1)
+            times.append(time.perf_counter() - begin)
+        summary(times, "persist_" + name, results)
+        results["persist_{}_syncs_per_1000".format(name)] = (journal.syncs - syncs) * 1000 / transactions
+        journal.close()
+
+    from smartbank.store import AccountStore
+    store = AccountStore(os.path.join(folder, "bench.db"))
+    ledger = Ledger.from_journal(store.account("Bench"))
+    times = []
+    for _ in range(transactions):
+        begin = time.perf_counter()
+        ledger.deposit(1)
+        times.append(time.perf_counter() - begin)
+    summary(times, "persist_sqlite", results)
+    store.close()
+
+
+def replication(folder, results, transactions=2000):
+    from smartbank.sync import SyncClient, SyncHub
+    hub = SyncHub(os.path.join(folder, "hub.json"), port=0, host="127.0.0.1")
+    journal = Journal(os.path.join(folder, "j.txt"), os.path.join(folder, "s.txt"))
+    journal.load()
+    ledger = Ledger.from_journal(journal)
+    client = SyncClient(journal, "127.0.0.1", hub.port, "bench", os.path.join(folder, "sync.json"))
+    client.start()
+    times = []
+    for _ in range(transactions):
+        begin = time.perf_counter()
+        ledger.deposit(1)
+        times.append(time.perf_counter() - begin)
+    client.stop()  # sends what's left
+    summary(times, "persist_journal_synced", results)
+    results["sync_bytes_per_transaction"] = client.sent_bytes / transactions
+    journal.close()
+    hub.stop()
+
+
+def bulk(folder, results, transactions=100000, accounts=10):
+    from smartbank import export
+    from smartbank.store import AccountStore
+
+    def rows():  # a made-up household archive, a transaction every 10 minutes for each child
+        for account in range(accounts):
+            yield (export.ACCOUNT_ROW, "child{}".format(account), None, None, 0, 0, 0, 0, 500, "10,20,70", "0,0,0")
+            for n in range(transactions // accounts):
+                yield (export.TRANSACTION_ROW, "child{}".format(account), 1.6e9 + n * 600.0, "D", 25, 2, 5, 18,
+                       None, None, None)
+
+    source = AccountStore(os.path.join(folder, "source.db"))
+    export.import_rows(source, rows())
+    path = os.path.join(folder, "backup.csv")
+    begin = time.perf_counter()
+    with open(path, "w", newline="") as f:
+        export.write_csv(export.store_rows(source), f)
+    results["bulk_export_csv_us_per_transaction"] = (time.perf_counter() - begin) * 1e6 / transactions
+    source.close()
+    target = AccountStore(os.path.join(folder, "target.db"))
+    begin = time.perf_counter()
+    with open(path, newline="") as f:
+        export.import_rows(target, export.read_csv(f))
+    results["bulk_import_csv_us_per_transaction"] = (time.perf_counter() - begin) * 1e6 / transactions
+    target.close()
+
+
+def parent_api(folder, results, clients=200, requests=20):
+    import asyncio
+    import threading
+    from smartbank.parent_api import ParentAPI
+
+    request = b"GET /balances HTTP/1.1\r\nHost: bench\r\n\r\n"
+
+    async def client():  # one app on a kept-alive connection, asking again as soon as it has the answer
+        reader, writer = await asyncio.open_connection("127.0.0.1", api.port)
+        for _ in range(requests):
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = [line for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:")]
+            await reader.readexactly(int(length[0].split(b":")[1]))
+        writer.close()
+
+    async def household():
+        await asyncio.gather(*[client() for _ in range(clients)])
+
+    def coins():
+        while not done.is_set():
+            begin = time.perf_counter()
+            bank.ledger.deposit(1)
+            times.append(time.perf_counter() - begin)
+
+    api = ParentAPI(port=0)
+    bank = Bank(parent=api)
+    bank.open()
+    times = []
+    done = threading.Event()
+    depositor = threading.Thread(target=coins)
+    depositor.start()
+    begin = time.perf_counter()
+    asyncio.run(household())
+    results["parent_api_us_per_request"] = (time.perf_counter() - begin) * 1e6 / (clients * requests)
+    done.set()
+    depositor.join()
+    summary(times, "parent_deposit_under_load", results)
+    bank.close()
+
+
+def trace_replay(folder, results, presses=20000):
+    from smartbank import trace
+    values = list(trace.random_values(presses, seed=1))
+    for name, pin, transitions in (
+            ("buttons", None, trace.synthetic_presses(values, bounces=3, overlap=0.05, seed=1)),
+            ("acceptor", trace.ACCEPTOR_PIN, trace.synthetic_pulses(values))):
+        begin = time.perf_counter()
+        tally, count = trace.replay(transitions, pin)
+        results["trace_replay_{}_us_per_transition".format(name)] = (time.perf_counter() - begin) * 1e6 / count
+        if tally.coins != presses:  # it's only timed if it's right
+            raise SystemExit("the {} replay counted {} coins out of {}".format(name, tally.coins, presses))
+
+
+def rules(folder, results, deposits=2000, count=100000):
+    from smartbank.rules import Rules, Rule, JAR, EVERY, default_rules
+    from smartbank.jars import JARS
+    many = default_rules()
+    many[EVERY] += [Rule("Jar amount {}".format(n), JAR, n % len(JARS), n * 3) for n in range(count)]
+    for name, engine in (("none", None), ("100000", Rules(many))):
+        reached = []
+        if engine is not None:
+            engine.hook(reached.append)
+        bank = Bank(rules=engine)
+        bank.open()
+        times = []
+        for _ in range(deposits):
+            begin = time.perf_counter()
+            bank.ledger.deposit(5)
+            times.append(time.perf_counter() - begin)
+        bank.close()  # waits for the hooks
+        summary(times, "rules_{}_deposit".format(name), results)
+        if engine is not None and not reached:
+            raise SystemExit("no rules were reached")
+
+
+def schedule(folder, results, starts=50):
+    from decimal import Decimal
+    from smartbank import scheduler
+    plans = {scheduler.EVERY: [scheduler.Plan(scheduler.ALLOWANCE, 500, scheduler.WEEK),
+                               scheduler.Plan(scheduler.INTEREST, Decimal("0.01"), scheduler.MONTH)]}
+    now = [0.0]
+    clock = lambda: now[0]
+    for name, off in (("1_week", 7 * 86400), ("10_years", 3652 * 86400)):
+        times = []
+        for n in range(starts):
+            paid = "paid_{}_{}.json".format(name, n)
+            now[0] = 1.7e9
+            ledger = Ledger(10000)
+            scheduler.Scheduler(plans, paid, clock).open("Piggy Bank", ledger)  # starts counting from now
+            now[0] += off
+            begin = time.perf_counter()
+            payout = scheduler.Scheduler(plans, paid, clock).open("Piggy Bank", ledger)  # the next start up
+            times.append(time.perf_counter() - begin)
+            if payout is None or payout.allowance != 500 * (off // (7 * 86400)):
+                raise SystemExit("the {} catch up paid {}".format(name, payout))
+        results["schedule_catch_up_{}_us_p50".format(name)] = statistics.median(times) * 1e6
+
+
+def tracing_events(folder, results, events=200000):
+    from smartbank import tracing
+    tracer = tracing.Tracer(level=tracing.INFO)  # its own, so the rest of the suite's tracing isn't changed
+    for name, kind in (("recorded", tracing.DEPOSIT), ("skipped", tracing.COIN)):  # coins are only traced at debug
+        event = tracer.event
+        begin = time.perf_counter()
+        for n in range(events):
+            event(kind, 100, n, n)
+        results["tracing_event_{}_ns".format(name)] = (time.perf_counter() - begin) * 1e9 / events
+    if len(tracer.events()) != min(events, tracer.capacity):
+        raise SystemExit("the ring has {} events".format(len(tracer.events())))
+
+
+# the coin process for shared_coins, in its own python so it isn't sharing anything with the bank but the memory
+SENDER = """
+import sys, time
+sys.path.insert(0, {root!r})
+from smartbank.shm import CoinSender
+sender = CoinSender({name!r})
+for _ in range({coins}):
+    sender.send(time.monotonic(), {pin}, 1)
+    time.sleep(0.001)
+sender.close()
+"""
+
+
+def shared_coins(folder, results, coins=2000):
+    import subprocess
+    from smartbank import shm
+    name = "smartbank_bench_{}".format(os.getpid())
+    channel = shm.SharedChannel.create(name)
+    bank = Bank(coins=shm.SharedCoins(channel), shared=channel)
+    bank.open()
+    sender = subprocess.Popen([sys.executable, "-c", SENDER.format(root=ROOT, name=name, coins=coins, pin=PENNY)])
+    times = []
+    try:
+        for _ in range(coins):
+            coin = bank.coins.get(timeout=10)
+            times.append(time.monotonic() - coin.time)  # the same clock in both processes
+            bank.ledger.deposit(coin.value)
+    finally:
+        sender.wait()
+        bank.close()
+    summary(times, "shared_coin_latency", results)
+
+
+def vision(folder, results, trays=5):
+    try:
+        import cv2
+        import numpy
+    except ImportError:
+        return  # the rest of the bank doesn't need them, so neither does the suite
+    from smartbank import vision as coins_vision
+    camera = coins_vision.FakeCamera(coins=100, frames=trays, seed=1)
+    frames = list(camera)
+    begin = time.perf_counter()
+    for frame in frames:  # one tray at a time, like someone taking a photo of each
+        list(coins_vision.count_frames([frame], camera.pixels_per_mm))
+    results["vision_tray_of_100_ms"] = (time.perf_counter() - begin) * 1000 / trays
+
+
+# runs each benchmark in its own empty folder (the journal, snapshot & old save files are made in the current folder)
+def run_all():
+    results = {}
+    old = os.getcwd()
+    try:
+        for bench in (coin_latency, budget_window, lcd_writes, persistence, replication, bulk, parent_api,
+                      trace_replay, shared_coins, rules, schedule, tracing_events, vision):
+            with tempfile.TemporaryDirectory() as folder:
+                os.chdir(folder)
+                bench(folder, results)
+                os.chdir(old)
+    finally:
+        os.chdir(old)
+    history_insert(results)
+    return results
+
+
+# the names of results that got worse than the baseline by more than tolerance (everything here is lower = better).
+# The 95th percentiles are only shown, they jump around too much from run to run to fail on, and results of less
+# than a millisecond get at least SMALL_TOLERANCE
+def regressions(results, baseline, tolerance):
+    worse = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if name.endswith("_p95"):
+            continue
+        allowed = max(tolerance, SMALL_TOLERANCE) if "_us" in name and old < SMALL_US else tolerance
+        if new is not None and new > old * (1 + allowed) and new - old > NOISE:
+            worse.append(name)
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Piggy Bank benchmark suite")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="the baseline to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the baseline")
+    parser.add_argument("--output", metavar="FILE", help="also save the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="how much worse than the baseline counts as a regression (0.5 = 50%%)")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "results": run_all(),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    worse = regressions(report["results"], baseline, args.tolerance)
+    print("{:<40}{:>14}{:>14}".format("result", "now", "baseline"))
+    for name, value in sorted(report["results"].items()):
+        old = baseline.get(name)
+        print("{:<40}{:>14.2f}{:>14}{}".format(name, value, "-" if old is None else "{:.2f}".format(old),
+                                               "  <-- slower" if name in worse else ""))
+    if worse:
+        print("\n{} result(s) regressed by more than {:.0%}".format(len(worse), args.tolerance))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
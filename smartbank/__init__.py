@@ -0,0 +1,7 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: The Smart Piggy Bank as a package. Nothing is imported here on purpose: the GUI (tkinter), the LCD
+# (rpi_lcd) and the buttons (RPi.GPIO) are only imported once the command line has picked which ones to use, so
+# the pieces can be imported and tested on their own and the headless mode starts quickly.
+# Run it with: python -m smartbank --help
+#####################################################################################################################
@@ -0,0 +1,4 @@
+# lets the package be run with: python -m smartbank
+from .cli import main
+
+main()
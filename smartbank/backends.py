@@ -0,0 +1,64 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Picks the LCD and GPIO to use when the program starts instead of hard-coding DISPLAY. The hardware
+# libraries only get imported here, and only if they were asked for, so a laptop (or a test) never needs them.
+#   "rpi"  - the real hardware (rpi_lcd / RPi.GPIO)
+#   "fake" - the in-memory stand-ins (FakeLCD / FakeGPIO)
+#   "none" - not used at all
+#   "auto" - the real hardware if its library can be imported, otherwise none
+#####################################################################################################################
+
+CHOICES = ("auto", "rpi", "fake", "none")
+
+
+# returns the LCD to draw on (wrapped in an LCDRenderer), or None for no LCD
+def make_lcd(kind="auto"):
+    if kind == "none":
+        return None
+    from .lcd_render import LCDRenderer, FakeLCD
+    if kind == "fake":
+        return LCDRenderer(FakeLCD())
+    try:
+        from rpi_lcd import LCD
+    except ImportError:
+        if kind == "auto":
+            return None
+        raise
+    hardware = LCD()  # initializes the LCD display
+    hardware.clear()  # clears any previous text on it
+    return LCDRenderer(hardware)
+
+
+# returns the GPIO module (or fake) for the coin buttons, or None for no buttons
+def make_gpio(kind="auto"):
+    if kind == "none":
+        return None
+    if kind == "fake":
+        from .coin_input import FakeGPIO
+        return FakeGPIO()
+    try:
+        import RPi.GPIO as GPIO
+    except (ImportError, RuntimeError):  # RuntimeError is what RPi.GPIO raises when it's not on a pi
+        if kind == "auto":
+            return None
+        raise
+    return GPIO
+
+
+# returns the coin buttons on top of the chosen GPIO, or None for no buttons. If acceptor_pin is given it's a coin
+# acceptor sending pulses on that one pin instead of a button for each coin (see pulse.py). If trace is a file name,
+# every pin transition and coin is recorded in it (see trace.py)
+def make_coins(kind="auto", acceptor_pin=None, trace=None):
+    gpio = make_gpio(kind)
+    if gpio is None:
+        return None
+    if acceptor_pin is not None:
+        from .pulse import PulseInput
+        coins = PulseInput(gpio, acceptor_pin)
+    else:
+        from .coin_input import CoinInput
+        coins = CoinInput(gpio)
+    if trace is not None:
+        from .trace import record
+        record(coins, trace)
+    return coins
@@ -0,0 +1,135 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: The parts of the piggy bank that both the GUI and the headless (buttons only) mode share: where the
+# money is saved (journal or SQLite account), the ledger, the LCD and the coin buttons. The GUI and headless modes
+# each get a Bank and just handle their own input and screen. The Bank also keeps the daily/weekly/monthly totals
+# (rollups.py) up to date for whichever account is open, and sends the transactions to a hub if it's asked to
+# (sync.py), and starts the parents' API if there is one (parent_api.py). When the coins come from a separate coin
+# process (shm.py), the Bank is the only one that saves them. It also checks the goal & milestone rules (rules.py) on
+# every transaction, for both modes, and pays the allowance & interest (scheduler.py), catching up on what was missed
+# while it was off as soon as it's opened.
+#####################################################################################################################
+
+from . import tracing
+from .journal import Journal
+from .ledger import Ledger
+
+ACCOUNT = "Piggy Bank"  # the account that is opened first when a database is used
+
+
+class Bank:
+    # lcd and coins come from backends.py (either can be None). database is an SQLite file for multiple accounts, if
+    # it's None the single piggy bank is saved in the journal files like before. sync is the hub's (host, port, token)
+    # and device is this bank's name there (only for the journal, a database already has every account in it). parent is
+    # a ParentAPI (not started yet), it's started once the ledger is loaded. shared is the SharedChannel when coins is
+    # SharedCoins from a coin process (the total is put back in it after each transaction). rules is a Rules from
+    # rules.py (its hooks are added by whoever shows the rewards). schedule is a Scheduler from scheduler.py, the GUI or
+    # headless mode runs it when its payments are due
+    def __init__(self, lcd=None, coins=None, database=None, account=ACCOUNT, sync=None, device=None,
+                 parent=None, shared=None, rules=None, schedule=None):
+        self.lcd = lcd
+        self.coins = coins
+        self.database = database
+        self.account = account
+        self.sync = sync
+        self.device = device
+        self.sync_client = None
+        self.parent = parent
+        self.shared = shared
+        self.rules = rules
+        self.schedule = schedule
+        self.store = None
+        self.ledger = None
+        self.rollups = None
+
+    # loads the saved balance & goal (last snapshot + journal, or the account from the database) and shows it
+    def open(self):
+        if self.database:
+            from .store import AccountStore  # only needed (and imported) when there's a database
+            self.store = AccountStore(self.database)
+            journal = self.store.account(self.account)
+        else:
+            journal = Journal()
+            journal.load()
+        self.ledger = Ledger.from_journal(journal)  # every transaction goes through the ledger & into the journal
+        self.rollups = journal.rollups()
+        self.ledger.subscribe(self.rollups.changed)
+        self.ledger.subscribe(tracing.changed)  # every transaction is traced (see tracing.py)
+        if self.rules is not None:
+            self.rules.open(self.account, self.ledger)
+            self.ledger.subscribe(self.rules.changed)
+            self.rules.start()
+        if self.sync is not None and not self.database:
+            from .sync import SyncClient
+            host, port, token = self.sync
+            self.sync_client = SyncClient(journal, host, port, device=self.device, token=token)
+            self.sync_client.start()
+        if self.shared is not None:
+            self.ledger.subscribe(self.coins.publish)  # moved to the new ledger by switch_account() like the rest
+            journal.sync_listeners.append(self.coins.synced)  # a coin leaves the ring once it's on the disk
+            self.coins.publish(self.ledger, None)
+        if self.parent is not None:
+            self.parent.start(self)
+            tracing.event(tracing.PARENT_API, self.parent.port)
+        if self.schedule is not None:
+            self.catch_up()  # after everything is listening, so the rules, the API & the coin process see it
+        if self.lcd is not None:
+            self.lcd.text("Total: {}".format(self.ledger.format_total()), 1)
+        tracing.event(tracing.OPEN, journal.replayed, self.ledger.total, self.ledger.goal)
+        if self.coins is not None:
+            self.coins.start()
+        return self.ledger
+
+    # closes the current account and opens another one from the database. Anything listening to the old ledger is
+    # moved over to the new one and told about the change
+    def switch_account(self, name):
+        old = self.ledger
+        old.journal.close()
+        old.unsubscribe(self.rollups.changed)
+        self.account = name
+        self.ledger = Ledger.from_journal(self.store.account(name))
+        self.rollups = self.ledger.journal.rollups()
+        self.ledger.listeners = [self.rollups.changed] + old.listeners  # rollups first so windows see them updated
+        if self.rules is not None:
+            self.rules.open(name, self.ledger)  # this account's rules, starting from its balances
+        self.ledger.notify(None)
+        if self.schedule is not None:
+            self.catch_up()
+        return self.ledger
+
+    # pays what the open account missed while the bank was off (or another account was open), as one deposit (the
+    # scheduler traces what it paid)
+    def catch_up(self):
+        return self.schedule.open(self.account, self.ledger)
+
+    # saves a snapshot so the next start up has nothing to replay
+    def save(self):
+        self.ledger.journal.checkpoint()
+
+    # makes sure everything is saved and shown, then turns off the hardware
+    def close(self):
+        if self.parent is not None:
+            self.parent.stop()  # no more withdrawals can be approved once the bank is closing
+        if self.coins is not None:
+            self.coins.stop()
+            if self.shared is not None and self.ledger is not None:
+                for coin in self.coins.drain():  # coins the coin process sent right as the bank was closing
+                    self.ledger.deposit(coin.value)
+            self.coins = None
+        if self.ledger is not None:
+            self.ledger.journal.close()
+        if self.shared is not None:
+            self.shared.close()  # the last coins are saved, the coin process sends the rest to the next bank
+            self.shared = None
+        if self.rules is not None:
+            self.rules.stop()  # lets the last rewards finish
+        if self.sync_client is not None:
+            self.sync_client.stop()  # sends what's left if the hub is there (or it's sent next time)
+            tracing.event(tracing.SYNC, len(self.sync_client.pending), self.sync_client.sent_bytes)
+            self.sync_client = None
+        if self.lcd is not None:
+            self.lcd.stop()  # writes the last frame to the LCD
+            tracing.event(tracing.LCD, self.lcd.saved(), self.lcd.requested)
+        if self.store is not None:
+            self.store.close()
+            self.store = None
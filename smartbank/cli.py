@@ -0,0 +1,171 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: The command line for the Smart Piggy Bank (python -m smartbank). It picks the mode (GUI or headless),
+# the LCD & GPIO backends and where to save, and only then imports what that choice needs.
+#####################################################################################################################
+
+import time
+
+START = time.perf_counter()  # as early as possible, for --startup-only
+
+import argparse
+
+from .backends import CHOICES, make_lcd, make_coins
+from .bank import Bank, ACCOUNT
+from .rules import RULES_FILE, Rules, load_rules
+from .scheduler import SCHEDULE_FILE, Scheduler, load_schedule
+from . import tracing
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="smartbank", description="Smart Piggy Bank")
+    parser.add_argument("--headless", action="store_true",
+                        help="run with only the coin buttons and the LCD (no GUI)")
+    parser.add_argument("--lcd", choices=CHOICES, default="auto",
+                        help="which LCD to use (default: the real one if rpi_lcd is installed, otherwise none)")
+    parser.add_argument("--gpio", choices=CHOICES, default="auto",
+                        help="which GPIO to use for the coin buttons (default: RPi.GPIO if it's installed)")
+    parser.add_argument("--acceptor-pin", type=int, metavar="PIN",
+                        help="read coins from a pulse coin acceptor on this GPIO pin instead of the coin buttons")
+    parser.add_argument("--record-trace", metavar="FILE",
+                        help="record every coin pin transition in this file (replay it with python -m smartbank.trace)")
+    parser.add_argument("--shared", choices=("bank", "coins"),
+                        help="run the GUI and the coin buttons as two programs at once: 'bank' keeps the money and "
+                             "takes its coins from 'coins', which only reads the coin buttons (with --headless)")
+    parser.add_argument("--database", metavar="FILE",
+                        help="keep a separate account for each child in this SQLite file instead of the journal")
+    parser.add_argument("--account", default=ACCOUNT, help="the account to open first (with --database)")
+    parser.add_argument("--sync", metavar="HOST[:PORT]",
+                        help="send the transactions to a sync hub (python -m smartbank.sync --hub) on this computer")
+    parser.add_argument("--sync-token", help="the token the sync hub was started with (--token)")
+    parser.add_argument("--device", help="this bank's name on the sync hub (default: the computer's name)")
+    parser.add_argument("--parent-port", type=int, metavar="PORT",
+                        help="serve the parents' API (balances, history & withdrawal approvals) on this port")
+    parser.add_argument("--parent-host", default="127.0.0.1",
+                        help="where the parents' API listens (default: %(default)s, use 0.0.0.0 for the whole network)")
+    parser.add_argument("--parent-token", help="the token parents' apps have to send (Authorization: Bearer TOKEN)")
+    parser.add_argument("--approve-withdrawals", action="store_true",
+                        help="withdrawals wait for a parent to approve them through the parents' API")
+    parser.add_argument("--rules", default=RULES_FILE, metavar="FILE",
+                        help="goal, milestone & jar amounts to celebrate (default: %(default)s if it's there)")
+    parser.add_argument("--schedule", default=SCHEDULE_FILE, metavar="FILE",
+                        help="the allowance & interest to pay each account (default: %(default)s if it's there)")
+    parser.add_argument("--debug", action="store_true", help="print what's happening (every traced event)")
+    parser.add_argument("--trace-level", choices=tracing.LEVELS, default="info",
+                        help="which events are kept in memory for when something goes wrong (default: %(default)s, "
+                             "SIGUSR2 switches debug on & off while it runs)")
+    parser.add_argument("--trace-sample", action="append", default=[], metavar="KIND=N",
+                        help="only keep 1 in every N events of one kind, like coin=10 (can be given more than once)")
+    parser.add_argument("--trace-file", default=tracing.EVENTS_FILE, metavar="FILE",
+                        help="where the events are saved on an error or SIGUSR1 (default: %(default)s, read it with "
+                             "python -m smartbank.tracing FILE)")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve latency metrics at http://127.0.0.1:PORT/metrics (and /metrics.json)")
+    parser.add_argument("--metrics-file", metavar="FILE", help="write the latency metrics to this JSON file")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, metavar="SECONDS",
+                        help="how often the metrics file is written (default: 60)")
+    parser.add_argument("--startup-only", action="store_true",
+                        help="start, draw the first frame, print how long that took in ms and quit")
+    return parser
+
+
+# the metrics endpoint and/or file, if they were asked for
+def start_reporters(args):
+    reporters = []
+    if args.metrics_port is not None or args.metrics_file:
+        from . import metrics
+        if args.metrics_port is not None:
+            reporters.append(metrics.MetricsServer(args.metrics_port))
+        if args.metrics_file:
+            reporters.append(metrics.MetricsDumper(args.metrics_file, args.metrics_interval))
+    return reporters
+
+
+# the coin process for --shared coins: just the coin buttons and the LCD, the money is kept by the bank process
+def run_coins(args):
+    from . import headless
+    coins = make_coins(args.gpio, args.acceptor_pin, args.record_trace)
+    lcd = make_lcd(args.lcd)
+    startup_only = None
+    if args.startup_only:
+        startup_only = lambda: print("startup_ms={:.3f}".format((time.perf_counter() - START) * 1000))
+    reporters = start_reporters(args)
+    try:
+        headless.run_coins(coins, lcd, startup_only)
+    finally:
+        if coins is not None:
+            coins.stop()
+        if lcd is not None:
+            lcd.stop()
+        for reporter in reporters:
+            reporter.stop()
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        tracing.configure(args.trace_level, args.trace_sample, args.trace_file, echo=args.debug)
+    except ValueError as error:
+        parser.error(str(error))
+    sync = None
+    if args.sync:
+        if args.database:
+            parser.error("--sync is for the journal, a --database already keeps every account in one place")
+        from .sync import parse_address
+        sync = parse_address(args.sync) + (args.sync_token,)
+    if args.shared == "coins":
+        if not args.headless:
+            parser.error("--shared coins only reads the coin buttons, run it with --headless")
+        if args.database or args.sync or args.parent_port is not None:
+            parser.error("--database, --sync and --parent-port go on the bank (--shared bank), not the coin process")
+        return run_coins(args)
+    parent = None
+    if args.parent_port is not None:
+        from .parent_api import ParentAPI
+        parent = ParentAPI(args.parent_host, args.parent_port, args.parent_token, args.approve_withdrawals)
+    elif args.approve_withdrawals:
+        parser.error("--approve-withdrawals needs --parent-port, that's where the parents approve them")
+    try:
+        rules = Rules(load_rules(args.rules))
+    except ValueError as error:
+        parser.error("the rules file isn't right: {}".format(error))
+    try:
+        plans = load_schedule(args.schedule)
+    except ValueError as error:
+        parser.error("the schedule file isn't right: {}".format(error))
+    schedule = Scheduler(plans) if plans else None
+
+    channel = None
+    if args.shared == "bank":
+        if args.gpio not in ("auto", "none") or args.acceptor_pin is not None or args.record_trace:
+            parser.error("with --shared bank the coin buttons are read by the coin process (--shared coins)")
+        from .shm import SharedChannel, SharedCoins
+        try:
+            channel = SharedChannel.create()
+        except RuntimeError as error:
+            raise SystemExit(str(error))
+        coins = SharedCoins(channel)
+    else:
+        coins = make_coins(args.gpio, args.acceptor_pin, args.record_trace)
+    bank = Bank(make_lcd(args.lcd), coins, args.database, args.account, sync, args.device, parent, channel, rules,
+                schedule)
+    startup_only = None
+    if args.startup_only:
+        startup_only = lambda: print("startup_ms={:.3f}".format((time.perf_counter() - START) * 1000))
+    reporters = start_reporters(args)  # stopped when the bank closes
+    try:
+        try:
+            bank.open()
+        except (RuntimeError, ValueError) as error:  # the journal is already open in another bank, or can't be read
+            raise SystemExit("{}.".format(error))
+        if args.headless:
+            from . import headless
+            headless.run(bank, startup_only)
+        else:
+            from . import gui  # tkinter is only imported for the GUI
+            gui.run(bank, startup_only)
+    finally:
+        bank.close()  # makes sure everything is saved if the window is closed without pressing Save
+        for reporter in reporters:
+            reporter.stop()
@@ -0,0 +1,153 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Edge-triggered coin input for the physical Smart Piggy Bank. Instead of checking every button over and
+# over in a loop, each GPIO pin calls us back when its button is pressed. The press is debounced in software and put
+# in a queue with the time it happened, so no coin is lost while the bank is busy updating the LCD.
+#####################################################################################################################
+
+import queue  # thread-safe queue that the GPIO callbacks put coin events in
+import time  # for timestamping each press
+from collections import namedtuple
+
+from . import metrics
+
+# the GPIO pins used for each coin and the name & value of that coin (in cents)
+COIN_PINS = {
+    24: ("Penny", 1),
+    22: ("Nickel", 5),
+    23: ("Dime", 10),
+    25: ("Quarter", 25),
+    17: ("Dollar", 100),
+}
+
+DEBOUNCE_MS = 50  # presses on the same pin closer together than this are treated as switch bounce
+
+# one coin press: when it happened (monotonic seconds), which pin, and the coin's name & value in cents
+CoinEvent = namedtuple("CoinEvent", ["time", "pin", "name", "value"])
+
+EDGE_TIME = metrics.histogram("smartbank_gpio_edge_seconds", "Time spent in the GPIO edge callback")
+COINS = metrics.counter("smartbank_coins_total", "Coin presses accepted from the GPIO pins")
+BOUNCES = metrics.counter("smartbank_coin_bounces_total", "GPIO edges thrown away as switch bounce")
+
+
+# stand-in for RPi.GPIO so the input code can be run and tested on a laptop without the buttons hooked up
+class FakeGPIO:
+    BCM = "BCM"
+    BOARD = "BOARD"
+    IN = "IN"
+    OUT = "OUT"
+    PUD_DOWN = "PUD_DOWN"
+    PUD_UP = "PUD_UP"
+    RISING = "RISING"
+    FALLING = "FALLING"
+    BOTH = "BOTH"
+
+    def __init__(self):
+        self.mode = None
+        self.levels = {}  # the current level (0 or 1) of each pin that was set up
+        self.callbacks = {}  # pin -> (edge, callback) for pins with event detection on
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=None):
+        self.levels[pin] = 1 if pull_up_down == self.PUD_UP else 0
+
+    def input(self, pin):
+        return self.levels[pin]
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self.callbacks:  # the real library refuses to add detection twice
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self, pin=None):
+        if pin is None:
+            self.levels.clear()
+            self.callbacks.clear()
+        else:
+            self.levels.pop(pin, None)
+            self.callbacks.pop(pin, None)
+
+    # changes the level of a pin and runs its callback if the change matches the edge it is watching for
+    def set_level(self, pin, level):
+        old = self.levels[pin]
+        self.levels[pin] = level
+        if pin not in self.callbacks or old == level:
+            return
+        edge, callback = self.callbacks[pin]
+        rising = level == 1
+        if edge == self.BOTH or (edge == self.RISING and rising) or (edge == self.FALLING and not rising):
+            if callback is not None:
+                callback(pin)
+
+    # simulates a full button press (down then back up)
+    def press(self, pin):
+        self.set_level(pin, 1)
+        self.set_level(pin, 0)
+
+
+# watches the coin pins and turns button presses into a queue of CoinEvents
+class CoinInput:
+    def __init__(self, gpio=None, pins=None, debounce_ms=DEBOUNCE_MS, clock=time.monotonic):
+        if gpio is None:  # only import the real library when it's actually needed (it only works on the pi)
+            import RPi.GPIO as gpio
+        self.gpio = gpio
+        self.pins = dict(COIN_PINS if pins is None else pins)
+        self.debounce = debounce_ms / 1000  # debounce time in seconds
+        self.clock = clock  # can be swapped out to replay presses with their own timestamps
+        self.events = queue.Queue()  # unbounded so a burst of coins is never dropped
+        self.last_press = {pin: None for pin in self.pins}  # time of the last accepted press on each pin
+        self.bounced = 0  # how many edges were thrown away as bounce (useful for tuning DEBOUNCE_MS)
+        self.started = False
+
+    # sets up every coin pin as a LOW input and turns on the edge callbacks
+    def start(self):
+        self.gpio.setwarnings(False)
+        self.gpio.setmode(self.gpio.BCM)
+        for pin in self.pins:
+            self.gpio.setup(pin, self.gpio.IN, pull_up_down=self.gpio.PUD_DOWN)
+            self.gpio.add_event_detect(pin, self.gpio.RISING, callback=self.edge)
+        self.started = True
+
+    # runs (on the GPIO library's thread) every time a coin pin goes from LOW to HIGH
+    def edge(self, pin):
+        begin = metrics.now()
+        now = self.clock()
+        last = self.last_press[pin]
+        if last is not None and now - last < self.debounce:  # too soon after the last press, so it's bounce
+            self.bounced += 1
+            BOUNCES.add()
+            return
+        self.last_press[pin] = now
+        name, value = self.pins[pin]
+        self.events.put(CoinEvent(now, pin, name, value))
+        COINS.add()
+        EDGE_TIME.since(begin)
+
+    # waits for the next coin (uses no CPU while waiting). raises queue.Empty if the timeout runs out
+    def get(self, timeout=None):
+        return self.events.get(timeout=timeout)
+
+    # returns every coin that is already waiting without blocking
+    def drain(self):
+        coins = []
+        while True:
+            try:
+                coins.append(self.events.get_nowait())
+            except queue.Empty:
+                return coins
+
+    # turns off the callbacks and wipes the GPIO board for next use
+    def stop(self):
+        if self.started:
+            for pin in self.pins:
+                self.gpio.remove_event_detect(pin)
+            self.started = False
+        self.gpio.cleanup()
@@ -0,0 +1,319 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Exports the accounts (balance, jars, goal & percentages) and every transaction to CSV or JSON Lines,
+# and imports them back, for backups and for moving a household to another database or SD card. Everything is
+# streamed a row at a time (the database is read with a cursor and the file is written as it goes, and the other way
+# round for importing), so a million transactions uses no more memory than ten. An import is one SQLite transaction
+# (added in batches of BATCH rows), so it's quick and a bad row leaves the database the way it was.
+#   python -m smartbank.export export [--database FILE] [--account NAME] [-o backup.csv]
+#   python -m smartbank.export import backup.csv [--database FILE]
+# Without --database it uses the journal files (only the balance, jars, goal & percentages are imported into them,
+# since the journal doesn't keep old transactions, and the rollups are worked out again from the file's transactions).
+#####################################################################################################################
+
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import date
+
+from .jars import Jars, DEFAULT_RATIOS, format_ratios, parse_ratios
+from .journal import DEPOSIT, WITHDRAW, ADJUST, DEFAULT_GOAL
+from .rollups import PERIODS, Rollups, bucket_keys
+
+# every row has these columns (the ones that don't go with its type are empty). An account row has its balance in
+# amount and its jar balances in give/save/spend, a transaction row has the transaction's amount and jar changes
+COLUMNS = ("type", "account", "time", "kind", "amount", "give", "save", "spend", "goal", "ratios", "carry")
+TYPE, ACCOUNT, TIME, KIND, AMOUNT, GIVE, SAVE, SPEND, GOAL, RATIOS, CARRY = range(len(COLUMNS))
+INTEGERS = (AMOUNT, GIVE, SAVE, SPEND, GOAL)
+ACCOUNT_ROW = "account"
+TRANSACTION_ROW = "transaction"
+FORMATS = ("csv", "jsonl")
+JOURNAL_ACCOUNT = "Piggy Bank"  # the name the journal's one account is exported under
+
+BATCH = 10000  # transactions added to the database at a time when importing
+ENCODER = json.JSONEncoder(separators=(",", ":"))  # made once (json.dumps makes a new one for every row)
+
+EXPORT_ACCOUNTS = ("SELECT id, name, balance, goal, give, save, spend, ratios, carry FROM accounts "
+                   "ORDER BY name")
+EXPORT_ACCOUNT = ("SELECT id, name, balance, goal, give, save, spend, ratios, carry FROM accounts "
+                  "WHERE name = ?")
+EXPORT_TRANSACTIONS = ("SELECT time, kind, amount, give, save, spend FROM transactions WHERE account_id = ? "
+                       "ORDER BY id")  # in the order they happened, using the (account_id, id) index
+FIND_ID = "SELECT id FROM accounts WHERE name = ?"
+INSERT_ACCOUNT = ("INSERT INTO accounts (name, balance, goal, give, save, spend, ratios, carry) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+REPLACE_ACCOUNT = ("UPDATE accounts SET balance = ?, goal = ?, give = ?, save = ?, spend = ?, ratios = ?, carry = ? "
+                   "WHERE id = ?")
+DELETE_TRANSACTIONS = "DELETE FROM transactions WHERE account_id = ?"
+DELETE_ROLLUPS = "DELETE FROM rollups WHERE account_id = ?"
+INSERT_TRANSACTIONS = ("INSERT INTO transactions (account_id, time, kind, amount, give, save, spend) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)")
+# the date ordinal (like date.toordinal()) of each transaction's day in local time, then its totals for that day
+DAY_TOTALS = ("SELECT CAST(julianday(time, 'unixepoch', 'localtime', 'start of day') - 1721424.5 AS INTEGER), "
+              "SUM(CASE WHEN kind != 'W' AND amount > 0 THEN amount ELSE 0 END), "
+              "SUM(CASE WHEN kind = 'W' THEN amount WHEN amount < 0 THEN -amount ELSE 0 END), "
+              "COUNT(*), SUM(give), SUM(save), SUM(spend) FROM transactions WHERE account_id = ? GROUP BY 1")
+INSERT_ROLLUP = "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+# the rows for every account in the database (or just one) and its transactions. A generator, so only one row is
+# in memory at a time however big the database is
+def store_rows(store, account=None):
+    with store.pool.connection() as conn:
+        accounts = conn.execute(EXPORT_ACCOUNTS) if account is None else conn.execute(EXPORT_ACCOUNT, (account,))
+        for account_id, name, balance, goal, give, save, spend, ratios, carry in accounts:
+            yield ACCOUNT_ROW, name, None, None, balance, give, save, spend, goal, ratios, carry
+            for when, kind, amount, give, save, spend in conn.execute(EXPORT_TRANSACTIONS, (account_id,)):
+                yield TRANSACTION_ROW, name, when, kind, amount, give, save, spend, None, None, None
+
+
+# the rows for the journal's account: its balance & jars, and the transactions still in the journal (it doesn't keep
+# older ones, or when they happened)
+def journal_rows(journal, name=JOURNAL_ACCOUNT):
+    jars = journal.jars
+    yield (ACCOUNT_ROW, name, None, None, journal.balance, *jars.balances, journal.goal, format_ratios(jars.ratios),
+           format_ratios(jars.carry))
+    splits = {seq: split for seq, change, split in journal.replay_log}  # worked out on replay for old records
+    for seq, kind, cents, split in journal.records(journal.snapshot_seq):
+        if seq in splits:
+            yield TRANSACTION_ROW, name, None, kind, cents, *splits[seq], None, None, None
+
+
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)  # None is written as an empty cell
+        count += 1
+    return count
+
+
+def write_jsonl(rows, f):
+    count = 0
+    for row in rows:
+        f.write(ENCODER.encode({column: value for column, value in zip(COLUMNS, row) if value is not None}))
+        f.write("\n")
+        count += 1
+    return count
+
+
+# checks one row read from a file and turns its numbers into numbers (empty cells become None)
+def clean_row(row):
+    if len(row) != len(COLUMNS):
+        raise ValueError("a row needs {} columns: {!r}".format(len(COLUMNS), row))
+    # nearly every row is a transaction, so they're done quickly
+    if row[TYPE] == TRANSACTION_ROW and row[KIND] in (DEPOSIT, WITHDRAW, ADJUST) and row[AMOUNT] not in ("", None):
+        when = row[TIME]
+        return (TRANSACTION_ROW, row[ACCOUNT], None if when in ("", None) else float(when), row[KIND],
+                int(row[AMOUNT]), int(row[GIVE] or 0), int(row[SAVE] or 0), int(row[SPEND] or 0), None, None, None)
+    row = [None if value == "" else value for value in row]
+    if row[TYPE] not in (ACCOUNT_ROW, TRANSACTION_ROW) or not row[ACCOUNT]:
+        raise ValueError("not an account or transaction row: {!r}".format(row))
+    for column in INTEGERS:
+        if row[column] is not None:
+            row[column] = int(row[column])
+    if row[TIME] is not None:
+        row[TIME] = float(row[TIME])
+    if row[TYPE] == TRANSACTION_ROW and (row[KIND] not in (DEPOSIT, WITHDRAW, ADJUST) or row[AMOUNT] is None):
+        raise ValueError("not a transaction: {!r}".format(row))
+    return row
+
+
+# reads rows back out of a CSV export. The columns can be in any order as long as the header names them
+def read_csv(f):
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    if tuple(header) == COLUMNS:  # the usual case, a file from export
+        for values in reader:
+            if values:
+                yield clean_row(values)
+        return
+    try:
+        places = [header.index(column) for column in COLUMNS]
+    except ValueError:
+        raise ValueError("the CSV header needs these columns: {}".format(", ".join(COLUMNS)))
+    for values in reader:
+        if values:
+            yield clean_row([values[place] if place < len(values) else None for place in places])
+
+
+def read_jsonl(f):
+    for line in f:
+        if line.strip():
+            data = json.loads(line)
+            yield clean_row([data.get(column) for column in COLUMNS])
+
+
+# adds rows into the database, replacing any account that's already there with the same name (and its transactions
+# & rollups). Transactions are added BATCH at a time and the rollups are worked out at the end, once for each
+# account. Returns how many accounts and transactions were added
+def import_rows(store, rows, batch=BATCH, now=None):
+    now = time.time() if now is None else now  # for transactions without a time (from the journal)
+    ids = {}  # account name -> id, for the accounts imported so far
+    accounts = transactions = 0
+    pending = []
+    with store.pool.connection() as conn:
+        with conn:  # everything in one SQLite transaction
+            for row in rows:
+                if row[TYPE] == ACCOUNT_ROW:
+                    add_transactions(conn, pending)
+                    ids[row[ACCOUNT]] = replace_account(conn, row)
+                    accounts += 1
+                    continue
+                account_id = ids.get(row[ACCOUNT])
+                if account_id is None:
+                    raise ValueError("transaction for {!r} comes before its account row".format(row[ACCOUNT]))
+                pending.append((account_id, now if row[TIME] is None else row[TIME], row[KIND], row[AMOUNT],
+                                row[GIVE] or 0, row[SAVE] or 0, row[SPEND] or 0))
+                transactions += 1
+                if len(pending) >= batch:
+                    add_transactions(conn, pending)
+            add_transactions(conn, pending)
+            for account_id in ids.values():
+                add_rollups(conn, account_id)
+    return accounts, transactions
+
+
+# saves one account row, emptying it first if it's already there. Returns its id
+def replace_account(conn, row):
+    goal = DEFAULT_GOAL if row[GOAL] is None else row[GOAL]
+    ratios = format_ratios(DEFAULT_RATIOS if row[RATIOS] is None else parse_ratios(row[RATIOS]))
+    carry = format_ratios((0,) * len(DEFAULT_RATIOS)) if row[CARRY] is None else row[CARRY]
+    balances = [row[column] or 0 for column in (GIVE, SAVE, SPEND)]
+    found = conn.execute(FIND_ID, (row[ACCOUNT],)).fetchone()
+    if found is None:
+        return conn.execute(INSERT_ACCOUNT, (row[ACCOUNT], row[AMOUNT] or 0, goal, *balances, ratios,
+                                             carry)).lastrowid
+    account_id = found[0]
+    conn.execute(DELETE_TRANSACTIONS, (account_id,))
+    conn.execute(DELETE_ROLLUPS, (account_id,))
+    conn.execute(REPLACE_ACCOUNT, (row[AMOUNT] or 0, goal, *balances, ratios, carry, account_id))
+    return account_id
+
+
+# adds a batch of transactions, then empties the batch
+def add_transactions(conn, pending):
+    if pending:
+        conn.executemany(INSERT_TRANSACTIONS, pending)
+        pending.clear()
+
+
+# works out an imported account's rollups. SQLite adds up its transactions for each day, and only those totals are
+# added to their weeks & months here instead of going through each transaction in Python
+def add_rollups(conn, account_id):
+    buckets = {}  # (period, key) -> FIELDS
+    for day, *total in conn.execute(DAY_TOTALS, (account_id,)):
+        for period, key in zip(PERIODS, bucket_keys(date.fromordinal(day))):
+            bucket = buckets.get((period, key))
+            if bucket is None:
+                buckets[period, key] = total
+            else:
+                for field, amount in enumerate(total):
+                    bucket[field] += amount
+            total = list(total)  # the next period gets its own copy to add to
+    conn.executemany(INSERT_ROLLUP, [(account_id, *key, *bucket) for key, bucket in buckets.items()])
+
+
+# sets the journal's account from the first account row (or the one named), as a new snapshot. Its transaction rows
+# are only added to its rollups (the old ones were for the balance it had before), which are saved with the snapshot
+def import_journal(journal, rows, account=None, now=None):
+    now = time.time() if now is None else now
+    rollups = journal.rollups()
+    rollups.buckets = Rollups().buckets
+    found = None
+    for row in rows:
+        if found is None and row[TYPE] == ACCOUNT_ROW and (account is None or row[ACCOUNT] == account):
+            found = row
+        elif found is not None and row[TYPE] == TRANSACTION_ROW and row[ACCOUNT] == found[ACCOUNT]:
+            rollups.add(now if row[TIME] is None else row[TIME], -row[AMOUNT] if row[KIND] == WITHDRAW else row[AMOUNT],
+                        [row[column] or 0 for column in (GIVE, SAVE, SPEND)])
+    if found is None:
+        raise ValueError("no account {}in the file".format("" if account is None else repr(account) + " "))
+    ratios = DEFAULT_RATIOS if found[RATIOS] is None else parse_ratios(found[RATIOS])
+    carry = None if found[CARRY] is None else [int(part) for part in found[CARRY].split(",")]
+    journal.balance = found[AMOUNT] or 0
+    journal.goal = DEFAULT_GOAL if found[GOAL] is None else found[GOAL]
+    journal.jars = Jars(ratios, [found[column] or 0 for column in (GIVE, SAVE, SPEND)], carry)
+    journal.checkpoint()
+    return found[ACCOUNT]
+
+
+# the format of a file from its name (.csv or .jsonl), unless it was given
+def file_format(path, given=None):
+    if given:
+        return given
+    if path.endswith((".jsonl", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smartbank.export", description="export or import accounts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the accounts and transactions to a file")
+    export.add_argument("-o", "--output", default="-", metavar="FILE", help="where to write it (default: the screen)")
+    restore = commands.add_parser("import", help="read accounts and transactions back from a file")
+    restore.add_argument("file", help="a file from export (- for the keyboard)")
+    for command in (export, restore):
+        command.add_argument("--database", metavar="FILE", help="the SQLite file (default: the journal files)")
+        command.add_argument("--account", help="only this account")
+        command.add_argument("--format", choices=FORMATS, help="csv or jsonl (default: from the file name)")
+    args = parser.parse_args(argv)
+
+    store = journal = None
+    if args.database:
+        from .store import AccountStore
+        store = AccountStore(args.database)
+    else:
+        from .journal import Journal
+        journal = Journal()
+        try:
+            journal.load()
+        except RuntimeError as error:  # the bank is running, it has to be closed first
+            raise SystemExit("{}, close it first.".format(error))
+        except ValueError as error:  # the snapshot is lost and the journal alone can't give the balance
+            raise SystemExit("{}.".format(error))
+    begin = time.perf_counter()
+    try:
+        if args.command == "export":
+            rows = journal_rows(journal) if store is None else store_rows(store, args.account)
+            write = write_jsonl if file_format(args.output, args.format) == "jsonl" else write_csv
+            if args.output == "-":
+                count = write(rows, sys.stdout)
+            else:
+                with open(args.output, "w", newline="") as f:
+                    count = write(rows, f)
+            print("exported {} rows in {:.2f} s".format(count, time.perf_counter() - begin), file=sys.stderr)
+        else:
+            read = read_jsonl if file_format(args.file, args.format) == "jsonl" else read_csv
+            f = sys.stdin if args.file == "-" else open(args.file, newline="")
+            try:
+                rows = read(f)
+                if store is None:
+                    name = import_journal(journal, rows, args.account)
+                    print("imported {}'s balance into the journal".format(name), file=sys.stderr)
+                else:
+                    if args.account:
+                        rows = (row for row in rows if row[ACCOUNT] == args.account)
+                    accounts, transactions = import_rows(store, rows)
+                    print("imported {} accounts and {} transactions in {:.2f} s".format(
+                        accounts, transactions, time.perf_counter() - begin), file=sys.stderr)
+            except (ValueError, csv.Error) as error:
+                raise SystemExit("import failed (nothing was changed): {}".format(error))
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+    finally:
+        if store is not None:
+            store.close()
+        if journal is not None:
+            journal.close()
+
+
+if __name__ == "__main__":
+    main()
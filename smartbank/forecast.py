@@ -0,0 +1,186 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Works out when the savings goal will be reached. The savings rate is the average of how much went in
+# the save jar each week (from the weekly rollups, see rollups.py), counted from the first week the account was used
+# up to last week (this week isn't over, so counting it as a whole week would pull the rate down), and the bounds come
+# from how much that varies from week to week. The budget window does this for the account
+# that's open. For the whole fleet, the nightly job does every account in the database at once with NumPy (one
+# array of accounts x weeks, no Python loop per account) and saves the results in the forecasts table:
+#   python -m smartbank.forecast --database smart_bank.db [--weeks 26]
+#####################################################################################################################
+
+import argparse
+import math
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+from .jars import JARS, SAVE
+from .rollups import WEEK, FIELDS, COUNT, MONTH_NAMES, bucket_key
+
+WEEKS = 26  # how many weeks of history the rate is worked out from
+Z = 1.645  # the bounds are a 90% confidence interval on the weekly rate
+MAX_WEEKS = 520  # further away than this (10 years) counts as never
+SAVED = FIELDS.index(JARS[SAVE])  # where the save jar's change is in a rollup bucket
+
+# rate is cents saved per week. weeks is how many weeks until the goal at that rate, soonest & latest are the bounds.
+# Any of the weeks is None if the goal won't be reached at that rate (0 if it already has been)
+Forecast = namedtuple("Forecast", ["rate", "weeks", "soonest", "latest"])
+
+FORECAST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    account_id INTEGER PRIMARY KEY REFERENCES accounts(id),
+    computed REAL NOT NULL,
+    rate REAL NOT NULL,
+    eta TEXT,
+    soonest TEXT,
+    latest TEXT
+);
+"""
+SAVE_FORECAST = "INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?)"
+ACCOUNT_GOALS = "SELECT id, save, goal FROM accounts ORDER BY id"
+WEEKLY_ROLLUPS = "SELECT account_id, bucket, save, count FROM rollups WHERE period = 'week' AND bucket >= ?"
+
+
+# how many weeks remaining cents takes at rate cents a week (None for never)
+def weeks_to(remaining, rate):
+    if remaining <= 0:
+        return 0.0
+    if rate <= 0 or remaining / rate > MAX_WEEKS:
+        return None
+    return remaining / rate
+
+
+# the forecast for one account from its weekly savings (oldest first) and how much is still needed
+def estimate(weekly, remaining):
+    if not weekly:
+        return Forecast(0.0, weeks_to(remaining, 0), weeks_to(remaining, 0), weeks_to(remaining, 0))
+    count = len(weekly)
+    rate = sum(weekly) / count
+    # plain floats rather than statistics.stdev (exact fractions), since the budget window does this for every coin
+    deviation = math.sqrt(sum((week - rate) ** 2 for week in weekly) / (count - 1)) if count > 1 else 0.0
+    margin = Z * deviation / math.sqrt(count)
+    return Forecast(rate, weeks_to(remaining, rate), weeks_to(remaining, rate + margin),
+                    weeks_to(remaining, rate - margin))
+
+
+# the save jar's change for each of the last whole weeks (not this one), starting from the first week anything happened
+def weekly_savings(rollups, weeks=WEEKS, now=None):
+    series = rollups.trend(WEEK, weeks + 1, now)[:-1]
+    for first, (key, bucket) in enumerate(series):
+        if bucket[COUNT]:
+            return [bucket[SAVED] for key, bucket in series[first:]]
+    return []
+
+
+# the forecast for the account a ledger and its rollups belong to
+def forecast(ledger, rollups, weeks=WEEKS, now=None):
+    return estimate(weekly_savings(rollups, weeks, now), ledger.goal - ledger.jars.balances[SAVE])
+
+
+# the date that is weeks from today (None stays None)
+def eta_date(weeks, today=None):
+    if weeks is None:
+        return None
+    return (date.today() if today is None else today) + timedelta(days=math.ceil(weeks * 7))
+
+
+# a short date for the GUI ("Nov 3", with the year if it isn't this year)
+def format_date(day, today=None):
+    if day is None:
+        return "never"
+    text = "{} {}".format(MONTH_NAMES[day.month], day.day)
+    return text if day.year == (date.today() if today is None else today).year else "{} {}".format(text, day.year)
+
+
+# the same as estimate() for a lot of accounts at once. weekly is an (accounts x weeks) array, active says which of
+# those weeks count for each account (from its first week on), and remaining is what each account still needs.
+# Returns arrays of rate, weeks, soonest & latest (NaN where estimate() would give None)
+def estimate_batch(weekly, active, remaining):
+    import numpy as np
+    weekly = np.asarray(weekly, dtype=float)
+    remaining = np.asarray(remaining, dtype=float)
+    count = active.sum(axis=1)
+    rate = np.where(active, weekly, 0.0).sum(axis=1) / np.maximum(count, 1)
+    spread = np.where(active, weekly - rate[:, None], 0.0)
+    deviation = np.sqrt((spread ** 2).sum(axis=1) / np.maximum(count - 1, 1))
+    margin = np.where(count > 1, Z * deviation / np.sqrt(np.maximum(count, 1)), 0.0)
+
+    def weeks_at(rates):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = remaining / rates
+            result[(rates <= 0) | (result > MAX_WEEKS)] = np.nan
+        result[remaining <= 0] = 0.0
+        return result
+
+    return rate, weeks_at(rate), weeks_at(rate + margin), weeks_at(rate - margin)
+
+
+# reads every account's goal and weekly savings (the last whole weeks, like weekly_savings()) out of the database as
+# arrays (two queries, no per-account queries)
+def load_batch(store, weeks=WEEKS, now=None):
+    import numpy as np
+    last = bucket_key(WEEK, date.fromtimestamp(time.time() if now is None else now)) - 7  # this week isn't over
+    first = last - (weeks - 1) * 7
+    with store.pool.connection() as conn:
+        accounts = np.array(conn.execute(ACCOUNT_GOALS).fetchall(), dtype=np.int64).reshape(-1, 3)
+        rows = np.array(conn.execute(WEEKLY_ROLLUPS, (first,)).fetchall(), dtype=np.int64).reshape(-1, 4)
+    ids = accounts[:, 0]
+    weekly = np.zeros((len(ids), weeks))
+    used = np.zeros((len(ids), weeks), dtype=bool)
+    rows = rows[rows[:, 1] <= last]
+    account = np.searchsorted(ids, rows[:, 0])  # ids are sorted, so this finds each row's account
+    found = account < len(ids)
+    found[found] = ids[account[found]] == rows[found, 0]  # an account made between the two queries is left out
+    rows, account = rows[found], account[found]
+    if len(rows):
+        week = (rows[:, 1] - first) // 7
+        weekly[account, week] = rows[:, 2]
+        used[account, week] = rows[:, 3] > 0
+    active = np.maximum.accumulate(used, axis=1)  # every week from the first one with a transaction
+    return ids, weekly, active, accounts[:, 2] - accounts[:, 1]
+
+
+# the nightly job: forecasts every account in the database and saves them in the forecasts table
+def run_nightly(store, weeks=WEEKS, now=None):
+    import numpy as np
+    now = time.time() if now is None else now
+    ids, weekly, active, remaining = load_batch(store, weeks, now)
+    rate, eta, soonest, latest = estimate_batch(weekly, active, remaining)
+    today = date.fromtimestamp(now).toordinal()
+
+    def dates(weeks_left):  # ISO dates, or None for never
+        days = np.where(np.isnan(weeks_left), -1, np.ceil(np.nan_to_num(weeks_left) * 7)).astype(np.int64)
+        return [None if day < 0 else date.fromordinal(today + int(day)).isoformat() for day in days]
+
+    rows = zip(ids.tolist(), [now] * len(ids), rate.tolist(), dates(eta), dates(soonest), dates(latest))
+    with store.pool.connection() as conn:
+        conn.executescript(FORECAST_SCHEMA)
+        with conn:
+            conn.executemany(SAVE_FORECAST, rows)
+    return len(ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smartbank.forecast",
+                                     description="forecast when every account will reach its savings goal")
+    parser.add_argument("--database", required=True, metavar="FILE")
+    parser.add_argument("--weeks", type=int, default=WEEKS, help="weeks of history to use (default: %(default)s)")
+    args = parser.parse_args(argv)
+    try:
+        import numpy  # only the nightly job needs it, the budget window's forecast doesn't
+    except ImportError:
+        raise SystemExit("The nightly forecast needs NumPy (pip install numpy).")
+
+    from .store import AccountStore
+    store = AccountStore(args.database)
+    try:
+        begin = time.perf_counter()
+        count = run_nightly(store, args.weeks)
+        print("forecast {} accounts in {:.2f} s".format(count, time.perf_counter() - begin))
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
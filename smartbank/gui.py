@@ -0,0 +1,890 @@
+#####################################################################################################################
+# NAMES: Makenzie Moore and Hallie Burgess
+# DATE: 4/25/2024
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: This is a GUI for the Smart Piggy Bank financial tracker system. This product is geared towards children
+# with the goal of teaching financial literacy & establishing healthy financial habits using the 3 Jar System.
+#####################################################################################################################
+
+from tkinter import *  # tkinter library for GUI
+import tkinter.messagebox  # for displaying message boxes
+from tkinter.ttk import *  # for styling buttons
+import queue  # to check for coins from the physical buttons without waiting
+import time  # to time how long a coin takes to show up
+import datetime  # to know which month it is for the budget window's trend
+import math  # to round the goal forecast up to whole days
+import traceback  # to still print errors in button functions after they're traced
+
+from . import metrics  # latency histograms (see metrics.py)
+from . import tracing  # what happened, for when something goes wrong (see tracing.py)
+from .history_view import HistoryView  # the scrollable history box (see history_view.py)
+from .jars import JARS, SPEND, SAVE  # the give, save & spend jars (see jars.py)
+from .rollups import MONTH, WEEK, FIELDS, DEPOSITS, bucket_key, label  # the monthly totals for the trend (see rollups.py)
+from .forecast import estimate, weekly_savings, eta_date, format_date  # goal forecast (see forecast.py)
+from .ledger import to_cents, format_cents  # keeps the money in exact cents (see ledger.py)
+from .rules import GOAL  # the goal & milestone rules (see rules.py)
+from .scheduler import MAX_WAIT, describe  # the allowance & interest (see scheduler.py)
+
+COIN_POLL_MS = 50  # how often (ms) the GUI checks for coins from the buttons (and everything else other threads queue
+# for it), so a coin shows up within about this long
+COIN_POLL_MAX = 20  # most coins handled per check so a jar of coins being dumped in can't freeze the window
+
+TREND_MONTHS = 3  # how many months are shown in the budget window's savings trend
+
+BUTTONPRESS_TIME = metrics.histogram("smartbank_buttonpress_seconds", "Time to handle one deposit or withdrawal")
+COIN_DELAY = metrics.histogram("smartbank_coin_to_screen_seconds", "Time from a coin press until it's on screen")
+SAVE_TIME = metrics.histogram("smartbank_save_seconds", "Time to save a snapshot")
+
+
+# the class that manages the GUI program
+class GUI(Frame):
+    # the constructor for the GUI
+    def __init__(self, master, bank):
+        Frame.__init__(self, master)
+        self.master = master
+        self.bank = bank  # the saved money, LCD and coin buttons shared with headless mode (see bank.py)
+        self.ledger = bank.ledger  # keeps track of the total balance and savings goal (in cents)
+        self.lcd = bank.lcd  # the LCD (None if it isn't being used)
+        self.coins = bank.coins  # the physical coin buttons (None if they aren't being used)
+        self.store = bank.store  # the SQLite accounts (None if there's only the one piggy bank)
+        self.budget = None  # the budget window, made the first time it's opened
+        # the withdrawals waiting for a parent (None unless the bank was started with --approve-withdrawals)
+        self.approvals = bank.parent.approvals if bank.parent is not None else None
+        self.rules = bank.rules  # the goal & milestone rules, checked on every transaction (None if there aren't any)
+        self.reached = queue.Queue()  # the rules reached, put here from the rules thread for poll_rules()
+        self.schedule_due = 0.0  # when poll_schedule() runs next (time.monotonic())
+        self.showing = False  # True while tick() is in something that can open a message box
+
+    # set up the structure and format of the main window.
+    def setupGUI(self):
+        # these were all used for resizing purposes since sizing on the pi was tricky & this was a quick way to adjust
+        dollar = 4  # this is the row location for all dollar buttons, here for easy adjustment of the whole row
+        cent = dollar+1  # the same as the above but the row for all cent buttons right bellow it
+        pad_y = 33  # 15 # this is the vertical padding for all dollar and cent buttons
+        bottom_buttons = cent+4  # this is for the row the bottom buttons are on (Save, Clear, Cancel, etc)
+        # bellow are all different font sizes
+        title_font= 40
+        balance_font = 25
+        check_font = 23
+        self.button_font = 20
+        history_font = 18
+
+        # welcome message/title at the top
+        l1 = Label(self.master, text="Welcome to the Smart Piggy Bank!", font=('Georgia', title_font, 'bold'))
+        l1.grid(row=0, column=0, sticky=N+S+E+W, columnspan=5, padx=150, pady=20)
+
+        # displays the current balance in the piggy bank
+        l2 = Label(self.master, text="Current Balance:", font=('calibri', balance_font, 'bold'))
+        l2.grid(row=1, column=1, sticky=E, columnspan=2, pady=30, padx=30)
+        # the numbers for the current balance (different formatting so separate)
+        self.l3 = Label(self.master, text=format_cents(self.ledger.opening), font=('calibri', balance_font, 'bold'),
+                        background="lightgrey")
+        self.l3.grid(row=1, column=3, sticky=W)
+
+        # set up radiobuttons for deposits/withdrawals
+        style1 = Style() # this sets the style/format for both (and next line too)
+        style1.configure('TRadiobutton', font=('calibri', check_font), foreground="black")
+        self.check = StringVar(self.master, "1")  # checks for individual buttons
+        # button 1: deposit
+        check1 = Radiobutton(self.master, text="Deposit", variable=self.check, value="1")
+        check1.grid(row=2, column=2, columnspan=2, sticky=W, pady=10, padx=80)
+        # button 2: withdraw
+        check2 = Radiobutton(self.master, text="Withdraw", variable=self.check, value="2")
+        check2.grid(row=3, column=2, columnspan=2, sticky=W, pady=18, padx=80)
+        # these are checked in the function buttonpress() to know whether to add or subtract
+        # which jar a withdrawal comes out of (deposits are split between all 3 jars)
+        self.jar_choice = Combobox(self.master, values=[jar.capitalize() for jar in JARS], state="readonly",
+                                   width=8, font=('calibri', check_font))
+        self.jar_choice.set(JARS[SPEND].capitalize())
+        self.jar_choice.grid(row=3, column=3, sticky=E)
+
+        # this is the style for the dollar buttons and coin buttons
+        # they're the same right now but can be changed for style purposes
+        style = Style()
+        style.configure('Dollar.TButton', font=('calibri', self.button_font, 'bold'), foreground='black')
+        coin_style = Style()
+        coin_style.configure('Coin.TButton', font=('calibri', self.button_font, 'bold'), foreground='black')
+
+        # the buttons for using dollar values
+        b1 = Button(self.master, text="$1", style="Dollar.TButton", command=lambda: self.buttonpress(100))
+                # command tells what to do when method is activated  ^^^  lambda allows adding an argument
+        b1.grid(row=dollar, column=0, pady=pad_y) # only first button needs to be padded and the whole row will be
+
+        b2 = Button(self.master, text="$5", style="Dollar.TButton", command=lambda: self.buttonpress(500))
+        b2.grid(row=dollar, column=1)
+
+        b3 = Button(self.master, text="$10", style="Dollar.TButton", command=lambda: self.buttonpress(1000))
+        b3.grid(row=dollar, column=2)
+
+        b4 = Button(self.master, text="$20", style="Dollar.TButton", command=lambda: self.buttonpress(2000))
+        b4.grid(row=dollar, column=3)
+
+        b5 = Button(self.master, text="$50", style="Dollar.TButton", command=lambda: self.buttonpress(5000))
+        b5.grid(row=dollar, column=4)
+
+        # the buttons for adding coin values
+        c1 = Button(self.master, text="$0.01", style="Coin.TButton", command=lambda: self.buttonpress(1))
+        c1.grid(row=cent, column=0, pady=pad_y)
+
+        c2 = Button(self.master, text="$0.05", style="Coin.TButton", command=lambda: self.buttonpress(5))
+        c2.grid(row=cent, column=1)
+
+        c3 = Button(self.master, text="$0.10", style="Coin.TButton", command=lambda: self.buttonpress(10))
+        c3.grid(row=cent, column=2)
+
+        c4 = Button(self.master, text="$0.25", style="Coin.TButton", command=lambda: self.buttonpress(25))
+        c4.grid(row=cent, column=3)
+
+        c5 = Button(self.master, text="$0.50", style="Coin.TButton", command=lambda: self.buttonpress(50))
+        c5.grid(row=cent, column=4)
+
+        # this displays the new balance to track changes
+        l4 = Label(self.master, text="New Balance:    ", font=('calibri', balance_font, 'bold'))
+        l4.grid(row=cent+1, column=2, sticky=E, columnspan=1, pady=50)
+        self.l5 = Label(self.master, text=self.ledger.format_total(), font=('calibri', balance_font, 'bold'),
+                        background="lightgrey")
+        self.l5.grid(row=cent+1, column=3, sticky=W)
+
+        # this is the button to cancel without saving/making changes
+        cancel_style = Style()
+        cancel_style.configure('Cancel.TButton', font=('calibri', self.button_font), foreground='black')
+        b6 = Button(self.master, text="Cancel", style="Cancel.TButton", command=self.cancelbutton)
+        b6.grid(row=bottom_buttons, column=3)
+
+        # this is the button to save changes made before quitting
+        save_style = Style()
+        save_style.configure('Save.TButton', font=('calibri', self.button_font, "bold"), foreground='black')
+        b7 = Button(self.master, text="Save", style="Save.TButton", command=self.savebutton)
+        b7.grid(row=bottom_buttons, column=4, pady=15)
+
+        # this is the clear button to clear changes but keep working (in case of mistakes)
+        clear_style = Style()
+        clear_style.configure('Clear.TButton', font=('calibri', self.button_font), foreground="grey",
+                              background='lightgrey')
+        b8 = Button(self.master, text="Clear", style="Clear.TButton", command=self.clearbutton)
+        b8.grid(row=bottom_buttons, column=2)
+
+        # undo & redo take back (or put back) one change at a time, newest first (Ctrl+Z & Ctrl+Y work too)
+        b9 = Button(self.master, text="Undo", style="Cancel.TButton", command=self.undobutton)
+        b9.grid(row=cent+1, column=0)
+        b10 = Button(self.master, text="Redo", style="Cancel.TButton", command=self.redobutton)
+        b10.grid(row=cent+1, column=1)
+        self.master.bind("<Control-z>", lambda event: self.undobutton())
+        self.master.bind("<Control-y>", lambda event: self.redobutton())
+
+        # this is the button to open the window for budget information
+        open_budget = Button(self.master, text="Budget", style="Cancel.TButton", command=lambda: self.open_window2())
+        open_budget.grid(row=bottom_buttons, column=0)
+
+        # this is the button to switch to a different child's account (only if there's more than one)
+        if self.store is not None:
+            switch = Button(self.master, text="Account", style="Cancel.TButton", command=self.account_window)
+            switch.grid(row=bottom_buttons, column=1)
+
+        # this creates a scrollable text box to keep a running history of changes. Only the newest entries are kept in
+        # the box itself, older ones are read back out of the ledger if they're scrolled to (the box shows the changes
+        # that haven't been undone, so entry n is the ledger's live[n])
+        self.history = HistoryView(self.master, rows=27, width=20, font=("Calibri", history_font),
+                                   loader=lambda index: self.history_row(self.ledger.live[self.history_base + index]))
+        self.history.place(x=1230, y=0)
+        self.reset_history()
+
+        ## this was temporary for testing a dollar box that you could enter any amount (decided to take this out but
+        ## still works if you uncomment these lines)
+        #input_dollar = Button(self.master, text="Dollar", style="Cancel.TButton", command=lambda: self.dollarwindow())
+        #input_dollar.grid(row=bottom_buttons, column=1)
+
+        ##########################################################################
+
+    # calculates changes in the value when dollar/coin buttons are pushed on GUI
+    # val is in cents. mode can be given to skip the radiobuttons ("1" deposit, "2" withdraw), the physical coin
+    # buttons always deposit
+    def buttonpress(self, val, mode=None):
+        begin = metrics.now()
+        if mode is None:
+            mode = self.check.get()
+        # this is for adding/depositing to the total
+        if mode == "1":  # checks for radiobutton 1: deposit
+            index = self.ledger.deposit(val)  # adds the value (and saves it right away)
+            self.l5["text"] = self.ledger.format_total()  # displays the new balance
+            if self.lcd is not None:  # updates LCD if it is being used
+                self.lcd.text("Deposited {}".format(format_cents(val)), 1)
+            if self.ledger.total > 0:
+                self.l5["foreground"] = "green"  # if the balance is positive, the text is green
+                self.l5["background"] = "lightgreen"
+            self.history.add(*self.history_row(index))  # updates the running history
+            # (every transaction is traced by the ledger listener in tracing.py, so there's nothing to trace here)
+
+        # this is for subtracting/withdrawing from the total
+        elif mode == "2":  # checks for radiobutton 2: withdraw
+            jar = JARS.index(self.jar_choice.get().lower())  # the jar picked next to the Withdraw button
+            if self.approvals is not None:  # a parent has to approve it first (see parent_api.py)
+                self.ask_parent(val, jar)
+            else:
+                self.withdraw(val, jar)
+
+        else:  # this isn't so much for radiobuttons, it was originally check boxes so this was here
+            tkinter.messagebox.showinfo("Warning", "Please select one of the check boxes")
+
+        # updates the entire new total after on the LCD
+        if self.lcd is not None:
+            self.lcd.text("Total: {}".format(self.ledger.format_total()), 2)
+        BUTTONPRESS_TIME.since(begin)
+        #############
+
+    # takes val cents out of one jar (and warns if there wasn't enough money for it)
+    def withdraw(self, val, jar):
+        index = self.ledger.withdraw(val, jar=jar)  # subtracts the value (and saves it right away)
+        self.l5["text"] = self.ledger.format_total()  # changes the new balance
+        if self.lcd is not None:  # updates LCD if needed
+            self.lcd.text("Withdrew {}".format(format_cents(val)), 1)
+        if self.ledger.total < 0:  # if the total is negative, the text is red (cause that's bad)
+            self.l5["foreground"] = "red"
+            self.l5["background"] = "lightpink"
+            tkinter.messagebox.showwarning("Warning", "You don't have that much money!")
+        elif self.ledger.jars.balances[jar] < 0:  # enough money, just not in that jar
+            tkinter.messagebox.showwarning("Warning", "You don't have that much money in your {} jar!"
+                                           .format(JARS[jar].capitalize()))
+        self.history.add(*self.history_row(index))  # updates the running history
+
+    # asks a parent to approve a withdrawal, it happens once they do (see poll_approvals)
+    def ask_parent(self, val, jar):
+        withdrawal = self.approvals.request(val, jar, self.bank.account)
+        if self.lcd is not None:
+            self.lcd.text("Asked for {}".format(format_cents(val)), 1)
+        tkinter.messagebox.showinfo("Waiting", "A parent needs to OK taking {} out of your {} jar."
+                                    .format(format_cents(val), JARS[jar].capitalize()))
+        tracing.event(tracing.APPROVAL, withdrawal.id, val, tracing.ASKED)
+
+    # carries out what parents decided through the API. They're decided on the API's thread and queued, and this
+    # takes them out on the GUI's thread like poll_coins() does with coins
+    def poll_approvals(self):
+        while True:
+            try:
+                withdrawal, approved = self.approvals.decided.get_nowait()
+            except queue.Empty:
+                break
+            if approved and withdrawal.account != self.bank.account:  # it was asked for from another account
+                tracing.event(tracing.APPROVAL, withdrawal.id, withdrawal.cents, tracing.DROPPED)
+                if self.lcd is not None:
+                    self.lcd.text("Not taken out", 1)
+                tkinter.messagebox.showinfo("Not Taken Out", "A parent said yes to taking {} out of {}'s {} jar, but "
+                                            "that account isn't open anymore, so nothing was taken out. Ask again."
+                                            .format(format_cents(withdrawal.cents), withdrawal.account,
+                                                    JARS[withdrawal.jar].capitalize()))
+                continue
+            tracing.event(tracing.APPROVAL, withdrawal.id, withdrawal.cents,
+                          tracing.APPROVED if approved else tracing.DENIED)
+            if approved:
+                self.withdraw(withdrawal.cents, withdrawal.jar)
+                if self.lcd is not None:
+                    self.lcd.text("Total: {}".format(self.ledger.format_total()), 2)
+            else:
+                if self.lcd is not None:
+                    self.lcd.text("No to {}".format(format_cents(withdrawal.cents)), 1)
+                tkinter.messagebox.showinfo("Denied", "A parent said no to taking {} out of your {} jar."
+                                            .format(format_cents(withdrawal.cents), JARS[withdrawal.jar].capitalize()))
+
+    # celebrates the rules that were reached. The rules are checked with each transaction & reached ones are queued
+    # for the GUI's thread, so coins never wait for a message box
+    def poll_rules(self):
+        hits = []
+        while True:
+            try:
+                hits.append(self.reached.get_nowait())
+            except queue.Empty:
+                break
+        if hits:
+            goal = [hit for hit in hits if hit.rule.kind == GOAL]
+            if goal:
+                self.goalreached(goal[-1])
+            others = [hit for hit in hits if hit.rule.kind != GOAL]
+            if others:
+                self.milestone(others)
+
+    # pays the allowance & interest when they're due, on the GUI's thread like the coins, then works out when tick()
+    # runs it again: at the next one (or in MAX_WAIT seconds at most, since another account with other payments can
+    # be opened)
+    def poll_schedule(self):
+        payout = self.bank.schedule.run()
+        if payout is not None:
+            # it can't be undone, so the history box starts over from here like it does after Clear
+            self.l3["text"] = format_cents(self.ledger.opening)
+            self.reset_history()
+            self.show_change(describe(payout))
+        wait = self.bank.schedule.wait()
+        self.schedule_due = time.monotonic() + (MAX_WAIT if wait is None else wait)
+
+    # the two lines shown in the history box for one transaction in the ledger
+    def history_row(self, index):
+        kind, change, balance, when = self.ledger.entry(index)
+        sign = "+" if change >= 0 else "-"
+        return "{} {}".format(sign, format_cents(abs(change))), "\t{}".format(format_cents(balance))
+
+    # the GUI's one timer: takes out what the other threads queued for it (coins, what parents decided & the rules
+    # reached) and pays the allowance & interest when they're due, instead of a timer for each that all woke the GUI
+    # up on their own. The next tick is set up before anything that can open a message box, so coins still show up
+    # while one is open (that tick only does the coins)
+    def tick(self):
+        handled = self.poll_coins() if self.coins is not None else 0
+        # if there are still coins left it checks again right away, otherwise it waits a bit before checking again
+        self.master.after(1 if handled == COIN_POLL_MAX else COIN_POLL_MS, self.tick)
+        if self.showing:
+            return
+        self.showing = True
+        try:
+            if self.approvals is not None:
+                self.poll_approvals()
+            if self.rules is not None:
+                self.poll_rules()
+            if self.bank.schedule is not None and time.monotonic() >= self.schedule_due:
+                self.poll_schedule()
+        finally:
+            self.showing = False
+
+    # checks for coins from the physical buttons. The buttons put coins in a queue from their own thread, and this
+    # takes them out on the GUI's thread (tkinter widgets can only be changed from here) & runs them like a deposit.
+    # Returns how many it ran
+    def poll_coins(self):
+        handled = 0
+        while handled < COIN_POLL_MAX:
+            try:
+                coin = self.coins.events.get_nowait()
+            except queue.Empty:  # no more coins waiting
+                break
+            self.buttonpress(coin.value, mode="1")
+            delay = time.monotonic() - coin.time  # coin times are from time.monotonic()
+            COIN_DELAY.observe(delay)
+            tracing.event(tracing.COIN, coin.value, coin.pin, int(delay * 1e6))
+            handled += 1
+        return handled
+
+
+    # executes if the clear button is pressed
+    def clearbutton(self):
+        isYes = tkinter.messagebox.askokcancel("Clear New Balance?", "You entered {}. \nAre you sure you want "
+                                               "to clear it?\nThis action can't be undone."
+                                               .format(self.ledger.format_total()))
+        if isYes:  # checks if the user wants to clear ^^
+            # reverts the total & jars to the original before changes (saved as one adjustment so the journal agrees)
+            before = self.ledger.total
+            self.ledger.revert()
+            tracing.event(tracing.CLEAR, before, self.ledger.total)
+            self.l5["text"] = self.ledger.format_total()  # changes the displayed total
+            self.l5["foreground"] = "black"  # changes font color to black again
+
+            if self.lcd is not None:  # resets the display
+                self.lcd.text("Total: {}".format(self.ledger.format_total()), 2)
+                self.lcd.text("Total cleared", 1)
+
+            self.reset_history()  # clears the history and resets it
+        else:
+            pass  # just goes back if user hits cancel
+
+    # empties the history box and starts it over from the current balance
+    def reset_history(self):
+        self.history_base = len(self.ledger.live)  # where the first entry in the history box is in ledger.live
+        self.history.reset(self.ledger.format_total())
+
+    # takes back the newest change: the total, jars, LCD and history box are each changed by just that one entry
+    def undobutton(self):
+        if len(self.ledger.live) <= self.history_base:  # nothing left in the history box to undo
+            return
+        index = self.ledger.undo()
+        tracing.event(tracing.UNDO, 0, self.ledger.total, index)
+        kind, change, balance, when = self.ledger.entry(index)
+        self.history.pop()
+        self.show_change("Undid {}{}".format("+" if change >= 0 else "-", format_cents(abs(change))))
+
+    # puts back the newest change that was undone
+    def redobutton(self):
+        index = self.ledger.redo()
+        if index is None:  # nothing has been undone
+            return
+        tracing.event(tracing.REDO, 0, self.ledger.total, index)
+        self.history.add(*self.history_row(index))
+        self.show_change("Redid {}".format(self.history_row(index)[0].replace(" ", "")))
+
+    # shows the new total (coloured like buttonpress does) and what changed on the LCD
+    def show_change(self, message):
+        self.l5["text"] = self.ledger.format_total()
+        if self.ledger.total > 0:
+            self.l5["foreground"], self.l5["background"] = "green", "lightgreen"
+        elif self.ledger.total < 0:
+            self.l5["foreground"], self.l5["background"] = "red", "lightpink"
+        else:
+            self.l5["foreground"], self.l5["background"] = "black", "lightgrey"
+        if self.lcd is not None:
+            self.lcd.text(message, 1)
+            self.lcd.text("Total: {}".format(self.ledger.format_total()), 2)
+
+    # executes if the quit button is pressed
+    def cancelbutton(self):
+        isYes = tkinter.messagebox.askyesno("Cancel",
+                                            "Are you sure you want to quit? Your changes won't be saved.")
+        if isYes:  # asks the user if they are sure they want to cancel
+            self.ledger.revert()  # takes back the changes already saved
+            self.master.destroy()  # if yes, it quits without saving (run() closes everything after)
+        else:
+            pass  # if no, it just continues
+
+    # executes if the save button is pressed
+    def savebutton(self):
+        isYes = tkinter.messagebox.askokcancel("Save",
+                                            "Your final balance is {}."
+                                            "\nAre you finished making changes?".format(self.ledger.format_total()))
+        if isYes == True:  # asks user if they are ready to save
+            save_changes(self.bank)  # if yes, calls save_changes() to save everything
+            self.master.destroy()  # then closes the window (run() closes everything after)
+        else:
+            pass  # if no, passes
+
+
+    def account_window(self):  # opens the window to switch to another child's account
+        self.acct_window = Toplevel()
+        self.acct_window.title("Switch Account")
+        self.acct_window.lift()
+        tracing.event(tracing.WINDOW, tracing.ACCOUNT_WINDOW)
+
+        # title/prompt
+        acct_lbl = Label(self.acct_window, text="Whose Piggy Bank Is This?", font=("calibri", 30))
+        acct_lbl.grid(row=0, column=0, columnspan=4, sticky=NSEW, padx=65, pady=30)
+
+        # the entry box for the name (a new name makes a new account)
+        self.account_var = StringVar(self.acct_window, self.ledger.journal.name)
+        self.acct_entry = Entry(self.acct_window, font=("calibri", 24), width=20, textvariable=self.account_var)
+        self.acct_entry.grid(row=1, column=0, columnspan=4)
+        self.acct_entry.focus_set()
+        self.acct_window.bind('<Return>', lambda event: self.switch_account())
+
+        # the bottom buttons (cancel & confirm)
+        acct_style = Style()
+        acct_style.configure('acct.TButton', font=("calibri", 15, "bold"))
+        acct_cancel = Button(self.acct_window, text="Cancel", style="acct.TButton", command=self.acct_window.destroy)
+        acct_cancel.grid(row=2, column=0, padx=40, pady=30)
+        acct_submit = Button(self.acct_window, text="Confirm", style="acct.TButton",
+                             command=lambda: self.switch_account())
+        acct_submit.grid(row=2, column=2, padx=40, sticky=E)
+
+    # changes the GUI over to the account typed into the account window. This only looks up the one account by name
+    # (it doesn't load its transactions), so it's quick even with a lot of accounts
+    def switch_account(self):
+        name = self.account_var.get().strip()
+        if not name:
+            tkinter.messagebox.showerror("Error", "Please enter a name in the box.")
+            self.acct_window.lift()
+            self.acct_entry.focus_set()
+            return
+        self.ledger = self.bank.switch_account(name)
+        self.master.title("Smart Piggy Bank - {}".format(name))
+        self.l3["text"] = format_cents(self.ledger.opening)
+        self.l5["text"] = self.ledger.format_total()
+        self.l5["foreground"] = "black"
+        self.l5["background"] = "lightgrey"
+        self.reset_history()
+        if self.lcd is not None:
+            self.lcd.text(name[:16], 1)
+            self.lcd.text("Total: {}".format(self.ledger.format_total()), 2)
+        tracing.event(tracing.ACCOUNT, self.ledger.total)
+        self.acct_window.destroy()
+
+    def dollarwindow(self):  # opens the dollar entry window, then calls dollar_add() to add to total
+        # this whole thing didn't end up being used, but it's still an option if the button in GUI setup is uncommented
+        self.dollar_window = Toplevel()
+        self.dollar_window.title("Enter Dollar Amount")
+        self.dollar_window.lift()
+        tracing.event(tracing.WINDOW, tracing.DOLLAR_WINDOW)
+
+        # Title/prompt
+        dol_lbl = Label(self.dollar_window, text="Please Enter Your Dollar Amount:", font=("calibri", 30))
+        dol_lbl.grid(row=0, column=0, columnspan=4, sticky=NSEW, padx=65, pady=30)
+
+        # the dollar sign
+        dol_sign = Label(self.dollar_window, text="$", font=("calibri", 24))
+        dol_sign.grid(row=1, column=0, sticky=E, padx=15)
+
+        # the entry box & its settings
+        self.dollar_var = IntVar()
+        self.dol_entry = Entry(self.dollar_window, font=("calibri", 24), width=15, textvariable=self.dollar_var)
+        self.dol_entry.grid(row=1, column=1, sticky=W)
+        self.dol_entry.focus_set()  # this sets the focus so the box is already ready to be typed in
+        self.dol_entry.delete(0, END)  # IntVar shows a default 0 so this clears the box w/out causing an error
+        self.dollar_window.bind('<Return>', lambda event: self.dollar_add()) # allows user to press enter to submit
+
+        # the confirm and cancel buttons
+        dol_style = Style()
+        dol_style.configure('dol.TButton', font=("calibri", 15, "bold"))
+        dol_cancel = Button(self.dollar_window, text="Cancel",style="dol.TButton", command=self.dollar_window.destroy)
+        dol_cancel.grid(row=2, column=0, padx=40, pady=30)
+
+        dol_submit = Button(self.dollar_window, text="Confirm", style="dol.TButton", command=lambda: self.dollar_add())
+        dol_submit.grid(row=2, column=2, padx=40, sticky=E)
+
+    def dollar_add(self):  # adds dollar amount from the entry box (dollarwindow()) to the total
+        try: # checks if there is no error
+            val = self.dollar_var.get()  # retrieves value from the text box
+
+            isYes = tkinter.messagebox.askyesno("Confirm", f"You entered: ${val}. \nIs this correct?")
+            if isYes == True:  # asks the user if they are sure they want to continue
+                index = self.ledger.deposit(to_cents(val))  # adds the value (and saves it right away)
+                self.l5["text"] = self.ledger.format_total()  # displays the new balance
+                if self.lcd is not None:
+                    self.lcd.text("Deposited {}".format(format_cents(to_cents(val))), 1)
+                    self.lcd.text("Total: {}".format(self.ledger.format_total()), 2)
+
+                if self.ledger.total > 0:  # if the balance is positive, the text of current balance is green
+                    self.l5["foreground"] = "green"
+                    self.l5["background"] = "lightgreen"
+                self.history.add(*self.history_row(index))  # updates the text in the side panel
+
+                self.dollar_window.destroy()  # closes the dollar entry window after
+            else:  # if user enters no, it just continues
+                self.dollar_window.lift() # brings window back to front
+                self.dol_entry.focus_set()
+                pass
+        except:  # runs if the entered value produces an error & allows user to retry
+            tkinter.messagebox.showerror("Error", "Please enter a number in the box.")
+            self.dollar_window.lift()  # brings window to the front after error message is closed
+            self.dol_entry.focus_set()
+            tracing.event(tracing.BAD_ENTRY, tracing.DOLLAR_WINDOW)  # most likely not a number, or the box was empty
+
+    # this opens the budget window to display information. It's only built the first time, after that it's just
+    # shown again (it keeps itself up to date while it's hidden or open, see BudgetWindow)
+    def open_window2(self):  # budget window
+        if self.budget is None:
+            self.budget = BudgetWindow(self)
+        else:
+            self.budget.show()
+        tracing.event(tracing.WINDOW, tracing.BUDGET_WINDOW)
+
+
+    def set_goal(self):  # this makes the new goal set window pop up
+        # creates pop-up window to adjust the goal
+        self.goalset_window = Toplevel()
+        self.goalset_window.title("Enter New Goal")
+        self.goalset_window.lift()
+        tracing.event(tracing.WINDOW, tracing.GOAL_WINDOW)
+
+        # title/prompt
+        goal_lbl = Label(self.goalset_window, text="Please Enter Your New Goal:", font=("calibri", 30))
+        goal_lbl.grid(row=0, column=0, columnspan=4, sticky=NSEW, padx=65, pady=30)
+
+        # dollar sign
+        goal_sign = Label(self.goalset_window, text="$", font=("calibri", 24))
+        goal_sign.grid(row=1, column=0, sticky=E, padx=15)
+
+        # creates the entry box for the new goal
+        self.goal_var = IntVar()
+        self.goal_entry = Entry(self.goalset_window, font=("calibri", 24), width=15, textvariable=self.goal_var)
+        self.goal_entry.grid(row=1, column=1, sticky=W)
+        self.goal_entry.focus_set()  # this sets the focus so the box is already ready to be typed in
+        self.goal_entry.delete(0, END)  # IntVar shows a default 0 so this clears the box w/out causing an error
+        self.goalset_window.bind('<Return>', lambda event: self.new_goal())  # allows user to press enter to submit
+
+        # the bottom buttons (cancel & confirm)
+        goal_style = Style()
+        goal_style.configure('goal.TButton', font=("calibri", 15, "bold"))
+        goal_cancel = Button(self.goalset_window, text="Cancel", style="goal.TButton",
+                             command=self.goalset_window.destroy)
+        goal_cancel.grid(row=2, column=0, padx=40, pady=30)
+
+        goal_submit = Button(self.goalset_window, text="Confirm", style="goal.TButton",
+                             command=lambda: self.new_goal())
+        goal_submit.grid(row=2, column=2, padx=40, sticky=E)
+
+
+    def new_goal(self):  # this updates the budget window after the goal is set
+        try: # checks if there is no error
+            goal = self.goal_var.get()  # retrieves value from the text box
+
+            isYes = tkinter.messagebox.askyesno("Confirm", f"You entered: ${goal}. \nIs this correct?")
+            if isYes == True:  # asks the user if they are sure they want to continue
+                self.ledger.set_goal(to_cents(goal))  # saves the entered number as the new goal (right away)
+                tracing.event(tracing.GOAL, self.ledger.goal)
+                self.goalset_window.destroy()  # closes the dollar entry window after
+                self.budget.window.lift()  # lifts the budget window so it's not behind the main window
+                # (the goal label & progress bar update themselves since the budget window listens to the ledger)
+
+            else:  # if user enters no, it just continues
+                self.goalset_window.lift() # brings window back to front
+                self.goal_entry.focus_set()
+                pass
+        except:  # runs if the entered value produces an error & allows user to retry
+            tkinter.messagebox.showerror("Error", "Please enter a number in the box.")
+            self.goalset_window.lift()  # brings window to the front after error message is closed
+            self.goal_entry.focus_set()
+            tracing.event(tracing.BAD_ENTRY, tracing.GOAL_WINDOW)  # most likely not a number, or the box was empty
+
+
+    def set_ratios(self):  # this makes the window to change the jar percentages pop up
+        self.ratios_window = Toplevel()
+        self.ratios_window.title("Enter New Percentages")
+        self.ratios_window.lift()
+        tracing.event(tracing.WINDOW, tracing.RATIOS_WINDOW)
+
+        # title/prompt
+        ratios_lbl = Label(self.ratios_window, text="How Much Goes In Each Jar?", font=("calibri", 30))
+        ratios_lbl.grid(row=0, column=0, columnspan=len(JARS) * 2, sticky=NSEW, padx=65, pady=30)
+
+        # one entry box for each jar, starting at the current percentages
+        self.ratio_vars = []
+        for jar, (name, ratio) in enumerate(zip(JARS, self.ledger.jars.ratios)):
+            jar_lbl = Label(self.ratios_window, text=name.capitalize(), font=("calibri", 24))
+            jar_lbl.grid(row=1, column=jar * 2, sticky=E, padx=15)
+            ratio_var = IntVar(self.ratios_window, ratio)
+            ratio_entry = Entry(self.ratios_window, font=("calibri", 24), width=4, textvariable=ratio_var)
+            ratio_entry.grid(row=1, column=jar * 2 + 1, sticky=W)
+            self.ratio_vars.append(ratio_var)
+        self.ratios_window.bind('<Return>', lambda event: self.new_ratios())
+
+        # the bottom buttons (cancel & confirm)
+        ratios_style = Style()
+        ratios_style.configure('ratios.TButton', font=("calibri", 15, "bold"))
+        ratios_cancel = Button(self.ratios_window, text="Cancel", style="ratios.TButton",
+                               command=self.ratios_window.destroy)
+        ratios_cancel.grid(row=2, column=0, columnspan=2, padx=40, pady=30)
+        ratios_submit = Button(self.ratios_window, text="Confirm", style="ratios.TButton",
+                               command=lambda: self.new_ratios())
+        ratios_submit.grid(row=2, column=len(JARS) * 2 - 2, columnspan=2, padx=40, sticky=E)
+
+    def new_ratios(self):  # saves the percentages from the percentage window (new deposits are split this way)
+        try:
+            ratios = [ratio_var.get() for ratio_var in self.ratio_vars]
+        except TclError:
+            ratios = None
+        if ratios is None or sum(ratios) != 100 or min(ratios) < 0:
+            tkinter.messagebox.showerror("Error", "Please enter whole numbers that add up to 100.")
+            self.ratios_window.lift()
+            return
+        self.ledger.set_ratios(ratios)  # saved right away (the budget window updates itself)
+        tracing.event(tracing.RATIOS, *ratios)
+        self.ratios_window.destroy()
+        self.budget.window.lift()
+
+    # runs if the savings goal is reached (can be added to). hit is the rule that was reached (see rules.py)
+    def goalreached(self, hit):
+        if self.lcd is not None:
+            self.lcd.text("Goal reached!", 1)
+        tkinter.messagebox.showinfo("Goal Reached!", "You saved {} for your goal of {}!"
+                                    .format(format_cents(hit.cents), format_cents(self.ledger.goal)))
+
+    # runs when milestones or jar amounts are reached, all in one message if a few were reached at once
+    def milestone(self, hits):
+        if self.lcd is not None:
+            self.lcd.text("{}!".format(hits[-1].rule.name), 1)
+        tkinter.messagebox.showinfo("Well Done!", "\n".join("{}!".format(hit.rule.name) for hit in hits))
+
+
+# the budget window. It's built once (the first time Budget is pressed) and after that Cancel/OK just hide it. It
+# listens to the ledger, so while coins come in only the labels whose text actually changed and the progress bar are
+# updated, and it can stay open and live the whole time
+class BudgetWindow:
+    def __init__(self, gui):
+        self.gui = gui
+        self.shown = {}  # the text each label was last set to, so unchanged labels aren't touched
+
+        # these are all for resizing purposes
+        title_font= 35
+        balance_font = 28
+        label_font = 25
+        title2_font = 30
+        label_y = 30
+        x_space = 190
+
+        # creates budgetting window
+        self.window = Toplevel()
+        self.window.title("Budget Info")
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)  # closing it just hides it so it can be shown again
+
+        # this is the title of the page (can change this later)
+        w2_l1 = Label(self.window, text="This is Where You Budget!", font=('Georgia', title_font, 'bold'))
+        w2_l1.grid(row=0, column=0, sticky=NSEW, columnspan=4, padx=x_space, pady=10)
+
+        # show current total
+        self.total_label = Label(self.window, font=('Calibri', balance_font, 'bold'))
+        self.total_label.grid(row=1, column=0, sticky=NSEW, columnspan=4, padx=x_space, pady=25)
+
+        # labels the different categories
+        give_cat = Label(self.window, text="Give", font=('Calibri', label_font, 'bold'))
+        give_cat.grid(row=2, column=1, sticky=NSEW, pady=label_y, padx=58)
+        save_cat = Label(self.window, text="Save", font=('Calibri', label_font, 'bold'))
+        save_cat.grid(row=2, column=2, sticky=NSEW, pady=label_y, padx=58)
+        spend_cat = Label(self.window, text="Spend", font=('Calibri', label_font, 'bold'))
+        spend_cat.grid(row=2, column=3, sticky=NSEW, pady=label_y, padx=58)
+
+        # shows the different percentages the money is divided by (each account has its own, see Adjust %)
+        percents = Label(self.window, text="Percentage:", font=('Calibri', label_font, 'bold'))
+        percents.grid(row=3, column=0, sticky=NSEW, pady=label_y, padx=15)
+        self.percent_labels = []
+        for jar in range(len(JARS)):
+            percent = Label(self.window, font=('Calibri', label_font, 'bold', 'underline'))
+            percent.grid(row=3, column=jar + 1, sticky=NSEW, pady=label_y, padx=60)
+            self.percent_labels.append(percent)
+
+        # shows the amount of money in each category (each jar's own balance, kept up to date by the ledger)
+        amounts = Label(self.window, text="Amounts:", font=('Calibri', label_font, 'bold'))
+        amounts.grid(row=4, column=0, sticky=NSEW, pady=label_y, padx=15)
+        self.amount_labels = []
+        for jar in range(len(JARS)):
+            amount = Label(self.window, font=('Calibri', label_font))
+            amount.grid(row=4, column=jar + 1, sticky=NSEW, pady=label_y, padx=55)
+            self.amount_labels.append(amount)
+
+        # goal section with progress Bar
+        goal_title = Label(self.window, text="\tSavings Goal Progress:", font=('Calibri', title2_font, 'bold'))
+        goal_title.grid(row=5, column=0, sticky=NSEW, columnspan=4, padx=x_space, pady=25)
+
+        self.goalshow = Label(self.window, font=('Calibri', label_font))
+        self.goalshow.grid(row=6, column=0, sticky=NSEW, pady=label_y, padx=15)
+
+        self.bar_val = None
+        self.save_bar = Progressbar(self.window, length=570, maximum=100)
+        self.save_bar.grid(row=6, column=1, columnspan=3, pady=label_y, padx=55)
+
+        # the savings trend: what was put in and how much of it went in the save jar for each of the last few months
+        # (read from the monthly rollups, so it doesn't matter how long the history is)
+        trend_title = Label(self.window, text="Each Month:", font=('Calibri', label_font, 'bold'))
+        trend_title.grid(row=7, column=0, sticky=NSEW, pady=label_y, padx=15)
+        self.trend_labels = []
+        self.trend_month = None  # the month the trend labels end at (they're all redone when it changes)
+        self.trend_ledger = None
+        for month in range(TREND_MONTHS):
+            trend = Label(self.window, font=('Calibri', label_font - 7))
+            trend.grid(row=7, column=month + 1, sticky=NSEW, pady=label_y, padx=55)
+            self.trend_labels.append(trend)
+        self.past_weeks = []  # the save jar's change for each week before this one, what the forecast goes by
+        self.forecast_week = None  # the week past_weeks was worked out in (it's redone when it changes)
+        self.forecast_ledger = None
+        self.eta_days = None  # the forecast last shown (today and the days from it) and its text
+        self.eta_shown = ""
+
+        # the bottom buttons
+        w2_style = Style()
+        w2_style.configure('w2.TButton', font=("Calibri", gui.button_font))
+        w2_setgoal = Button(self.window, text="Adjust Goal", style="w2.TButton", command=lambda: gui.set_goal())
+        w2_setgoal.grid(row=8, column=0, pady=label_y)
+
+        w2_setratios = Button(self.window, text="Adjust %", style="w2.TButton", command=lambda: gui.set_ratios())
+        w2_setratios.grid(row=8, column=1, pady=label_y)
+
+        w2_cancel = Button(self.window, text="Cancel",style="w2.TButton", command=self.hide)
+        w2_cancel.grid(row=8, column=2, pady=label_y)
+
+        w2_submit = Button(self.window, text="OK", style="w2.TButton", command=self.hide)
+        w2_submit.grid(row=8, column=3, padx=label_y)
+
+        self.refresh(gui.ledger)
+        gui.ledger.subscribe(self.changed)
+
+    # called by the ledger after every transaction or goal change
+    def changed(self, ledger, index):
+        self.refresh(ledger)
+
+    # sets a label's text only if it's different from what it already says
+    def set_text(self, label, text):
+        if self.shown.get(label) != text:
+            label["text"] = text
+            self.shown[label] = text
+
+    # shows the jar balances the ledger already has and updates whatever changed
+    def refresh(self, ledger):
+        whole = sum(ledger.jars.ratios)
+        self.set_text(self.total_label, "\tCurrent Total: {}".format(ledger.format_total()))
+        for jar in range(len(JARS)):
+            self.set_text(self.percent_labels[jar], "{:g}%".format(ledger.jars.ratios[jar] * 100 / whole))
+            self.set_text(self.amount_labels[jar], format_cents(ledger.jars.balances[jar]))
+        self.save = ledger.jars.balances[SAVE]  # in cents
+        self.set_text(self.goalshow, "{} / {}\n{}".format(format_cents(self.save), format_cents(ledger.goal),
+                                                          self.eta_text(ledger)))
+        # only this month's totals change with a coin, the earlier months are only redone when the month changes
+        # (or for a different account)
+        month = bucket_key(MONTH, datetime.date.today())
+        if month != self.trend_month or ledger is not self.trend_ledger:
+            self.trend_month, self.trend_ledger = month, ledger
+            months = self.gui.bank.rollups.trend(MONTH, TREND_MONTHS)
+        else:
+            months = [(month, self.gui.bank.rollups.buckets[MONTH].get(month, [0] * len(FIELDS)))]
+        saved = FIELDS.index(JARS[SAVE])
+        for trend, (month, bucket) in zip(self.trend_labels[-len(months):], months):
+            self.set_text(trend, "{}\nIn: {}  Saved: {}".format(label(MONTH, month), format_cents(bucket[DEPOSITS]),
+                                                               format_cents(bucket[saved])))
+
+        bar_val = (self.save / ledger.goal) * 100 if ledger.goal > 0 else 100
+        if bar_val != self.bar_val:  # updates the savings progress bar
+            self.bar_val = bar_val
+            # if the widget reaches 100% it resets so this shows the bar as full if the goal is reached/exceeded
+            # without resetting (reaching the goal itself is celebrated by the rules, see GUI.goalreached)
+            self.save_bar["value"] = min(bar_val, 99.9)
+
+    # when the goal should be reached at the rate money has been going in the save jar, with the soonest & latest
+    # it's likely to be. The rate only goes up to last week, so a coin only changes how much is left to save
+    def eta_text(self, ledger):
+        rollups = self.gui.bank.rollups
+        today = datetime.date.today()
+        week = bucket_key(WEEK, today)
+        if week != self.forecast_week or ledger is not self.forecast_ledger:
+            self.forecast_week, self.forecast_ledger = week, ledger
+            self.past_weeks = weekly_savings(rollups)
+        guess = estimate(self.past_weeks, ledger.goal - ledger.jars.balances[SAVE])
+        days = (today,) + tuple(None if weeks is None else math.ceil(weeks * 7) for weeks in guess[1:])
+        if days != self.eta_days:
+            self.eta_days = days
+            if guess.weeks == 0:
+                self.eta_shown = "Goal reached!"
+            elif guess.weeks is None:
+                self.eta_shown = "Keep saving to see when"
+            else:
+                self.eta_shown = "About {}\n({} to {})".format(*[format_date(eta_date(weeks, today), today)
+                                                                for weeks in guess[1:]])
+        return self.eta_shown
+
+    def show(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def hide(self):
+        self.window.withdraw()
+
+
+#######################################################################################################################
+
+# executes at the end of the program when the user hits save
+# (every change is already in the journal, this just takes a snapshot so the next start up is quick)
+def save_changes(bank):
+    begin = metrics.now()
+    bank.save()  # saves the balance & goal and empties the journal
+    SAVE_TIME.since(begin)
+    tracing.event(tracing.SAVE, bank.ledger.total, bank.ledger.goal)
+
+
+# an error in a button's (or an after()'s) function. Tk only prints these and keeps going, so they never get to
+# sys.excepthook, this saves the traced events too (see tracing.py)
+def callback_error(kind, error, trace):
+    tracing.failed(error)
+    traceback.print_exception(kind, error, trace)
+
+
+# creates the main GUI window for an opened Bank and runs it until the window is closed. If startup_only is given,
+# it's called once the first frame has been drawn and the window is closed right after (for the startup benchmark)
+def run(bank, startup_only=None):
+    window1 = Tk()
+    window1.title("Smart Piggy Bank")  # set window title
+    window1.geometry("1500x800+65+55")  # set position of the window for raspberry pi
+    window1.report_callback_exception = callback_error
+
+    t = GUI(window1, bank)  # create object in GUI class
+    t.setupGUI()  # begin the setup process
+    # the coin buttons and the GUI run together: the buttons queue coins from the GPIO thread & the GUI picks them up
+    # (so do the parents' decisions & the rules reached), and it pays the allowance & interest when they're due
+    if t.rules is not None:
+        t.rules.hook(t.reached.put)
+    if bank.coins is not None or t.approvals is not None or t.rules is not None or bank.schedule is not None:
+        t.tick()
+
+    if startup_only is not None:
+        window1.update()  # draws the first frame
+        startup_only()
+        window1.destroy()
+        return t
+    window1.mainloop()
+    return t
@@ -0,0 +1,98 @@
+#####################################################################################################################
+# NAMES: Makenzie Moore and Hallie Burgess
+# DATE: 4/25/2024
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: This is a independent portion of the Smart Piggy Bank financial tracker system. This product is geared
+# towards children with the goal of teaching financial literacy & establishing healthy financial habits using the 3
+# Jar System. It runs with only the coin buttons and the LCD (no GUI). With --shared coins it doesn't keep the money
+# itself, it sends the coins to the bank process (the GUI) through shared memory and shows the total it gets back.
+#####################################################################################################################
+
+import queue
+import time
+
+from . import metrics, tracing
+from .ledger import format_cents
+from .rules import GOAL
+from .scheduler import describe
+
+COIN_DELAY = metrics.histogram("smartbank_coin_to_screen_seconds", "Time from a coin press until it's on screen")
+
+
+# waits for each coin press and adds its value. get() sleeps until a button callback puts a coin in the queue, so
+# the pi isn't kept busy while nothing is happening, and coins pressed while the LCD is updating just wait their turn.
+# The allowance & interest are paid from here too when they're due, so only this thread changes the ledger
+def run(bank, startup_only=None):
+    if bank.coins is None:
+        raise SystemExit("Headless mode needs the coin buttons (try --gpio rpi or --gpio fake).")
+    lcd = bank.lcd
+    if bank.rules is not None:
+        bank.rules.hook(lambda hit: celebrate(hit, lcd))
+    if startup_only is not None:
+        if lcd is not None:
+            lcd.flush()  # waits for the first frame to be on the LCD
+        startup_only()
+        return
+    try:
+        while True:
+            try:  # waits for a coin, or until the next allowance or interest is due
+                coin = bank.coins.get(timeout=bank.schedule.wait() if bank.schedule is not None else None)
+            except queue.Empty:
+                payout = bank.schedule.run()
+                if payout is not None and lcd is not None:
+                    lcd.text(describe(payout), 1)
+                    lcd.text("Total: {}".format(bank.ledger.format_total()), 2)
+                continue
+            bank.ledger.deposit(coin.value)  # saved right away, so a power cut doesn't lose it
+            if lcd is not None:
+                lcd.text("{} added!".format(coin.name), 1)
+                lcd.text("Total: {}".format(bank.ledger.format_total()), 2)
+            delay = time.monotonic() - coin.time  # coin times are from time.monotonic()
+            COIN_DELAY.observe(delay)
+            tracing.event(tracing.COIN, coin.value, coin.pin, int(delay * 1e6))
+    except KeyboardInterrupt:  # Ctrl + C saves the new total
+        for coin in bank.coins.drain():  # counts any coins that came in right before Ctrl + C
+            bank.ledger.deposit(coin.value)
+        bank.save()  # saves a snapshot of the total and empties the journal
+
+
+# shows a goal or milestone that was reached (see rules.py). It runs on the rules thread, the LCD can be written from
+# any thread (the rules trace what was reached themselves, see tracing.py)
+def celebrate(hit, lcd):
+    if lcd is not None:
+        lcd.text("{}!".format("Goal reached" if hit.rule.kind == GOAL else hit.rule.name), 1)
+
+
+# the coin process (--shared coins): sends each coin to the bank process instead of saving it here, so the GUI and
+# the coin buttons can run at the same time without one of them saving its total over the other's (see shm.py)
+def run_coins(coins, lcd=None, startup_only=None):
+    from .shm import CoinSender
+    if coins is None:
+        raise SystemExit("The coin process needs the coin buttons (try --gpio rpi or --gpio fake).")
+    if startup_only is not None:
+        startup_only()
+        return
+    sender = CoinSender(lcd=lcd)
+    coins.start()
+    try:
+        while True:
+            coin = coins.get()
+            seq = sender.send(coin.time, coin.pin, coin.value)
+            if lcd is not None:
+                lcd.text("{} added!".format(coin.name), 1)
+                balance = sender.channel.balance_after(seq) if sender.channel is not None else None
+                if balance is not None:
+                    lcd.text("Total: {}".format(format_cents(balance.total)), 2)
+    except KeyboardInterrupt:  # Ctrl + C sends any coins that came in right before it
+        for coin in coins.drain():
+            sender.send(coin.time, coin.pin, coin.value)
+    finally:
+        lost = sender.close()  # waits for the bank to save the last coins
+        if lost:
+            tracing.event(tracing.UNSAVED, len(lost), sum(cents for when, pin, cents in lost))
+            try:
+                tracing.TRACER.dump("the bank didn't save {} coins".format(len(lost)))  # kept for after it exits
+            except OSError:
+                pass
+            if lcd is not None:
+                lcd.text("Coins not saved!", 1)
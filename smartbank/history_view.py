@@ -0,0 +1,122 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: The history panel on the right side of the GUI. The old panel was a ScrolledText that every deposit
+# was added to, so it kept growing and got slow after a long session. This one only keeps the newest entries in a
+# ring buffer, only ever draws the lines that fit on the screen, and asks for older entries when they're scrolled to.
+#####################################################################################################################
+
+import tkinter as tk
+from collections import deque  # with a maxlen it works as a ring buffer (the oldest entry falls off the front)
+from tkinter import ttk
+
+HEADER = ["This keeps track of ", "the changes you make!", "", "+/-\tBalance", "-----\t-----------"]
+CAPACITY = 500  # how many of the newest entries are kept in memory
+LINES_PER_ENTRY = 2  # each entry is the change ("+ $0.25") then the new balance under it
+
+
+# a scrollable history of changes that takes the same time to add to at entry 10 or entry 1,000,000
+class HistoryView(tk.Frame):
+    # rows is how many lines fit in the box. loader(index) is called for entries that have fallen out of the ring
+    # buffer and should return the same (change, balance) text pair that was added for that entry
+    def __init__(self, master, rows=27, width=20, font=None, capacity=CAPACITY, loader=None):
+        tk.Frame.__init__(self, master)
+        self.rows = rows
+        self.loader = loader
+        self.ring = deque(maxlen=capacity)  # (change, balance) text for the newest entries
+        self.count = 0  # how many entries there are in total (including ones no longer in the ring)
+        self.header = HEADER + [""]  # the last header line is the starting balance (set by reset)
+        self.top = 0  # the first line that is showing
+        self.follow = True  # keeps showing the newest entry until the user scrolls up
+
+        self.text = tk.Text(self, height=rows, width=width, wrap="none")
+        if font is not None:
+            self.text.configure(font=font)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.text.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1))
+        self.text.bind("<Button-4>", lambda event: self.scroll(-1))  # mouse wheel on the pi (X11)
+        self.text.bind("<Button-5>", lambda event: self.scroll(1))
+        self.text.configure(state="disabled")  # the user can't type in it
+
+    # starts the history over from a new starting balance
+    def reset(self, balance_text):
+        self.ring.clear()
+        self.count = 0
+        self.header[-1] = "\t" + balance_text
+        self.top = 0
+        self.follow = True
+        self.render()
+
+    # adds one entry to the bottom (O(1) for the ring, then redraws the few lines that are showing)
+    def add(self, change_text, balance_text):
+        self.ring.append((change_text, balance_text))
+        self.count += 1
+        if self.follow:
+            self.top = self.bottom()
+        self.render()
+
+    # removes the newest entry (for undo)
+    def pop(self):
+        if self.count == 0:
+            return
+        if self.ring:
+            self.ring.pop()
+        self.count -= 1
+        self.top = min(self.top, self.bottom())
+        if self.follow:
+            self.top = self.bottom()
+        self.render()
+
+    def total_lines(self):
+        return len(self.header) + self.count * LINES_PER_ENTRY
+
+    # the top line when scrolled all the way down
+    def bottom(self):
+        return max(0, self.total_lines() - self.rows)
+
+    # the text of one entry, from the ring buffer if it's recent or from the loader if not
+    def entry(self, index):
+        first = self.count - len(self.ring)  # the index of the oldest entry still in the ring
+        if index >= first:
+            return self.ring[index - first]
+        if self.loader is not None:
+            return self.loader(index)
+        return ("...", "")
+
+    # the text of one line of the whole history
+    def line(self, number):
+        if number < len(self.header):
+            return self.header[number]
+        index, part = divmod(number - len(self.header), LINES_PER_ENTRY)
+        return self.entry(index)[part]
+
+    # draws only the lines that fit in the box and moves the scrollbar to match
+    def render(self):
+        last = min(self.top + self.rows, self.total_lines())
+        lines = [self.line(number) for number in range(self.top, last)]
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("end", "\n".join(lines))
+        self.text.configure(state="disabled")
+        total = self.total_lines()
+        self.scrollbar.set(self.top / total, last / total)
+
+    # moves the view to a line (kept in range) and remembers if it's at the bottom so new entries stay in view
+    def scroll_to(self, top):
+        self.top = max(0, min(int(top), self.bottom()))
+        self.follow = self.top == self.bottom()
+        self.render()
+
+    # scrolls by a number of lines
+    def scroll(self, lines):
+        self.scroll_to(self.top + lines)
+        return "break"  # stops the Text widget from trying to scroll itself
+
+    # called by the scrollbar when it's dragged or its arrows are clicked
+    def yview(self, action, amount, what=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.total_lines())
+        elif action == "scroll":
+            step = self.rows if what == "pages" else 1
+            self.scroll(int(amount) * step)
@@ -0,0 +1,85 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: The 3 jars (give, save & spend). Each deposit is split between the jars when it's posted, using the
+# account's percentages, and each jar keeps its own running balance. Cents that can't be split evenly are tracked as
+# leftover fractions ("carry") so over many deposits every jar gets exactly its share. A withdrawal comes out of one
+# jar, so the jars remember where the money actually went.
+#####################################################################################################################
+
+JARS = ("give", "save", "spend")
+GIVE, SAVE, SPEND = range(3)  # index of each jar in balances, ratios & splits
+DEFAULT_RATIOS = (10, 20, 70)  # the percentage of each deposit that goes in each jar
+
+
+# turns the text "10,20,70" (how ratios are saved) into (10, 20, 70) and back
+def parse_ratios(text):
+    ratios = tuple(int(part) for part in text.split(","))
+    check_ratios(ratios)
+    return ratios
+
+
+def format_ratios(ratios):
+    return ",".join(str(ratio) for ratio in ratios)
+
+
+def check_ratios(ratios):
+    if len(ratios) != len(JARS) or any(ratio < 0 for ratio in ratios) or sum(ratios) <= 0:
+        raise ValueError("jar percentages must be {} numbers that aren't negative: {!r}".format(len(JARS), ratios))
+
+
+# the balance of each jar plus what's needed to keep splitting deposits exactly
+class Jars:
+    def __init__(self, ratios=DEFAULT_RATIOS, balances=None, carry=None):
+        check_ratios(ratios)
+        self.ratios = tuple(ratios)
+        self.balances = list(balances) if balances is not None else [0] * len(JARS)  # in cents
+        # each jar's leftover fraction of a cent, in 1/sum(ratios) of a cent
+        self.carry = list(carry) if carry is not None else [0] * len(JARS)
+
+    # starts jars from an old balance that was never split (splits it as one deposit)
+    @classmethod
+    def from_total(cls, total, ratios=DEFAULT_RATIOS):
+        jars = cls(ratios)
+        jars.apply(jars.allocate(total) if total >= 0 else jars.withdraw_split(-total, SPEND))
+        return jars
+
+    # works out how much of a deposit goes in each jar. Always adds up to exactly cents, never takes anything out of
+    # a jar, and only ever loops over the 3 jars (not the cents) so it's O(1) whatever the amount
+    def allocate(self, cents):
+        whole = sum(self.ratios)
+        owed = [carry + cents * ratio for carry, ratio in zip(self.carry, self.ratios)]
+        shares = [max(0, amount // whole) for amount in owed]
+        carry = [amount - share * whole for amount, share in zip(owed, shares)]
+        left = cents - sum(shares)
+        while left > 0:  # a cent that couldn't be split goes to the jar that's owed the most
+            jar = max(range(len(JARS)), key=lambda i: carry[i])
+            shares[jar] += 1
+            carry[jar] -= whole
+            left -= 1
+        while left < 0:  # or comes back from the jar that's owed the least (only if a jar was rounded up before)
+            jar = min((i for i in range(len(JARS)) if shares[i] > 0), key=lambda i: carry[i])
+            shares[jar] -= 1
+            carry[jar] += whole
+            left += 1
+        self.carry = carry
+        return tuple(shares)
+
+    # the change to each jar for taking cents out of one jar
+    def withdraw_split(self, cents, jar=SPEND):
+        split = [0] * len(JARS)
+        split[jar] = -cents
+        return tuple(split)
+
+    # changes the jar balances by a split (from allocate, withdraw_split, or an adjustment)
+    def apply(self, split):
+        for jar, change in enumerate(split):
+            self.balances[jar] += change
+
+    # new percentages. The leftover fractions were for the old ones, so they start over
+    def set_ratios(self, ratios):
+        check_ratios(ratios)
+        self.ratios = tuple(ratios)
+        self.carry = [0] * len(JARS)
+
+    def copy(self):
+        return Jars(self.ratios, self.balances, self.carry)
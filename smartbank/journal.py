@@ -0,0 +1,387 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Crash-safe saving for the Smart Piggy Bank. Every deposit, withdrawal and goal change is added to the
+# end of a journal file as soon as it happens, instead of rewriting the balance file when Save is pressed. Writes are
+# grouped together before being forced to the SD card, and every so often a snapshot of the balance is saved so the
+# journal can be emptied and startup only has to replay the few records written after it. Each record also says how
+# much it changed each of the 3 jars (see jars.py), so the jar balances come back exactly as they were.
+#####################################################################################################################
+
+import os  # for fsync, replace and making sure files actually reach the SD card
+try:
+    import fcntl  # for locking the journal so only one process writes it (not on Windows, where it isn't locked)
+except ImportError:
+    fcntl = None
+import threading  # for the timer that syncs the journal in the background
+import uuid  # for the epoch of a new journal
+import zlib  # crc32 checksum on each record to catch half-written lines after a power cut
+from decimal import Decimal, InvalidOperation
+
+from . import metrics
+from .jars import Jars, JARS, SPEND, format_ratios, parse_ratios
+
+JOURNAL_FILE = "smart_bank_journal.txt"  # one line per transaction, only ever added to
+SNAPSHOT_FILE = "smart_bank_snapshot.txt"  # the balance & goal as of a journal record, replaced as a whole
+BALANCE_FILE = "smart_bank_balance.txt"  # the old save files (next to the journal), still written on checkpoint &
+GOAL_FILE = "smart_bank_goal.txt"  # read once to upgrade
+LOCK_SUFFIX = ".lock"  # the lock file is the journal's name with this on the end
+
+SYNC_INTERVAL = 1.0  # most seconds a transaction can wait before it's forced to disk (the durability window)
+SYNC_BATCH = 50  # journal is forced to disk right away once this many transactions are waiting
+SNAPSHOT_EVERY = 1000  # a snapshot is taken (and the journal emptied) after this many transactions
+DEFAULT_GOAL = 500  # default savings goal in cents ($5)
+OLD_EPOCH = "0"  # the epoch of a journal whose snapshot is from before there were epochs
+
+# the kinds of journal records. amounts are always whole cents
+DEPOSIT = "D"  # adds to the balance
+WITHDRAW = "W"  # subtracts from the balance
+ADJUST = "C"  # signed change, used when changes are cleared or cancelled
+GOAL = "G"  # sets the savings goal
+RATIOS = "R"  # sets the jar percentages (they're saved where the jar changes usually are)
+NO_SPLIT = (0,) * len(JARS)
+
+APPEND_TIME = metrics.histogram("smartbank_journal_append_seconds", "Time to add one record to the journal")
+SYNC_TIME = metrics.histogram("smartbank_journal_sync_seconds", "Time to force the journal to disk (fsync)")
+
+
+# works out how much a transaction changes each jar. Deposits are split by the percentages (this also moves the
+# jars' leftover cent fractions along, so it's called once for every deposit, in order), withdrawals come out of one
+# jar (spend unless split says otherwise), and adjustments use split if they're given one
+def jar_split(jars, kind, cents, split=None):
+    if kind == DEPOSIT:
+        allocated = jars.allocate(cents)
+        return allocated if split is None else tuple(split)
+    if split is not None:
+        return tuple(split)
+    if kind == WITHDRAW:
+        return jars.withdraw_split(cents, SPEND)
+    if kind == ADJUST:
+        return jars.allocate(cents) if cents >= 0 else jars.withdraw_split(-cents, SPEND)
+    return NO_SPLIT
+
+
+# turns a saved record into the text line written in the journal (with a checksum on the end)
+def format_record(seq, kind, cents, split=NO_SPLIT):
+    body = "{} {} {} {}".format(seq, kind, cents, " ".join(str(change) for change in split))
+    return "{} {:08x}\n".format(body, zlib.crc32(body.encode()))
+
+
+# reads one journal line back as (seq, kind, cents, split). returns None if the line is cut off or damaged. Records
+# from before there were jars have no split (it's None) and are split the usual way when they're replayed
+def parse_record(line):
+    if not line.endswith("\n"):  # the last line was only partly written
+        return None
+    parts = line.split()
+    if len(parts) not in (4, 4 + len(JARS)):
+        return None
+    body = " ".join(parts[:-1])
+    try:
+        if int(parts[-1], 16) != zlib.crc32(body.encode()):
+            return None
+        seq, kind, cents = int(parts[0]), parts[1], int(parts[2])
+        split = tuple(int(part) for part in parts[3:-1]) or None
+    except ValueError:
+        return None
+    if kind not in (DEPOSIT, WITHDRAW, ADJUST, GOAL, RATIOS):
+        return None
+    return seq, kind, cents, split
+
+
+# writes a small file so it's either all there or not changed at all (never half written or missing)
+def write_atomic(path, text):
+    temp = path + ".tmp"
+    with open(temp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)  # swapping the new file in is a single step, unlike deleting then writing
+    try:  # makes sure the rename itself is saved
+        folder = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:  # not possible on every system (like Windows)
+        return
+    try:
+        os.fsync(folder)
+    finally:
+        os.close(folder)
+
+
+# reads the first line of one of the old save files as whole cents. returns None if it can't
+def read_old_file(path):
+    try:
+        with open(path, "r") as f:
+            cents = Decimal(f.readline().strip()) * 100  # works for "12", "12.5" and "-3.25" (old files had all three)
+    except (OSError, InvalidOperation):
+        return None
+    return int(cents.to_integral_value()) if cents.is_finite() else None
+
+
+# the seq of a journal line (0 if it's damaged)
+def record_seq(line):
+    record = parse_record(line)
+    return 0 if record is None else record[0]
+
+
+# the seq of the first record in a journal file (0 if it's damaged)
+def first_seq(path):
+    with open(path, "r") as f:
+        return record_seq(f.readline())
+
+
+# every readable record in a journal file with a seq after the one given, as (seq, kind, cents, split)
+def read_records(path, after=0):
+    records = []
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                record = parse_record(line)
+                if record is None:
+                    break
+                if record[0] > after:
+                    records.append(record)
+    return records
+
+
+# keeps the balance & goal saved as an append-only journal plus the latest snapshot
+class Journal:
+    def __init__(self, path=JOURNAL_FILE, snapshot_path=SNAPSHOT_FILE, sync_interval=SYNC_INTERVAL,
+                 sync_batch=SYNC_BATCH, snapshot_every=SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        self.snapshot_every = snapshot_every
+        self.balance = 0  # in cents
+        self.goal = DEFAULT_GOAL  # in cents
+        self.jars = Jars()  # the balance of each jar and the percentages
+        self.seq = 0  # number of the last record written
+        self.snapshot_seq = 0  # number of the last record included in the snapshot
+        self.epoch = None  # a random id made when the journal starts (its seqs start at 1 again), see sync.py
+        self.replayed = 0  # how many records had to be replayed at startup
+        self.replay_log = []  # (seq, signed change, jar changes) of each transaction replayed (for the rollups)
+        self.checkpoint_listeners = []  # called with the seq of each snapshot, before the journal is emptied
+        self.record_listeners = []  # called with (seq, kind, cents, jar changes) after each record is written
+        self.sync_listeners = []  # called with the seq each time the journal is forced to disk (everything up to it)
+        self.keep_after = None  # records after this seq are kept when the journal is emptied (not synced yet)
+        self.pending = 0  # records written but not forced to disk yet
+        self.syncs = 0  # how many times the journal was forced to disk (the SD card writes that matter)
+        self.file = None
+        self.timer = None
+        self.lock = threading.Lock()  # the GUI, GPIO and timer threads can all write
+        self.lock_file = None  # held open (and locked) from load() until close()
+
+    # reads the snapshot and replays the journal after it, then opens the journal to add to it
+    def load(self):
+        self.take_lock()
+        snapshot = self.read_snapshot()
+        upgraded = False
+        if snapshot is not None:
+            self.snapshot_seq, self.balance, self.goal, self.jars, self.epoch = snapshot
+        elif not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            # first run after upgrading, so it reads the old save files once. An empty journal with no snapshot was
+            # emptied by a checkpoint whose snapshot has since been lost, and the old files were saved just before
+            balance = read_old_file(self.old_file(BALANCE_FILE))
+            goal = read_old_file(self.old_file(GOAL_FILE))
+            self.balance = 0 if balance is None else balance
+            self.goal = DEFAULT_GOAL if goal is None else goal
+            self.jars = Jars.from_total(self.balance)  # the old balance was never split, so it's split now
+            self.epoch = uuid.uuid4().hex  # the seqs start again from here
+            upgraded = True
+        elif first_seq(self.path) != 1:  # the journal was compacted, so it doesn't start at 0 without the snapshot
+            self.close()
+            raise ValueError("{} is missing or damaged and {} only has the transactions after it, so the balance "
+                             "can't be worked out".format(self.snapshot_path, self.path))
+        else:  # the snapshot was lost before the first checkpoint, but the whole journal is there to replay
+            self.epoch = uuid.uuid4().hex
+        self.seq = self.snapshot_seq
+
+        good_size = 0  # how much of the journal is readable, anything after it gets cut off
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    record = parse_record(line)
+                    if record is None:  # torn write from a power cut, nothing after it can be trusted
+                        break
+                    good_size += len(line.encode())
+                    seq, kind, cents, split = record
+                    if seq <= self.snapshot_seq:  # already part of the snapshot
+                        continue
+                    split = self.apply(kind, cents, split)
+                    self.seq = seq
+                    self.replayed += 1
+                    if kind in (DEPOSIT, WITHDRAW, ADJUST):
+                        self.replay_log.append((seq, -cents if kind == WITHDRAW else cents, split))
+
+        self.file = open(self.path, "a")
+        if self.file.tell() != good_size:  # removes the damaged end so new records aren't written after it
+            self.file.truncate(good_size)
+            self.file.seek(good_size)
+        if upgraded:  # saves the upgraded balance as the first snapshot so it isn't read from the old files again
+            self.checkpoint()
+        return self.balance, self.goal
+
+    # changes the in-memory balance, jars or goal for one record. Returns the jar changes it used
+    def apply(self, kind, cents, split=None):
+        if kind == GOAL:
+            self.goal = cents
+            return NO_SPLIT
+        if kind == RATIOS:
+            self.jars.set_ratios(split)
+            return split
+        split = jar_split(self.jars, kind, cents, split)
+        self.jars.apply(split)
+        if kind == WITHDRAW:
+            self.balance -= cents
+        else:
+            self.balance += cents
+        return split
+
+    # the snapshot is the seq, balance and goal, then the jar balances, percentages and leftover fractions, then the
+    # epoch (older snapshots stop after the goal, so their balance is split between the jars the first time they're
+    # read, or after the leftovers)
+    def read_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                lines = f.read().splitlines()
+            seq, balance, goal = (int(line) for line in lines[:3])
+            if len(lines) >= 6:
+                jars = Jars(parse_ratios(lines[4]), [int(part) for part in lines[3].split()],
+                            [int(part) for part in lines[5].split()])
+            else:
+                jars = Jars.from_total(balance)
+            epoch = lines[6] if len(lines) >= 7 else OLD_EPOCH
+        except (OSError, ValueError):
+            return None
+        return seq, balance, goal, jars, epoch
+
+    # adds one record to the end of the journal. This is the only work done per coin, the disk sync happens once
+    # per batch or once the durability window runs out (whichever comes first)
+    def append(self, kind, cents, split=None):
+        begin = metrics.now()
+        # the snapshot is taken before the next record rather than right after the one that fills the journal, so
+        # everything in it has already been through the ledger (and its listeners) when the checkpoint listeners run
+        if self.seq - self.snapshot_seq >= self.snapshot_every:
+            self.checkpoint()
+        with self.lock:
+            split = self.apply(kind, cents, split)
+            self.seq += 1
+            self.file.write(format_record(self.seq, kind, cents, split))
+            self.pending += 1
+            if self.pending >= self.sync_batch:
+                self.sync_locked()
+            elif self.timer is None and self.sync_interval is not None:
+                self.timer = threading.Timer(self.sync_interval, self.sync)
+                self.timer.daemon = True
+                self.timer.start()
+            seq = self.seq
+        for listener in self.record_listeners:
+            listener(seq, kind, cents, split)
+        APPEND_TIME.since(begin)
+
+    def deposit(self, cents):
+        self.append(DEPOSIT, cents)
+
+    def withdraw(self, cents, jar=SPEND):
+        self.append(WITHDRAW, cents, self.jars.withdraw_split(cents, jar))
+
+    def adjust(self, cents, split=None):
+        if cents != 0 or split is not None:
+            self.append(ADJUST, cents, split)
+
+    def set_goal(self, cents):
+        self.append(GOAL, cents)
+
+    def set_ratios(self, ratios):
+        self.append(RATIOS, 0, tuple(ratios))
+
+    # forces everything written so far onto the disk
+    def sync(self):
+        with self.lock:
+            self.sync_locked()
+
+    def sync_locked(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending and self.file is not None:
+            begin = metrics.now()
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+            self.syncs += 1
+            SYNC_TIME.since(begin)
+            for listener in self.sync_listeners:
+                listener(self.seq)
+
+    # saves a snapshot and empties the journal (compaction) so the next startup has almost nothing to replay.
+    # The snapshot is saved first, so a crash in between just means a few records get skipped on replay. Records
+    # after keep_after are kept (they're already in the snapshot, so they're skipped on replay, but sync.py still
+    # has to send them)
+    def checkpoint(self):
+        with self.lock:
+            self.sync_locked()
+            write_atomic(self.snapshot_path, "{}\n{}\n{}\n{}\n{}\n{}\n{}\n".format(
+                self.seq, self.balance, self.goal, " ".join(str(cents) for cents in self.jars.balances),
+                format_ratios(self.jars.ratios), " ".join(str(carry) for carry in self.jars.carry), self.epoch))
+            self.snapshot_seq = self.seq
+            for listener in self.checkpoint_listeners:  # saves anything that has to match the snapshot
+                listener(self.seq)
+            # keeps the old save files up to date for anything that still reads them (and for load() to start from
+            # if the journal gets emptied but the snapshot is lost), before the journal is emptied
+            write_atomic(self.old_file(BALANCE_FILE), "{:0.2f}".format(self.balance / 100))
+            write_atomic(self.old_file(GOAL_FILE), "{:0.2f}".format(self.goal / 100))
+            keep_after = self.keep_after
+            if keep_after is not None and keep_after < self.seq:
+                self.file.close()
+                with open(self.path, "r") as f:
+                    kept = [line for line in f if keep_after < record_seq(line)]
+                write_atomic(self.path, "".join(kept))
+                self.file = open(self.path, "a")
+            else:
+                self.file.truncate(0)
+                self.file.seek(0)
+
+    # the old save file with this name, in the same folder as the journal
+    def old_file(self, name):
+        return os.path.join(os.path.dirname(self.path), name)
+
+    # the records in the journal after the seq given (see read_records)
+    def records(self, after=0):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+        return read_records(self.path, after)
+
+    # the daily/weekly/monthly totals that go with this journal (see rollups.py)
+    def rollups(self):
+        from .rollups import JournalRollups, ROLLUPS_FILE
+        folder = os.path.dirname(os.path.abspath(self.snapshot_path))
+        return JournalRollups.load(self, os.path.join(folder, ROLLUPS_FILE))
+
+    # makes sure only one process writes this journal. A second one (another bank, or vision.py's --deposit) would
+    # have its records cut off by the first one's next checkpoint. Raises RuntimeError if another process has it
+    def take_lock(self):
+        if fcntl is None or self.lock_file is not None:
+            return
+        lock_file = open(self.path + LOCK_SUFFIX, "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.seek(0)
+            pid = lock_file.read().strip()
+            lock_file.close()
+            raise RuntimeError("{} is already open in another bank (process {})".format(self.path, pid or "?"))
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self.lock_file = lock_file
+
+    # syncs anything left and closes the journal file (and lets another process have it)
+    def close(self):
+        with self.lock:
+            self.sync_locked()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
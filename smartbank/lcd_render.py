@@ -0,0 +1,145 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Draws the LCD from a background thread. Every lcd.text() used to be a slow I2C write done right in the
+# middle of handling a button, usually twice per coin. Now lcd.text() only changes the frame we want on the screen,
+# and a worker thread writes the lines that actually changed, at most MAX_RATE times a second. When coins come in
+# faster than that, the in-between frames are skipped and only the newest one is written. If a write fails (the LCD
+# came loose), the error is traced and the frame is tried again at the same rate until it goes through.
+#####################################################################################################################
+
+import threading
+import time
+
+from . import metrics, tracing
+
+MAX_RATE = 10  # most times per second the LCD is written to
+LINES = 2  # the LCD is 16x2
+WIDTH = 16
+
+TEXT_TIME = metrics.histogram("smartbank_lcd_text_seconds", "Time spent in lcd.text() (the caller's cost)")
+WRITE_TIME = metrics.histogram("smartbank_lcd_write_seconds", "Time for one line to be written to the LCD")
+# from the first change to a frame until it is on the screen (includes waiting out the rate limit)
+SHOW_DELAY = metrics.histogram("smartbank_lcd_delay_seconds", "Time from lcd.text() until the frame is shown")
+LINE_WRITES = metrics.counter("smartbank_lcd_writes_total", "Lines written to the LCD")
+
+
+# stand-in for rpi_lcd's LCD that just remembers what's on each line (for testing without the LCD hooked up)
+class FakeLCD:
+    def __init__(self, lines=LINES, width=WIDTH):
+        self.width = width
+        self.lines = [""] * lines
+        self.writes = 0  # how many I2C writes the real LCD would have done
+
+    def text(self, text, line):
+        self.lines[line - 1] = text[:self.width]
+        self.writes += 1
+
+    def clear(self):
+        self.lines = [""] * len(self.lines)
+        self.writes += 1
+
+
+# takes lcd.text() calls from any thread and writes them to the real LCD from its own thread
+class LCDRenderer:
+    def __init__(self, lcd, lines=LINES, max_rate=MAX_RATE):
+        self.lcd = lcd
+        self.interval = 1 / max_rate  # shortest time between two writes
+        self.desired = [""] * lines  # the frame we want on the screen
+        self.shown = [""] * lines  # what the screen has on it now (the LCD is cleared before it's handed over)
+        self.dirty = False  # True when desired has changed since the last write
+        self.dirty_since = 0.0  # when desired first changed after the last write (metrics.now())
+        self.writing = False  # True while the worker is writing a frame
+        self.requested = 0  # how many line changes were asked for
+        self.writes = 0  # how many were actually written to the LCD
+        self.errors = 0  # writes that failed in a row (only the first of them is traced)
+        self.last_write = 0.0
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="lcd", daemon=True)
+        self.thread.start()
+
+    # same as rpi_lcd's LCD.text(), but only changes the desired frame and returns right away
+    def text(self, text, line):
+        begin = metrics.now()
+        with self.cond:
+            self.requested += 1
+            if self.desired[line - 1] != text:
+                self.desired[line - 1] = text
+                if not self.dirty:
+                    self.dirty = True
+                    self.dirty_since = begin
+                self.cond.notify()
+        TEXT_TIME.since(begin)
+
+    # blanks the screen (written as blank lines, so it gets coalesced like everything else)
+    def clear(self):
+        for line in range(1, len(self.desired) + 1):
+            self.text("", line)
+
+    # how many I2C writes were skipped because the line didn't change or a newer frame replaced it
+    def saved(self):
+        return self.requested - self.writes
+
+    # the worker thread: waits for a change, waits out the rate limit (collecting any more changes), then writes.
+    # A line that fails to write is unknown after, so it's written again with the frame (tried again after the
+    # rate limit, unless it's stopping)
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.dirty and self.running:
+                    self.cond.wait()
+                if not self.dirty:  # stopped with nothing left to write
+                    return
+            wait = self.last_write + self.interval - time.monotonic()
+            if wait > 0 and self.running:
+                time.sleep(wait)
+            with self.cond:
+                frame = list(self.desired)
+                self.dirty = False
+                self.writing = True
+                since = self.dirty_since
+            failed = False
+            for number, text in enumerate(frame):
+                if text != self.shown[number]:
+                    begin = metrics.now()
+                    try:
+                        self.lcd.text(text, number + 1)
+                    except Exception as error:  # an I2C error mustn't stop the screen for good
+                        self.shown[number] = None
+                        self.errors += 1
+                        if self.errors == 1:
+                            tracing.failed(error, threading.get_ident())
+                        failed = True
+                        break
+                    WRITE_TIME.since(begin)
+                    LINE_WRITES.add()
+                    self.shown[number] = text
+                    self.writes += 1
+            if not failed:
+                self.errors = 0
+                SHOW_DELAY.since(since)
+            self.last_write = time.monotonic()
+            with self.cond:
+                if failed and self.running and not self.dirty:
+                    self.dirty = True
+                    self.dirty_since = since
+                self.writing = False
+                self.cond.notify_all()  # wakes up anyone waiting in flush()
+
+    # waits until the screen shows the newest frame
+    def flush(self, timeout=1.0):
+        end = time.monotonic() + timeout
+        with self.cond:
+            while self.dirty or self.writing:
+                left = end - time.monotonic()
+                if left <= 0:
+                    return False
+                self.cond.wait(left)
+        return True
+
+    # writes the last frame and stops the worker thread
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout=1.0)
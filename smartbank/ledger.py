@@ -0,0 +1,184 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: The Ledger keeps the piggy bank's money as whole cents (integers) instead of floats, so adding a penny
+# a thousand times gives exactly $10.00. Every transaction is kept in compact arrays (a few bytes each instead of a
+# Python object each) and the running total is updated as each one is posted, so the total never has to be re-added.
+# Each deposit is also split between the give, save & spend jars as it's posted (see jars.py), so the jar balances
+# are always ready and the budget window never has to work them out from the total. Transactions can be undone and
+# redone one at a time (each is one adjustment saved in the journal, nothing is read back or added up again).
+#####################################################################################################################
+
+import time
+from array import array  # compact storage for the list of transactions
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from .jars import Jars, JARS, SPEND
+from .journal import DEPOSIT, WITHDRAW, ADJUST, DEFAULT_GOAL, jar_split
+
+
+# turns an amount in dollars (int, float, or text like "12.50") into whole cents, rounding to the nearest cent
+def to_cents(amount):
+    if isinstance(amount, int):
+        return amount * 100
+    try:
+        # going through str() uses the float's shortest form, so 0.1 becomes exactly 10 cents and not 10.000000001
+        cents = (Decimal(str(amount).strip()) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError("not an amount of money: {!r}".format(amount))
+    if not cents.is_finite():
+        raise ValueError("not an amount of money: {!r}".format(amount))
+    return int(cents)
+
+
+# formats cents the same way the GUI always has ("${:0.2f}"), but exactly
+def format_cents(cents):
+    sign = "-" if cents < 0 else ""
+    dollars, cents = divmod(abs(cents), 100)
+    return "${}{}.{:02d}".format(sign, dollars, cents)
+
+
+# all the transactions for one piggy bank and its running total, in cents
+class Ledger:
+    def __init__(self, opening=0, goal=DEFAULT_GOAL, journal=None, jars=None):
+        self.opening = opening  # the balance before any of the transactions in this ledger
+        self.total = opening  # the running total, updated as each transaction is posted
+        self.goal = goal  # the savings goal in cents
+        self.journal = journal  # if given, every transaction is saved in it as it's posted
+        self.jars = Jars.from_total(opening) if jars is None else jars  # each jar's running balance & percentages
+        self.opening_jars = tuple(self.jars.balances)  # the jar balances before any of the transactions
+        # one entry per transaction in each of these (array-backed so a million transactions is about 25MB)
+        self.kinds = array("B")  # the journal kind letter (D, W or C) as a byte
+        self.amounts = array("q")  # signed change in cents
+        self.balances = array("q")  # the total right after the transaction
+        self.times = array("d")  # when it was posted (seconds since the epoch)
+        self.splits = array("q")  # how much it changed each jar (one number per jar, in the same order as JARS)
+        self.live = array("q")  # the index of each transaction that hasn't been undone, in order (the undo stack)
+        self.undone = array("q")  # the index of each transaction that was undone, the newest last (the redo stack)
+        self.listeners = []  # called as listener(ledger, index) after each change (index is None for a new goal)
+
+    # starts a ledger from the balance, goal & jars loaded out of a journal (and keeps saving to it)
+    @classmethod
+    def from_journal(cls, journal):
+        return cls(journal.balance, journal.goal, journal, journal.jars.copy())
+
+    def __len__(self):
+        return len(self.amounts)
+
+    # adds one transaction. kind is DEPOSIT, WITHDRAW or ADJUST, cents is how much (always positive except for
+    # ADJUST, which is signed). split is how much it changes each jar, if it's not the usual (see jar_split). Returns
+    # the index of the new transaction
+    def post(self, kind, cents, when=None, split=None):
+        index = self.record(kind, cents, when, split)
+        self.live.append(index)
+        if self.undone:  # something new was done, so what was undone can't be redone any more
+            self.undone = array("q")
+        return index
+
+    # saves & adds one transaction without touching the undo & redo stacks
+    def record(self, kind, cents, when=None, split=None):
+        if kind == DEPOSIT:
+            change = cents
+        elif kind == WITHDRAW:
+            change = -cents
+        elif kind == ADJUST:
+            change = cents
+        else:
+            raise ValueError("unknown transaction kind: {!r}".format(kind))
+        split = jar_split(self.jars, kind, cents, split)
+        if self.journal is not None:  # saved first so the ledger never shows money that isn't on disk
+            self.journal.append(kind, cents, split)
+        self.total += change
+        self.jars.apply(split)
+        self.splits.extend(split)
+        self.kinds.append(ord(kind))
+        self.amounts.append(change)
+        self.balances.append(self.total)
+        self.times.append(time.time() if when is None else when)
+        index = len(self.amounts) - 1
+        self.notify(index)
+        return index
+
+    # money paid in from outside the session (the allowance & interest, see scheduler.py). It's saved like any other
+    # transaction, but it isn't on the undo stack and it's added to the opening balance & jars, so Undo, Clear and
+    # Cancel never take it back (it's already marked as paid, so it wouldn't be paid again)
+    def pay_in(self, kind, cents, when=None, split=None):
+        index = self.record(kind, cents, when, split)
+        self.opening += self.amounts[index]
+        self.opening_jars = tuple(opening + change for opening, change in zip(self.opening_jars, self.split(index)))
+        return index
+
+    def deposit(self, cents, when=None):
+        return self.post(DEPOSIT, cents, when)
+
+    # takes the money out of one jar (spend unless another one is picked)
+    def withdraw(self, cents, when=None, jar=SPEND):
+        return self.post(WITHDRAW, cents, when, self.jars.withdraw_split(cents, jar))
+
+    def adjust(self, cents, when=None, split=None):
+        if cents != 0 or (split is not None and any(split)):
+            return self.post(ADJUST, cents, when, split)
+
+    # puts the total and every jar back to how they were before this ledger's transactions, as one adjustment
+    def revert(self, when=None):
+        split = tuple(opening - now for opening, now in zip(self.opening_jars, self.jars.balances))
+        index = self.adjust(self.opening - self.total, when, split)
+        self.live = array("q")  # everything was taken back at once, so there's nothing left to undo or redo
+        self.undone = array("q")
+        return index
+
+    # takes back the newest transaction that hasn't been undone, by saving the opposite adjustment (the same change
+    # to the total and every jar, the other way). Returns the index of the transaction undone, or None
+    def undo(self, when=None):
+        if not self.live:
+            return None
+        index = self.live.pop()
+        kind, change, balance, posted = self.entry(index)
+        self.record(ADJUST, -change, when, tuple(-part for part in self.split(index)))
+        self.undone.append(index)
+        return index
+
+    # does the newest undone transaction again (same kind, amount and jars). Returns its new index, or None
+    def redo(self, when=None):
+        if not self.undone:
+            return None
+        index = self.undone.pop()
+        kind, change, balance, posted = self.entry(index)
+        again = self.record(kind, -change if kind == WITHDRAW else change, when, self.split(index))
+        self.live.append(again)
+        return again
+
+    def set_goal(self, cents):
+        if self.journal is not None:
+            self.journal.set_goal(cents)
+        self.goal = cents
+        self.notify(None)
+
+    # changes the percentages used to split deposits from now on (money already in the jars stays where it is)
+    def set_ratios(self, ratios):
+        ratios = tuple(ratios)
+        self.jars.set_ratios(ratios)  # checks them before they're saved
+        if self.journal is not None:
+            self.journal.set_ratios(ratios)
+        self.notify(None)
+
+    # asks to be told about every change to this ledger (for windows that show the total, jars & goal)
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def notify(self, index):
+        for listener in self.listeners:
+            listener(self, index)
+
+    # one transaction as (kind, signed change in cents, balance after, time)
+    def entry(self, index):
+        return chr(self.kinds[index]), self.amounts[index], self.balances[index], self.times[index]
+
+    # how much one transaction changed each jar
+    def split(self, index):
+        return tuple(self.splits[index * len(JARS):(index + 1) * len(JARS)])
+
+    def format_total(self):
+        return format_cents(self.total)
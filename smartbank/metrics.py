@@ -0,0 +1,193 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Counters and latency histograms for the paths every coin goes through (the GPIO handler, buttonpress,
+# the LCD and saving), so slow coins can be seen on a bank that's already out in someone's house. Timing something
+# is just two clock reads and adding one to a bucket, so it's always on. The numbers can be read over HTTP on the
+# pi itself (Prometheus text format at /metrics, JSON at /metrics.json) and/or written to a file every so often.
+#####################################################################################################################
+
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# upper edges of the histogram buckets in seconds (100us up to 2.5s, anything slower goes in the last bucket)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PORT = 9105  # the metrics endpoint is only on localhost unless another host is given
+DUMP_INTERVAL = 60.0  # seconds between writes of the metrics file
+
+now = time.perf_counter  # the clock every span is timed with (monotonic, so it never goes backwards)
+
+REGISTRY = {}  # every counter & histogram by name, in the order they were made
+registry_lock = threading.Lock()
+
+
+# a number that only goes up (coins seen, bounces thrown away, LCD writes...)
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def add(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {"type": "counter", "value": self.value}
+
+    def exposition(self):
+        return ["# HELP {} {}".format(self.name, self.help), "# TYPE {} counter".format(self.name),
+                "{} {}".format(self.name, self.value)]
+
+
+# how long something took, counted into fixed buckets so the memory used never grows and the tail (p99) can still
+# be worked out
+class Histogram:
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is for anything slower than the last bucket
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    # adds one duration in seconds
+    def observe(self, seconds):
+        bucket = bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    # adds the time since begin (from metrics.now())
+    def since(self, begin):
+        self.observe(now() - begin)
+
+    # the upper edge of the bucket the q'th fraction of the durations fall in (so p99 is never under-reported)
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+        wanted = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return self.buckets[bucket] if bucket < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self.lock:
+            return {"type": "histogram", "count": self.count, "sum": self.sum, "max": self.max,
+                    "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+                    "buckets": dict(zip([str(edge) for edge in self.buckets] + ["+Inf"], self.counts))}
+
+    def exposition(self):
+        with self.lock:
+            lines = ["# HELP {} {}".format(self.name, self.help), "# TYPE {} histogram".format(self.name)]
+            total = 0
+            for edge, count in zip(self.buckets, self.counts):
+                total += count
+                lines.append('{}_bucket{{le="{}"}} {}'.format(self.name, edge, total))
+            lines.append('{}_bucket{{le="+Inf"}} {}'.format(self.name, self.count))
+            lines.append("{}_sum {}".format(self.name, self.sum))
+            lines.append("{}_count {}".format(self.name, self.count))
+        return lines
+
+
+# returns the counter with this name, making it the first time (so modules can each ask for the ones they use)
+def counter(name, help_text=""):
+    return register(name, lambda: Counter(name, help_text))
+
+
+def histogram(name, help_text="", buckets=BUCKETS):
+    return register(name, lambda: Histogram(name, help_text, buckets))
+
+
+def register(name, make):
+    with registry_lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = make()
+        return metric
+
+
+# everything as a dict (for the JSON endpoint and the metrics file)
+def snapshot():
+    with registry_lock:
+        metrics = list(REGISTRY.values())
+    return {"time": time.time(), "metrics": {metric.name: metric.snapshot() for metric in metrics}}
+
+
+# everything in the Prometheus text format
+def exposition():
+    with registry_lock:
+        metrics = list(REGISTRY.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.exposition())
+    return "\n".join(lines) + "\n"
+
+
+# the HTTP endpoint, served from its own thread so it never holds up a coin. http.server is only imported when it's
+# started (it takes about 50 ms, which every start up would pay for even without --metrics-port)
+class MetricsServer:
+    def __init__(self, port=PORT, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = exposition(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # keeps every request from being printed
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]  # the real port if 0 was asked for
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# writes snapshot() to a file every interval seconds (and once more when it's stopped)
+class MetricsDumper:
+    def __init__(self, path, interval=DUMP_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="metrics-dump", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        from .journal import write_atomic  # imported here since the journal is timed with these metrics
+        write_atomic(self.path, json.dumps(snapshot(), indent=1) + "\n")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.dump()
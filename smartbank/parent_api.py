@@ -0,0 +1,309 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: A small HTTP API for parents, served on the local network while the bank runs. A parent's phone or
+# computer can see the balance, the jars, the goal and this session's history, and (with --approve-withdrawals)
+# withdrawals made on the GUI wait for a parent to approve or deny them instead of happening right away.
+#   GET  /balances                     total, jars, goal & percentages (amounts are in cents)
+#   GET  /history?limit=50&before=N    the newest transactions, newest first (before is an index, for paging)
+#   GET  /withdrawals                  the withdrawals waiting for a parent
+#   POST /withdrawals/ID/approve       lets one happen (or /deny)
+# It runs on its own thread with one asyncio loop, so hundreds of parents' apps can keep connections open at once
+# without a thread each. The only thing a coin does for it is one ledger listener that takes a copy of the total, jars
+# & goal (a few numbers). Those copies are only turned into JSON when someone asks, and the JSON is kept until the next
+# transaction, so a hundred apps checking the balance build it once.
+#####################################################################################################################
+
+import asyncio
+import hmac
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, parse_qs
+
+from . import metrics
+from .jars import JARS
+
+PORT = 9107
+HISTORY_LIMIT = 50  # transactions per page of /history unless another limit is asked for
+MAX_HISTORY = 500  # the most that can be asked for at once
+MAX_CACHED = 256  # different pages kept between transactions (it all starts over on the next one anyway)
+IDLE_TIMEOUT = 30.0  # seconds a kept-alive connection can sit with no request before it's closed
+MAX_BODY = 4096  # the approve & deny requests don't need a body, anything bigger than this is refused
+
+REQUEST_TIME = metrics.histogram("smartbank_parent_request_seconds", "Time to answer one parent API request")
+
+STATUS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+          405: "Method Not Allowed", 413: "Payload Too Large"}
+
+# what the API shows, copied from the ledger right after each change so it's never half way through one. ledger is
+# kept so the history can be read from it (entries before count never change)
+State = namedtuple("State", ["version", "ledger", "account", "total", "jars", "goal", "ratios", "count"])
+
+# a withdrawal waiting for a parent (cents out of the jar with that index in the account that was open when it was
+# asked for at requested)
+Withdrawal = namedtuple("Withdrawal", ["id", "cents", "jar", "account", "requested"])
+
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+# the withdrawals waiting for a parent. The GUI asks from its thread, the API decides from its own, and what was
+# decided goes in a queue that the GUI empties the same way it does for coins (tkinter can only be used from there)
+class Approvals:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # id -> Withdrawal, oldest first
+        self.decided = queue.Queue()  # (Withdrawal, True if approved) for the GUI to carry out
+        self.next_id = 1
+
+    def request(self, cents, jar, account, when=None):
+        with self.lock:
+            withdrawal = Withdrawal(self.next_id, cents, jar, account, time.time() if when is None else when)
+            self.pending[withdrawal.id] = withdrawal
+            self.next_id += 1
+        return withdrawal
+
+    # approves or denies one withdrawal. Returns it, or None if there's no such withdrawal waiting
+    def decide(self, withdrawal_id, approved):
+        with self.lock:
+            withdrawal = self.pending.pop(withdrawal_id, None)
+        if withdrawal is not None:
+            self.decided.put((withdrawal, approved))
+        return withdrawal
+
+    def waiting(self):
+        with self.lock:
+            return list(self.pending.values())
+
+
+# the API for one bank. It's made before the bank is opened, and the bank starts it with start(bank) once the ledger
+# is loaded and stops it when it closes. token, if given, has to be sent as "Authorization: Bearer <token>"
+class ParentAPI:
+    def __init__(self, host="127.0.0.1", port=PORT, token=None, approvals=False):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.approvals = Approvals() if approvals else None
+        self.bank = None
+        self.state = None
+        self.version = 0
+        self.cache = {}  # (path, query) -> (version, JSON body), only used on the API's thread
+        self.loop = None
+        self.server = None
+        self.connections = set()  # the tasks answering each connection, cancelled when it stops
+        self.thread = None
+        self.error = None  # why it couldn't start (like the port being in use)
+
+    def start(self, bank):
+        self.bank = bank
+        self.changed(bank.ledger, None)
+        bank.ledger.subscribe(self.changed)  # moved to the new ledger by Bank.switch_account()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(ready,), name="parent-api", daemon=True)
+        self.thread.start()
+        ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    # the ledger listener, on whichever thread changed the ledger. Just a copy of a few numbers, nothing is encoded
+    def changed(self, ledger, index):
+        self.version += 1  # only the bank's own thread changes the ledger, so this is never done twice at once
+        self.state = State(self.version, ledger, self.bank.account, ledger.total, tuple(ledger.jars.balances),
+                           ledger.goal, ledger.jars.ratios, len(ledger))
+
+    def run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.serve, self.host, self.port))
+        except OSError as error:
+            self.error = error
+            ready.set()
+            self.loop.close()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]  # the real port if 0 was asked for
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def stop(self):
+        if self.bank is not None and self.changed in self.bank.ledger.listeners:
+            self.bank.ledger.unsubscribe(self.changed)
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.create_task, self.shutdown())
+            self.thread.join()
+
+    async def shutdown(self):
+        self.server.close()
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+        self.loop.stop()
+
+    # answers requests on one connection until the app closes it (connections are kept alive between requests)
+    async def serve(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT)
+                except APIError as error:
+                    writer.write(response(error.status, {"error": str(error)}, close=True))
+                    break
+                if request is None:  # closed, or nothing asked for a while
+                    break
+                method, target, headers = request
+                begin = metrics.now()
+                close = headers.get("connection", "").lower() == "close"
+                try:
+                    status, body, etag = self.handle(method, target, headers)
+                except APIError as error:
+                    status, body, etag = error.status, encode({"error": str(error)}), None
+                writer.write(response(status, body, etag, close))
+                REQUEST_TIME.since(begin)
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    # one request as (status, JSON body, ETag or None)
+    def handle(self, method, target, headers):
+        if self.token is not None and not hmac.compare_digest(headers.get("authorization", ""),
+                                                              "Bearer " + self.token):
+            raise APIError(401, "a parent token is needed")
+        url = urlsplit(target)
+        parts = url.path.strip("/").split("/")
+        if parts[0] == "withdrawals":
+            return self.withdrawals(method, parts[1:])
+        if method != "GET":
+            raise APIError(405, "only GET works here")
+        if url.path not in ("/balances", "/history"):
+            raise APIError(404, "no such page")
+        state = self.state
+        etag = '"{}"'.format(state.version)
+        if headers.get("if-none-match") == etag:  # the app already has this version
+            return 304, b"", etag
+        key = (url.path, url.query)
+        cached = self.cache.get(key)
+        if cached is None or cached[0] != state.version:
+            if cached is not None or len(self.cache) >= MAX_CACHED:
+                self.cache = {}  # a transaction happened, so every page is out of date
+            if url.path == "/balances":
+                body = encode(balances(state))
+            else:
+                body = encode(history(state, parse_qs(url.query)))
+            cached = self.cache[key] = (state.version, body)
+        return 200, cached[1], etag
+
+    def withdrawals(self, method, parts):
+        if self.approvals is None:
+            raise APIError(404, "withdrawals don't need approving (start the bank with --approve-withdrawals)")
+        if not parts or parts == [""]:
+            if method != "GET":
+                raise APIError(405, "only GET works here")
+            return 200, encode({"withdrawals": [withdrawal_json(withdrawal)
+                                                for withdrawal in self.approvals.waiting()]}), None
+        if len(parts) != 2 or parts[1] not in ("approve", "deny"):
+            raise APIError(404, "no such page")
+        if method != "POST":
+            raise APIError(405, "only POST works here")
+        try:
+            withdrawal_id = int(parts[0])
+        except ValueError:
+            raise APIError(404, "no such withdrawal")
+        approved = parts[1] == "approve"
+        withdrawal = self.approvals.decide(withdrawal_id, approved)
+        if withdrawal is None:
+            raise APIError(404, "no such withdrawal waiting")
+        result = withdrawal_json(withdrawal)
+        result["status"] = "approved" if approved else "denied"
+        return 200, encode(result), None
+
+
+# reads one request as (method, target, headers with lowercase names), or None if the connection was closed
+async def read_request(reader):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise APIError(400, "request headers too long")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise APIError(400, "not an HTTP request")
+    headers = {}
+    for line in lines[1:]:
+        name, colon, value = line.partition(":")
+        if colon:
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise APIError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise APIError(413, "request body too big")
+    if length:
+        await reader.readexactly(length)  # nothing needs a body, it's just read past
+    return method, target, headers
+
+
+def encode(data):
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+# the bytes of one response (body is already encoded JSON, or a dict for the errors before a request was read)
+def response(status, body, etag=None, close=False):
+    if isinstance(body, dict):
+        body = encode(body)
+    head = ["HTTP/1.1 {} {}".format(status, STATUS[status]), "Content-Length: {}".format(len(body)),
+            "Cache-Control: no-cache"]
+    if body:
+        head.append("Content-Type: application/json")
+    if etag is not None:
+        head.append("ETag: " + etag)
+    if close:
+        head.append("Connection: close")
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+def balances(state):
+    return {"account": state.account, "total": state.total, "goal": state.goal,
+            "jars": dict(zip(JARS, state.jars)), "ratios": dict(zip(JARS, state.ratios)),
+            "transactions": state.count, "version": state.version}
+
+
+# a page of this session's history, newest first. before (an index) is where the page ends, for the next page
+def history(state, query):
+    try:
+        limit = min(int(query.get("limit", [HISTORY_LIMIT])[0]), MAX_HISTORY)
+        before = min(int(query.get("before", [state.count])[0]), state.count)
+    except ValueError:
+        raise APIError(400, "limit and before are whole numbers")
+    first = max(before - max(limit, 0), 0)
+    ledger = state.ledger
+    entries = []
+    for index in range(before - 1, first - 1, -1):
+        kind, change, balance, when = ledger.entry(index)
+        entries.append({"index": index, "kind": kind, "change": change, "balance": balance, "time": when,
+                        "jars": dict(zip(JARS, ledger.split(index)))})
+    return {"account": state.account, "transactions": entries, "before": first if first > 0 else None,
+            "version": state.version}
+
+
+def withdrawal_json(withdrawal):
+    return {"id": withdrawal.id, "amount": withdrawal.cents, "jar": JARS[withdrawal.jar],
+            "account": withdrawal.account, "requested": withdrawal.requested}
@@ -0,0 +1,229 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Support for a real coin acceptor. Instead of one button per coin, an acceptor tells us which coin went
+# in by sending a burst of pulses on a single pin (for example 1 pulse for a penny, 4 for a quarter). Each pulse is
+# timestamped in the GPIO callback, and a burst is over once the line has been quiet for longer than the gap between
+# pulses, so coins are counted as fast as the acceptor can take them (no sleeping between coins). The decoder itself
+# only works on timestamps, so recorded or made-up pulse traces can be run through it without any hardware:
+#   python -m smartbank.pulse trace.txt        decodes a trace (one pulse time in seconds per line)
+#   python -m smartbank.pulse --synthetic 500  decodes 500 random coins sent at full speed
+#####################################################################################################################
+
+import argparse
+import random
+import threading
+import time
+
+from . import metrics
+from .coin_input import CoinEvent, CoinInput
+
+ACCEPTOR_PIN = 27  # the acceptor's pulse output (a free pin, the coin buttons use 17 and 22-25)
+
+# how many pulses the acceptor sends for each coin, and that coin's name & value in cents. This has to match how the
+# acceptor was programmed
+DENOMINATIONS = {
+    1: ("Penny", 1),
+    2: ("Nickel", 5),
+    3: ("Dime", 10),
+    4: ("Quarter", 25),
+    5: ("Dollar", 100),
+}
+
+GAP_MS = 10.0  # a pulse this long after the last one starts a new coin (pulses inside a burst are ~1ms apart)
+GLITCH_MS = 0.2  # a pulse this soon after the last one is noise on the line and isn't counted
+
+PULSES = metrics.counter("smartbank_pulses_total", "Pulses seen from the coin acceptor")
+GLITCHES = metrics.counter("smartbank_pulse_glitches_total", "Pulses thrown away as noise")
+REJECTED = metrics.counter("smartbank_pulse_rejected_total", "Bursts that didn't match any coin")
+
+
+# turns pulse timestamps into coins. Not thread-safe by itself (PulseInput holds a lock around it)
+class PulseDecoder:
+    def __init__(self, table=None, gap_ms=GAP_MS, glitch_ms=GLITCH_MS, pin=ACCEPTOR_PIN):
+        self.table = dict(DENOMINATIONS if table is None else table)
+        self.gap = gap_ms / 1000  # in seconds like the timestamps
+        self.glitch = glitch_ms / 1000
+        self.pin = pin
+        self.start = None  # when the burst being counted started
+        self.last = None  # when its last pulse was
+        self.count = 0  # pulses in it so far
+        self.glitches = 0
+        self.rejected = 0  # bursts with a number of pulses that isn't in the table
+
+    # adds one pulse. Returns the coin from the burst before it if this pulse started a new burst (else None)
+    def feed(self, when):
+        coin = None
+        if self.last is not None:
+            if when - self.last < self.glitch:
+                self.glitches += 1
+                GLITCHES.add()
+                return None
+            if when - self.last > self.gap:
+                coin = self.finish()
+        if self.count == 0:
+            self.start = when
+        self.count += 1
+        self.last = when
+        PULSES.add()
+        return coin
+
+    # when the burst being counted will be over if no more pulses come (None if there isn't one)
+    def deadline(self):
+        return None if self.count == 0 else self.last + self.gap
+
+    # finishes the burst being counted if the line has been quiet long enough. Returns its coin or None
+    def poll(self, now):
+        if self.count and now - self.last > self.gap:
+            return self.finish()
+        return None
+
+    # ends the burst being counted and returns its coin (None if there wasn't one or it didn't match a coin)
+    def finish(self):
+        count = self.count
+        self.count = 0
+        self.last = None
+        if count == 0:
+            return None
+        if count not in self.table:
+            self.rejected += 1
+            REJECTED.add()
+            return None
+        name, value = self.table[count]
+        return CoinEvent(self.start, self.pin, name, value)
+
+
+# decodes a whole trace of pulse timestamps (recorded or from synthetic_trace) into a list of CoinEvents
+def decode_trace(times, table=None, gap_ms=GAP_MS, glitch_ms=GLITCH_MS):
+    decoder = PulseDecoder(table, gap_ms, glitch_ms)
+    coins = []
+    for when in times:
+        coin = decoder.feed(when)
+        if coin is not None:
+            coins.append(coin)
+    coin = decoder.finish()
+    if coin is not None:
+        coins.append(coin)
+    return coins, decoder
+
+
+# makes the pulse timestamps an acceptor would send for these coin values (in cents), as fast as it can: pulse_ms
+# between pulses in a burst and gap_ms between coins. jitter_ms moves each pulse by up to that much
+def synthetic_trace(values, table=None, pulse_ms=1.0, gap_ms=GAP_MS * 2, jitter_ms=0.0, seed=None, start=0.0):
+    pulses_for = {value: count for count, (name, value) in (DENOMINATIONS if table is None else table).items()}
+    rand = random.Random(seed)
+    times = []
+    now = start
+    for value in values:
+        for _ in range(pulses_for[value]):
+            times.append(now + rand.uniform(-jitter_ms, jitter_ms) / 1000)
+            now += pulse_ms / 1000
+        now += gap_ms / 1000 - pulse_ms / 1000
+    return times
+
+
+# reads a trace file with one pulse time in seconds per line (blank lines and # comments are skipped)
+def read_trace(path):
+    with open(path) as f:
+        return [float(line.split("#")[0]) for line in f if line.split("#")[0].strip()]
+
+
+# the coin acceptor as a drop-in for CoinInput (same events queue, get, drain & stop), so the GUI and headless mode
+# don't need to know which one they have. timer=False leaves the last burst to be ended by stop() instead of its own
+# thread (for replaying traces with their own timestamps, see trace.py, where a later pulse ends each burst anyway)
+class PulseInput(CoinInput):
+    def __init__(self, gpio=None, pin=ACCEPTOR_PIN, table=None, gap_ms=GAP_MS, glitch_ms=GLITCH_MS,
+                 clock=time.monotonic, timer=True):
+        CoinInput.__init__(self, gpio, pins={pin: ("Acceptor", 0)}, debounce_ms=0, clock=clock)
+        self.pin = pin
+        self.decoder = PulseDecoder(table, gap_ms, glitch_ms, pin)
+        self.cond = threading.Condition()  # the GPIO thread and the burst-ending thread both use the decoder
+        self.running = False
+        self.timer = timer
+        self.thread = None
+
+    # the acceptor pulls the line low for each pulse, so it's an input with a pull-up watched for falling edges
+    def start(self):
+        self.gpio.setwarnings(False)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+        self.gpio.add_event_detect(self.pin, self.gpio.FALLING, callback=self.edge)
+        self.started = True
+        if self.timer:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name="pulses", daemon=True)
+            self.thread.start()
+
+    # runs on the GPIO library's thread for every pulse, so it only timestamps it and counts it
+    def edge(self, pin):
+        now = self.clock()
+        with self.cond:
+            glitches = self.decoder.glitches
+            coin = self.decoder.feed(now)
+            self.bounced += self.decoder.glitches - glitches
+            self.cond.notify()  # a new deadline for the burst-ending thread
+        if coin is not None:
+            self.events.put(coin)
+
+    # ends each burst once the line has been quiet for the gap (the last coin in a row has no pulse after it)
+    def run(self):
+        with self.cond:
+            while self.running:
+                deadline = self.decoder.deadline()
+                if deadline is None:
+                    self.cond.wait()
+                    continue
+                left = deadline - self.clock()
+                if left > 0:
+                    self.cond.wait(left + 0.0005)  # a little extra so the burst is definitely over
+                    continue
+                coin = self.decoder.poll(self.clock())
+                if coin is not None:
+                    self.events.put(coin)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        coin = self.decoder.finish()  # a coin still being counted when it was stopped
+        if coin is not None:
+            self.events.put(coin)
+        CoinInput.stop(self)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smartbank.pulse", description="decode a coin acceptor trace")
+    parser.add_argument("trace", nargs="?", help="file with one pulse time (seconds) per line")
+    parser.add_argument("--synthetic", type=int, metavar="COINS", help="make a random trace with this many coins")
+    parser.add_argument("--pulse-ms", type=float, default=1.0, help="time between pulses for --synthetic")
+    parser.add_argument("--gap-ms", type=float, default=GAP_MS, help="quiet time that ends a coin")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        rand = random.Random(args.seed)
+        values = [rand.choice([value for name, value in DENOMINATIONS.values()]) for _ in range(args.synthetic)]
+        times = synthetic_trace(values, pulse_ms=args.pulse_ms, gap_ms=args.gap_ms * 2, seed=args.seed)
+    elif args.trace:
+        values = None
+        times = read_trace(args.trace)
+    else:
+        parser.error("give a trace file or --synthetic")
+
+    begin = time.perf_counter()
+    coins, decoder = decode_trace(times, gap_ms=args.gap_ms)
+    took = time.perf_counter() - begin
+    span = times[-1] - times[0] if len(times) > 1 else 0.0
+    print("{} pulses -> {} coins ({} rejected bursts, {} glitches)".format(len(times), len(coins), decoder.rejected,
+                                                                          decoder.glitches))
+    print("total: {} cents".format(sum(coin.value for coin in coins)))
+    if span:
+        print("trace: {:.2f} s, {:.1f} coins/s, decoded in {:.1f} ms".format(span, len(coins) / span, took * 1000))
+    if values is not None:
+        print("matches what was sent: {}".format([coin.value for coin in coins] == values))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Daily, weekly and monthly totals for an account (money in, money out, how many transactions, and the
+# change to each jar). Each transaction adds to its day, week and month as it's posted, so questions like "how much
+# was saved this month" or "the savings trend over the year" only look at one number per day/week/month instead of
+# going through every transaction ever made. They're kept between runs: in a file next to the journal (saved with
+# each snapshot), or in the rollups table of the SQLite database (saved with each transaction).
+#####################################################################################################################
+
+import calendar
+import json
+import time
+from datetime import date
+
+from .jars import JARS
+
+ROLLUPS_FILE = "smart_bank_rollups.json"
+
+DAY, WEEK, MONTH = "day", "week", "month"
+PERIODS = (DAY, WEEK, MONTH)
+MONTH_NAMES = list(calendar.month_abbr)  # looked up once ("", "Jan", ... "Dec"), calendar works them out every time
+
+# what's added up in each bucket (the jar changes are signed, the rest are never negative)
+FIELDS = ("deposits", "withdrawals", "count") + JARS
+DEPOSITS, WITHDRAWALS, COUNT = range(3)
+FIRST_JAR = COUNT + 1  # the jar changes come after the count, in the same order as JARS
+
+
+# the bucket a date falls in for each period. Days & weeks are date ordinals (a week is keyed by its Monday) and
+# months count up from year 0, so the buckets of each period are numbered one after another with no gaps
+def bucket_keys(day):
+    ordinal = day.toordinal()
+    return ordinal, ordinal - day.weekday(), day.year * 12 + day.month - 1
+
+
+def bucket_key(period, day):
+    return bucket_keys(day)[PERIODS.index(period)]
+
+
+# a short name for a bucket ("Oct 18", "week of Oct 13", "Oct 2026")
+def label(period, key):
+    if period == MONTH:
+        year, month = divmod(key, 12)
+        return "{} {}".format(MONTH_NAMES[month + 1], year)
+    day = date.fromordinal(key)
+    text = "{} {}".format(MONTH_NAMES[day.month], day.day)
+    return text if period == DAY else "week of " + text
+
+
+# the rollups for one account
+class Rollups:
+    def __init__(self):
+        self.buckets = {period: {} for period in PERIODS}  # period -> bucket key -> list of FIELDS
+
+    # adds one transaction (its signed change in cents, its jar changes, and when it happened)
+    def add(self, when, change, split):
+        day = date.fromtimestamp(when)
+        for period, key in zip(PERIODS, bucket_keys(day)):
+            bucket = self.buckets[period].get(key)
+            if bucket is None:
+                bucket = self.buckets[period][key] = [0] * len(FIELDS)
+            if change >= 0:
+                bucket[DEPOSITS] += change
+            else:
+                bucket[WITHDRAWALS] -= change
+            bucket[COUNT] += 1
+            for jar, jar_change in enumerate(split):
+                bucket[FIRST_JAR + jar] += jar_change
+
+    # listens to the ledger (see Ledger.subscribe) so every new transaction is added as it's posted
+    def changed(self, ledger, index):
+        if index is not None:
+            kind, change, balance, when = ledger.entry(index)
+            self.add(when, change, ledger.split(index))
+
+    # one bucket as a dict of FIELDS (all zeros if nothing happened then)
+    def bucket(self, period, key):
+        return dict(zip(FIELDS, self.buckets[period].get(key, [0] * len(FIELDS))))
+
+    # every bucket from first to last (keys, both included) as (key, list of FIELDS), including empty ones. Only
+    # looks at those buckets, however many transactions there are
+    def series(self, period, first, last):
+        empty = [0] * len(FIELDS)
+        buckets = self.buckets[period]
+        return [(key, buckets.get(key, empty)) for key in self.keys(period, first, last)]
+
+    # the keys from first to last. Weeks are 7 days apart, days & months are 1 apart
+    def keys(self, period, first, last):
+        return range(first, last + 1, 7 if period == WEEK else 1)
+
+    # the FIELDS added up from first to last
+    def total(self, period, first, last):
+        totals = [0] * len(FIELDS)
+        for key, bucket in self.series(period, first, last):
+            for field, amount in enumerate(bucket):
+                totals[field] += amount
+        return dict(zip(FIELDS, totals))
+
+    # the last count buckets up to and including the one that has now in it (like the last 12 months)
+    def trend(self, period, count, now=None):
+        last = bucket_key(period, date.fromtimestamp(time.time() if now is None else now))
+        step = 7 if period == WEEK else 1
+        return self.series(period, last - (count - 1) * step, last)
+
+    # the bucket that has now in it (like "this month")
+    def current(self, period, now=None):
+        return self.bucket(period, bucket_key(period, date.fromtimestamp(time.time() if now is None else now)))
+
+    def to_json(self):
+        return {period: {str(key): bucket for key, bucket in buckets.items()} for period, buckets in
+                self.buckets.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        rollups = cls()
+        for period in PERIODS:
+            rollups.buckets[period] = {int(key): list(bucket) for key, bucket in data.get(period, {}).items()}
+        return rollups
+
+
+# the rollups that go with a journal. They're saved in their own file every time the journal takes a snapshot (so
+# they match it), and anything replayed from the journal after that snapshot is added back in when it's loaded
+class JournalRollups(Rollups):
+    def __init__(self, path=ROLLUPS_FILE):
+        Rollups.__init__(self)
+        self.path = path
+        self.seq = 0  # the journal record the saved file is up to
+
+    @classmethod
+    def load(cls, journal, path=ROLLUPS_FILE):
+        rollups = cls(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            rollups.buckets = cls.from_json(data).buckets
+            rollups.seq = data["seq"]
+        except (OSError, ValueError, KeyError):
+            pass  # no rollups yet (or a damaged file), they start from here
+        # records replayed from the journal don't have their time saved, so they count as happening when replayed
+        replayed_at = time.time()
+        for seq, change, split in journal.replay_log:
+            if seq > rollups.seq:
+                rollups.add(replayed_at, change, split)
+        journal.checkpoint_listeners.append(rollups.save)
+        return rollups
+
+    # saves the rollups as of journal record seq (called by the journal when it takes a snapshot)
+    def save(self, seq):
+        from .journal import write_atomic
+        data = self.to_json()
+        data["seq"] = self.seq = seq
+        write_atomic(self.path, json.dumps(data, separators=(",", ":")))
@@ -0,0 +1,182 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Rules for when the piggy bank should celebrate: reaching the savings goal, milestones for the total
+# (like the first $10) and amounts in one jar (like $150 saved for a bike). They're checked on every transaction, not
+# just when the budget window is opened. Each account's amounts are kept sorted (one list for the total and one for
+# each jar), so a transaction only has to look up where the old & new balances fall in each list (bisect) and the
+# rules in between are the ones it just crossed, no matter how many rules there are. What happens when a rule is
+# reached (a message, a sound, the LCD) runs on its own thread, so the coins never wait for it.
+# The rules come from smart_bank_rules.json if there is one, like:
+#   {"*": [{"name": "First $10", "at": "10.00"}], "Piggy Bank": [{"name": "Bike", "jar": "save", "at": 150}]}
+# "*" is for every account, "jar" is give, save or spend (the total if it's left out) and "at" is in dollars.
+#####################################################################################################################
+
+import json
+import queue
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+
+from . import metrics, tracing
+from .jars import JARS, SAVE
+from .ledger import to_cents, format_cents
+
+RULES_FILE = "smart_bank_rules.json"
+EVERY = "*"  # the accounts key for rules every account has
+TOTAL = len(JARS)  # the measure for the total (the jars are 0, 1 & 2, in the same order as JARS)
+GOAL = "goal"
+MILESTONE = "milestone"
+JAR = "jar"
+MILESTONES = (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)  # in cents, on the total, for every account
+
+FIRED = metrics.counter("smartbank_rules_fired_total", "Rules reached (goal, milestones & jar amounts)")
+CHECK_TIME = metrics.histogram("smartbank_rules_check_seconds", "Time to check the rules for one transaction")
+
+# one rule. measure is TOTAL or a jar, cents is the amount it's reached at (None for the goal, which is always the
+# ledger's goal in the save jar like the budget window's progress bar)
+Rule = namedtuple("Rule", "name kind measure cents")
+# a rule that was reached: the account, the balance it was reached with, and the index of the transaction (None if
+# it was reached by changing the goal)
+Hit = namedtuple("Hit", "rule account cents index")
+
+GOAL_RULE = Rule("Savings goal", GOAL, SAVE, None)
+
+
+# the rules every account gets when there's no rules file
+def default_rules():
+    return {EVERY: [GOAL_RULE] + [Rule(format_milestone(cents), MILESTONE, TOTAL, cents) for cents in MILESTONES]}
+
+
+def format_milestone(cents):
+    return "{} saved".format(format_cents(cents))
+
+
+# reads the rules file into {account: [Rule]} (the goal & milestones are always in "*"). Raises ValueError if it's
+# not the right shape or an amount isn't money
+def load_rules(path=RULES_FILE):
+    rules = default_rules()
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return rules
+    if not isinstance(saved, dict):
+        raise ValueError("{} should have an object of accounts".format(path))
+    for account, entries in saved.items():
+        for entry in entries:
+            if not isinstance(entry, dict) or "at" not in entry:
+                raise ValueError("{}: each rule needs an amount (\"at\")".format(path))
+            jar = entry.get("jar")
+            if jar is None:
+                measure, kind = TOTAL, MILESTONE
+            elif jar in JARS:
+                measure, kind = JARS.index(jar), JAR
+            else:
+                raise ValueError("{}: unknown jar {!r}".format(path, jar))
+            cents = to_cents(entry["at"])
+            rules.setdefault(account, []).append(Rule(entry.get("name", format_milestone(cents)), kind, measure,
+                                                      cents))
+    return rules
+
+
+# one account's rules, sorted by amount for each measure. The goal rule is in the save jar's list at the goal
+class Index:
+    def __init__(self, rules, goal):
+        self.rules = rules
+        self.goal = goal
+        self.cents = [[] for _ in range(TOTAL + 1)]  # the sorted amounts for each measure
+        self.found = [[] for _ in range(TOTAL + 1)]  # the rule at the same place in cents
+        for measure in range(TOTAL + 1):
+            self.build(measure)
+
+    def build(self, measure):
+        entries = sorted(((self.goal if rule.cents is None else rule.cents), n, rule)
+                         for n, rule in enumerate(self.rules) if rule.measure == measure)
+        self.cents[measure] = [cents for cents, n, rule in entries]
+        self.found[measure] = [rule for cents, n, rule in entries]
+
+    # moves the goal rule to a new goal (only sorts the save jar's list again, it doesn't happen with coins)
+    def set_goal(self, goal):
+        if goal != self.goal:
+            self.goal = goal
+            self.build(GOAL_RULE.measure)
+
+    # the rules for one measure that are above old and at or below new, lowest first
+    def crossed(self, measure, old, new):
+        cents = self.cents[measure]
+        return self.found[measure][bisect_right(cents, old):bisect_right(cents, new)]
+
+
+# checks the rules on every change to the open account's ledger (it's a ledger listener) and queues what was reached.
+# A thread takes the hits out of the queue and calls each hook with them. rules is what load_rules() returns
+class Rules:
+    def __init__(self, rules=None):
+        self.rules = default_rules() if rules is None else rules
+        self.indexes = {}  # account -> Index, made the first time the account is opened & kept for switching back
+        self.index = None  # the open account's
+        self.account = None
+        self.values = None  # each jar & the total after the last change (the total is last, at TOTAL)
+        self.hooks = []  # called as hook(hit) on the rules thread
+        self.fired = queue.SimpleQueue()
+        self.thread = None
+
+    # the account that's open now. Nothing is reached by opening an account, only by what happens after
+    def open(self, account, ledger):
+        self.account = account
+        self.index = self.indexes.get(account)
+        if self.index is None:
+            self.index = Index(self.rules.get(EVERY, []) + self.rules.get(account, []), ledger.goal)
+            self.indexes[account] = self.index
+        self.index.set_goal(ledger.goal)
+        self.values = tuple(ledger.jars.balances) + (ledger.total,)
+
+    # ledger listener: each measure that went up is looked up in its sorted list
+    def changed(self, ledger, index):
+        begin = metrics.now()
+        values = tuple(ledger.jars.balances) + (ledger.total,)
+        if index is None:  # a new goal (or new percentages, which don't move anything)
+            old_goal = self.index.goal
+            self.index.set_goal(ledger.goal)
+            save = values[SAVE]
+            if ledger.goal <= save < old_goal:  # the goal came down to what's already saved
+                self.hit(GOAL_RULE, save, None)
+        else:
+            for measure, (old, new) in enumerate(zip(self.values, values)):
+                if new > old:
+                    for rule in self.index.crossed(measure, old, new):
+                        self.hit(rule, new, index)
+        self.values = values
+        CHECK_TIME.since(begin)
+
+    def hit(self, rule, cents, index):
+        FIRED.add()
+        tracing.event(tracing.RULE, self.index.goal if rule.cents is None else rule.cents, cents,
+                      -1 if index is None else index)
+        self.fired.put(Hit(rule, self.account, cents, index))
+
+    # adds something to do when a rule is reached. It's called on the rules thread, so anything that changes the
+    # GUI should queue it for the GUI's thread (like GUI.poll_rules)
+    def hook(self, hook):
+        self.hooks.append(hook)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="rules", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            hit = self.fired.get()
+            if hit is None:
+                break
+            for hook in self.hooks:
+                try:
+                    hook(hit)
+                except Exception as error:  # a broken reward shouldn't stop the rest of them
+                    tracing.failed(error, threading.get_ident())
+
+    # waits for the hits already queued to be handled
+    def stop(self):
+        if self.thread is not None:
+            self.fired.put(None)
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,215 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Pays a weekly (or daily, or monthly) allowance and interest on the save jar, so money can come in
+# without a button being pressed and kids can watch their savings grow. Each account's payments are kept in a heap by
+# when they're next due, and the GUI (or headless mode) just waits until the first one. If the piggy bank was turned
+# off for a while, the missed payments are worked out all at once when it starts: the number of missed weeks (or
+# months) is a subtraction, and the interest for n of them is balance * ((1 + rate)^n - 1), so it takes the same time
+# whether it was off for a week or a year. Everything that's due is paid at once: the allowance as one deposit (split
+# between the jars like any other) and the interest as one adjustment to the save jar.
+# The payments come from smart_bank_schedule.json if there is one, like:
+#   {"*": {"allowance": {"amount": "5.00", "every": "week"}},
+#    "Piggy Bank": {"interest": {"percent": 1, "every": "month"}}}
+# "*" is for every account and "every" is day, week or month. When each one was last paid is kept in
+# smart_bank_schedule_paid.json, so it's only paid once even if the bank is restarted.
+#####################################################################################################################
+
+import calendar
+import datetime
+import heapq
+import json
+import time
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from . import tracing
+from .jars import SAVE
+from .journal import DEPOSIT, ADJUST, write_atomic
+from .lcd_render import WIDTH
+from .ledger import to_cents, format_cents
+
+SCHEDULE_FILE = "smart_bank_schedule.json"
+PAID_FILE = "smart_bank_schedule_paid.json"
+EVERY = "*"  # the accounts key for payments every account gets
+ALLOWANCE = "allowance"
+INTEREST = "interest"
+DAY = "day"
+WEEK = "week"
+MONTH = "month"
+SECONDS = {DAY: 86400, WEEK: 7 * 86400}  # months aren't all the same length, they're counted on the calendar
+MAX_WAIT = 60.0  # the longest wait() asks for, so a clock that's changed (or a pi that was asleep) is noticed
+
+# one recurring payment. amount is cents for an allowance and a Decimal fraction (0.01 for 1%) for interest
+Plan = namedtuple("Plan", "kind amount every")
+# what run() paid: the index of the last transaction, how much was allowance & interest, and how many periods it
+# covered
+Payout = namedtuple("Payout", "index allowance interest periods")
+
+
+# reads the schedule file into {account: [Plan]}. Raises ValueError if it's not the right shape
+def load_schedule(path=SCHEDULE_FILE):
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if not isinstance(saved, dict):
+        raise ValueError("{} should have an object of accounts".format(path))
+    plans = {}
+    for account, entries in saved.items():
+        if not isinstance(entries, dict):
+            raise ValueError("{}: {!r} should have an allowance and/or interest".format(path, account))
+        for kind, entry in entries.items():
+            if kind not in (ALLOWANCE, INTEREST) or not isinstance(entry, dict):
+                raise ValueError("{}: unknown payment {!r}".format(path, kind))
+            every = entry.get("every", WEEK)
+            if every not in (DAY, WEEK, MONTH):
+                raise ValueError("{}: payments can be every day, week or month, not {!r}".format(path, every))
+            if kind == ALLOWANCE:
+                amount = to_cents(entry.get("amount", 0))
+            else:
+                try:
+                    amount = Decimal(str(entry.get("percent", 0))) / 100
+                except InvalidOperation:
+                    raise ValueError("{}: not a percentage: {!r}".format(path, entry.get("percent")))
+                if not amount.is_finite():
+                    raise ValueError("{}: not a percentage: {!r}".format(path, entry.get("percent")))
+            if amount <= 0:
+                raise ValueError("{}: the {} has to be more than 0".format(path, kind))
+            plans.setdefault(account, []).append(Plan(kind, amount, every))
+    return plans
+
+
+# the same day & time some months later (the 31st becomes the last day of shorter months)
+def add_months(when, months):
+    month = when.month - 1 + months
+    year = when.year + month // 12
+    month = month % 12 + 1
+    return when.replace(year=year, month=month, day=min(when.day, calendar.monthrange(year, month)[1]))
+
+
+# how many whole periods have gone by between start and now (both seconds since the epoch), without counting them
+# one by one. The n-th payment is due n periods after start
+def periods(start, now, every):
+    if now < start:
+        return 0
+    if every in SECONDS:
+        return int((now - start) // SECONDS[every])
+    begin = datetime.datetime.fromtimestamp(start)
+    end = datetime.datetime.fromtimestamp(now)
+    months = (end.year - begin.year) * 12 + end.month - begin.month
+    if add_months(begin, months) > end:  # this month's isn't due yet
+        months -= 1
+    return months
+
+
+# when the n-th payment is due
+def due(start, n, every):
+    if every in SECONDS:
+        return start + n * SECONDS[every]
+    return add_months(datetime.datetime.fromtimestamp(start), n).timestamp()
+
+
+# interest on balance for n periods, compounded each period, rounded to the nearest cent
+def compound(balance, rate, n):
+    if balance <= 0 or n <= 0:
+        return 0
+    return int((balance * ((1 + rate) ** n - 1)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+# pays the open account's allowance & interest when they're due. plans is what load_schedule() returns. It's run
+# from the thread that changes the ledger (the GUI's, or headless mode's), so nothing needs a lock
+class Scheduler:
+    def __init__(self, plans=None, path=PAID_FILE, clock=time.time):
+        self.plans = {} if plans is None else plans
+        self.path = path
+        self.clock = clock
+        self.paid = self.load()  # account -> kind -> {"start": time, "made": payments made, "every": period}
+        self.heap = []  # (when it's due, kind, plan) for the open account
+        self.account = None
+        self.ledger = None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):  # nothing paid yet (or a damaged file, which starts over from now)
+            return {}
+
+    # the account that's open now. Anything it missed while the bank was off (or while another account was open) is
+    # paid straight away. Returns the Payout, or None if nothing was due
+    def open(self, account, ledger):
+        self.account = account
+        self.ledger = ledger
+        now = self.clock()
+        plans = {plan.kind: plan for plan in self.plans.get(EVERY, []) + self.plans.get(account, [])}
+        paid = self.paid.setdefault(account, {})
+        self.heap = []
+        started = False
+        for kind, plan in plans.items():
+            if paid.get(kind, {}).get("every") != plan.every:  # a new payment (or a new period) starts from now
+                paid[kind] = {"start": now, "made": 0, "every": plan.every}
+                started = True
+            heapq.heappush(self.heap, (due(paid[kind]["start"], paid[kind]["made"] + 1, plan.every), kind, plan))
+        if started:  # saved now, or restarting the bank every few days would keep putting the first payment off
+            self.save()
+        return self.run(now)
+
+    def save(self):
+        write_atomic(self.path, json.dumps(self.paid, sort_keys=True) + "\n")
+
+    # seconds until the next payment (at most MAX_WAIT), or None if there are none
+    def wait(self):
+        if not self.heap:
+            return None
+        return min(max(0.0, self.heap[0][0] - self.clock()), MAX_WAIT)
+
+    # pays everything that's due. Only the payments that are due are looked at, and each one works
+    # out how many periods it missed in one go
+    def run(self, now=None):
+        now = self.clock() if now is None else now
+        paid = self.paid[self.account] if self.account is not None else {}
+        allowance = interest = count = 0
+        ready = []
+        while self.heap and self.heap[0][0] <= now:
+            ready.append(heapq.heappop(self.heap))
+        for when, kind, plan in ready:
+            start, made = paid[kind]["start"], paid[kind]["made"]
+            missed = periods(start, now, plan.every) - made
+            if missed > 0:
+                count = max(count, missed)
+                if kind == ALLOWANCE:
+                    allowance += plan.amount * missed
+                else:  # on what was in the save jar (the missed allowance wasn't in it yet)
+                    interest += compound(self.ledger.jars.balances[SAVE], plan.amount, missed)
+                made += missed
+                paid[kind]["made"] = made
+            heapq.heappush(self.heap, (due(start, made + 1, plan.every), kind, plan))
+        if count == 0:
+            return None
+        # saved first, so if the power goes out right here a payment is missed rather than paid twice
+        self.save()
+        if allowance + interest == 0:
+            return None
+        # posted with pay_in() so Undo, Clear & Cancel can't take back what's already marked as paid. Each is split
+        # the same way when the journal is replayed, so the jars' leftover fractions of a cent always agree
+        if allowance:
+            index = self.ledger.pay_in(DEPOSIT, allowance, now)
+        if interest:
+            split = [0] * len(self.ledger.jars.balances)
+            split[SAVE] = interest  # the interest stays in the save jar
+            index = self.ledger.pay_in(ADJUST, interest, now, split)
+        tracing.event(tracing.PAYOUT, allowance, interest, count)
+        return Payout(index, allowance, interest, count)
+
+
+# what a payout says on the LCD's top line: what it was for if that fits, otherwise just how much was paid
+def describe(payout, width=WIDTH):
+    paid = payout.allowance + payout.interest
+    if payout.allowance and payout.interest:
+        text = "Allow+int {}".format(format_cents(paid))
+    elif payout.allowance:
+        text = "Allowance {}".format(format_cents(payout.allowance))
+    else:
+        text = "Interest {}".format(format_cents(payout.interest))
+    return text if len(text) <= width else "Paid {}".format(format_cents(paid))
@@ -0,0 +1,441 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Lets the GUI and the coin button program run at the same time as two processes without losing coins.
+# Before, each one loaded the balance by itself and saved its own total over the other's. Now only one process, the
+# bank (python -m smartbank --shared bank), keeps the journal or database. The coin process (python -m smartbank
+# --headless --shared coins) just puts each coin in a ring of slots in shared memory, and the bank takes them out a
+# few dozen microseconds later, with no files in between (the coin process also writes one byte to a pipe, the
+# "doorbell", so the bank wakes up right away instead of checking over and over). The bank puts its total back in the
+# same memory after each transaction so the coin process can show it on the LCD.
+# There's one writer for each part (the coin process writes coins, the bank writes its total & how far it has saved),
+# so nothing needs a lock between the processes. Every slot has its number and a checksum, and a slot is only taken
+# once both say it's been written all the way (so a slot being written at that moment is just picked up next time).
+# A coin stays in the ring until the bank's journal (or database) has it on the disk, so if the bank crashes with coins
+# it hadn't saved yet, the coin process sends them again to the next bank.
+#####################################################################################################################
+
+import os
+import queue
+import select
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+from . import metrics, tracing
+from .coin_input import COIN_PINS, CoinEvent
+from .pulse import DENOMINATIONS
+
+SEGMENT = "smartbank"  # the shared memory's name (/dev/shm/smartbank on the pi)
+CAPACITY = 4096  # coin slots in the ring (a whole jar of coins dumped in at once fits)
+MAGIC = b"SPBS"
+VERSION = 1
+
+# where everything is in the shared memory. Each part someone writes is in its own 64 byte cache line
+HEADER = struct.Struct("<4sII")  # magic, version, capacity
+BANK_PID_AT = 16
+COINS_PID_AT = 24  # the coin process sending coins (0 if there isn't one)
+READ_AT = 64  # how many coins the bank has saved (only the bank writes this), the ones after it aren't safe yet
+CLOSED_AT = 72  # CLOSING once the bank stops taking coins, CLOSED once it has saved the last ones (coins go to the next
+# bank that starts)
+WRITTEN_AT = 128  # how many coins have been put in (only the coin process writes this)
+BALANCE_AT = 192
+BALANCE = struct.Struct("<QQqqqqq")  # version, coins applied, total, give, save & spend jars, goal
+SLOTS_AT = 256
+SLOT = struct.Struct("<QdiI")  # coin number (from 1), when it was pressed (time.monotonic), cents, pin
+CHECK = struct.Struct("<I")  # the checksum after each slot & the balance
+SLOT_SIZE = 32
+INDEX = struct.Struct("<Q")
+PID = struct.Struct("<q")
+CLOSING = 1
+CLOSED = 2
+
+POLL_BUSY = 0.0002  # how long the bank waits between looking for coins while they're coming in (with no doorbell)
+POLL_IDLE = 0.002  # and once it's been quiet for a while
+BELL_WAIT = 0.1  # with the doorbell it still looks this often, in case a ring was missed
+FULL_WAIT = 0.001  # how long the coin process waits for room if the ring is full (coins are never dropped)
+SHOW_WAIT = 0.25  # how long the coin process waits for the bank's new total before showing it anyway
+CLOSE_GRACE = 0.05  # how long the bank waits for a coin that was being put in as it closed
+CLOSE_WAIT = 3.0  # how long the coin process waits, when it stops, for the bank to save the last coins it sent
+
+NAMES = {value: name for name, value in list(COIN_PINS.values()) + list(DENOMINATIONS.values())}
+
+PUSH_TIME = metrics.histogram("smartbank_shared_push_seconds", "Time to put one coin in shared memory")
+RING_FULL = metrics.counter("smartbank_shared_full_total", "Times the coin process waited for room in the ring")
+
+# the bank's total as the coin process sees it (applied is how many of the shared coins are in it)
+Balance = namedtuple("Balance", ["applied", "total", "jars", "goal"])
+
+
+class ChannelClosed(Exception):
+    pass
+
+
+# the doorbell's named pipe, next to the shared memory
+def bell_path(name):
+    folder = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(folder, name + ".bell")
+
+
+# whether a process is still running
+def alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# the shared memory, from either side. The bank makes it with create() and the coin process joins it with attach()
+class SharedChannel:
+    def __init__(self, memory, owner, bell=None, bell_path=None):
+        self.memory = memory
+        self.buf = memory.buf
+        self.owner = owner  # True for the bank (it removes the memory when it closes)
+        self.bell = bell  # the doorbell pipe (read end for the bank, write end for the coin process), or None
+        self.bell_path = bell_path
+        self.bell_writer = None  # the bank keeps the pipe open for writing too, so it never reads an end of file
+        magic, version, self.capacity = HEADER.unpack_from(self.buf, 0)
+        self.bank_pid = PID.unpack_from(self.buf, BANK_PID_AT)[0]
+        self.read = INDEX.unpack_from(self.buf, READ_AT)[0]  # the bank: how many coins it has taken out
+        self.written = INDEX.unpack_from(self.buf, WRITTEN_AT)[0]
+        self.version = 0
+
+    # makes the shared memory for a bank. A bank that's still running with it is an error, one that crashed without
+    # removing it is cleaned up
+    @classmethod
+    def create(cls, name=SEGMENT, capacity=CAPACITY):
+        size = SLOTS_AT + capacity * SLOT_SIZE
+        try:
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            old = shared_memory.SharedMemory(name)
+            pid = PID.unpack_from(old.buf, BANK_PID_AT)[0]
+            closed = INDEX.unpack_from(old.buf, CLOSED_AT)[0]
+            old.close()
+            if alive(pid) and not closed and pid != os.getpid():
+                raise RuntimeError("another bank (process {}) is already sharing its coins".format(pid))
+            old.unlink()
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        memory.buf[:SLOTS_AT] = bytes(SLOTS_AT)
+        HEADER.pack_into(memory.buf, 0, MAGIC, VERSION, capacity)
+        PID.pack_into(memory.buf, BANK_PID_AT, os.getpid())
+        path = bell_path(name)
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+            os.mkfifo(path, 0o600)
+            bell = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        except (OSError, AttributeError):  # no named pipes here, the bank just keeps checking
+            return cls(memory, True)
+        channel = cls(memory, True, bell, path)
+        channel.bell_writer = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        return channel
+
+    # joins a bank's shared memory as the one coin process. FileNotFoundError if no bank is running
+    @classmethod
+    def attach(cls, name=SEGMENT):
+        try:
+            memory = shared_memory.SharedMemory(name, track=False)  # only the bank removes the memory
+        except TypeError:  # before Python 3.13 it would be removed when this process exits (bpo-39959)
+            memory = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(memory._name, "shared_memory")
+        magic, version, capacity = HEADER.unpack_from(memory.buf, 0)
+        coins_pid = PID.unpack_from(memory.buf, COINS_PID_AT)[0]
+        if magic != MAGIC or version != VERSION:
+            memory.close()
+            raise RuntimeError("{} isn't a piggy bank's shared memory".format(name))
+        if alive(coins_pid) and coins_pid != os.getpid():
+            memory.close()
+            raise RuntimeError("another coin process ({}) is already sending coins to the bank".format(coins_pid))
+        PID.pack_into(memory.buf, COINS_PID_AT, os.getpid())
+        try:
+            bell = os.open(bell_path(name), os.O_WRONLY | os.O_NONBLOCK)
+        except (OSError, AttributeError):
+            bell = None
+        return cls(memory, False, bell)
+
+    # whether the bank has stopped taking coins (or crashed, then nothing will ever take the coins out)
+    @property
+    def closed(self):
+        return INDEX.unpack_from(self.buf, CLOSED_AT)[0] != 0 or not alive(self.bank_pid)
+
+    # whether the bank is gone for good, so how many coins it saved won't change any more
+    @property
+    def finished(self):
+        return INDEX.unpack_from(self.buf, CLOSED_AT)[0] == CLOSED or not alive(self.bank_pid)
+
+    # the coin process: puts one coin in the next slot. Waits if the bank has fallen a whole ring behind
+    def push(self, when, pin, cents):
+        begin = metrics.now()
+        seq = self.written + 1
+        while seq - 1 - INDEX.unpack_from(self.buf, READ_AT)[0] >= self.capacity:
+            if self.closed:
+                raise ChannelClosed()
+            RING_FULL.add()
+            time.sleep(FULL_WAIT)
+        if self.closed:
+            raise ChannelClosed()
+        offset = SLOTS_AT + (seq - 1) % self.capacity * SLOT_SIZE
+        SLOT.pack_into(self.buf, offset, seq, when, cents, pin)
+        CHECK.pack_into(self.buf, offset + SLOT.size, zlib.crc32(self.buf[offset:offset + SLOT.size]))
+        self.written = seq
+        INDEX.pack_into(self.buf, WRITTEN_AT, seq)
+        if self.bell is not None:
+            try:
+                os.write(self.bell, b"\1")
+            except BlockingIOError:  # the pipe is full of rings already, the bank is on its way
+                pass
+            except OSError:  # the bank is gone, push() finds out next time
+                pass
+        PUSH_TIME.since(begin)
+        return seq
+
+    # the bank: waits up to timeout for the doorbell (or just sleeps that long if there isn't one)
+    def wait(self, timeout):
+        if self.bell is None:
+            time.sleep(timeout)
+            return
+        if select.select([self.bell], [], [], timeout)[0]:
+            try:
+                while os.read(self.bell, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    # the bank: takes out every coin that's been put in, as (when, pin, cents), oldest first. They stay in the ring
+    # until done() says they're saved
+    def pop(self):
+        coins = []
+        read = self.read
+        while True:
+            offset = SLOTS_AT + read % self.capacity * SLOT_SIZE
+            seq, when, cents, pin = SLOT.unpack_from(self.buf, offset)
+            if seq != read + 1 or CHECK.unpack_from(self.buf, offset + SLOT.size)[0] != zlib.crc32(
+                    self.buf[offset:offset + SLOT.size]):
+                break  # not written (all the way) yet
+            coins.append((when, pin, cents))
+            read += 1
+        self.read = read
+        return coins
+
+    # the bank: the first count coins it took out are saved, so their slots can be used again
+    def done(self, count):
+        INDEX.pack_into(self.buf, READ_AT, count)
+
+    # how many coins the bank has saved
+    def saved(self):
+        return INDEX.unpack_from(self.buf, READ_AT)[0]
+
+    # the coin process: waits until the bank has saved coin seq, it's gone, or timeout runs out (None waits as long
+    # as the bank is there). Returns whether the coin was saved
+    def wait_saved(self, seq, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.saved() < seq:
+            if self.finished:
+                return self.saved() >= seq  # it may have saved them just before it finished
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(POLL_IDLE)
+        return True
+
+    # the coin process: the coins it put in that the bank never saved, as (when, pin, cents), oldest first
+    def unread(self):
+        coins = []
+        for seq in range(INDEX.unpack_from(self.buf, READ_AT)[0] + 1, self.written + 1):
+            seq, when, cents, pin = SLOT.unpack_from(self.buf, SLOTS_AT + (seq - 1) % self.capacity * SLOT_SIZE)
+            coins.append((when, pin, cents))
+        return coins
+
+    # the bank: puts its total, jars & goal where the coin process can see them. applied is how many shared coins
+    # are in the total
+    def publish(self, ledger, applied):
+        self.version += 1
+        give, save, spend = ledger.jars.balances
+        BALANCE.pack_into(self.buf, BALANCE_AT, self.version, applied, ledger.total, give, save, spend, ledger.goal)
+        CHECK.pack_into(self.buf, BALANCE_AT + BALANCE.size,
+                        zlib.crc32(self.buf[BALANCE_AT:BALANCE_AT + BALANCE.size]))
+
+    # the coin process: the bank's last total (None if it hasn't put one there yet, or it's being written right now)
+    def balance(self):
+        version, applied, total, give, save, spend, goal = BALANCE.unpack_from(self.buf, BALANCE_AT)
+        check = CHECK.unpack_from(self.buf, BALANCE_AT + BALANCE.size)[0]
+        if version == 0 or check != zlib.crc32(self.buf[BALANCE_AT:BALANCE_AT + BALANCE.size]):
+            return None
+        return Balance(applied, total, (give, save, spend), goal)
+
+    # the coin process: waits (a little) for the bank to have coin seq in its total and returns the total
+    def balance_after(self, seq, timeout=SHOW_WAIT):
+        deadline = time.monotonic() + timeout
+        while True:
+            balance = self.balance()
+            if (balance is not None and balance.applied >= seq) or time.monotonic() > deadline or self.closed:
+                return balance
+            time.sleep(POLL_BUSY)
+
+    def close(self):
+        if self.owner:
+            INDEX.pack_into(self.buf, CLOSED_AT, CLOSED)
+        else:
+            PID.pack_into(self.buf, COINS_PID_AT, 0)  # another coin process can join now
+        for fd in (self.bell, self.bell_writer):
+            if fd is not None:
+                os.close(fd)
+        self.bell = self.bell_writer = None
+        self.buf = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            if self.bell_path is not None and os.path.exists(self.bell_path):
+                os.unlink(self.bell_path)
+
+
+# the coin queue for the bank's side, counting the coins taken out of it so the bank can tell the coin process which
+# of its coins are in the total (the total is published while the coin that was just taken out is being deposited),
+# and which are saved
+class TakenQueue(queue.Queue):
+    def __init__(self):
+        queue.Queue.__init__(self)
+        self.taken = 0
+
+    def _get(self):
+        self.taken += 1
+        return queue.Queue._get(self)
+
+
+# the bank's coins from the coin process, as a drop-in for CoinInput (same events queue, get, drain & stop), so the
+# GUI and headless mode handle them like coins from their own buttons. A thread moves them out of shared memory
+class SharedCoins:
+    def __init__(self, channel):
+        self.channel = channel
+        self.events = TakenQueue()
+        self.deposited = 0  # how many coins are in the total (and the journal), saved or not
+        self.saving = threading.Lock()  # the ledger's thread & the journal's sync timer both mark coins saved
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="shared-coins", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        wait = POLL_BUSY
+        while self.running:
+            if self.move():
+                wait = POLL_BUSY
+            elif self.channel.bell is not None:
+                wait = BELL_WAIT  # the doorbell wakes it up when a coin comes in
+            else:
+                wait = min(wait * 2, POLL_IDLE)  # backs off while nothing is coming in
+            self.channel.wait(wait)
+
+    # moves the coins waiting in shared memory into the events queue. Returns how many there were
+    def move(self):
+        coins = self.channel.pop()
+        for when, pin, cents in coins:
+            self.events.put(CoinEvent(when, pin, NAMES.get(cents, "Coin"), cents))
+        return len(coins)
+
+    # the ledger listener that shares each new total with the coin process, and lets go of the coins that are saved.
+    # deposited is set first, so a sync that happens at the same time either sees it or leaves nothing pending
+    def publish(self, ledger, index):
+        self.deposited = self.events.taken
+        self.channel.publish(ledger, self.deposited)
+        if ledger.journal.pending == 0:  # a database commits each one right away
+            self.synced(None)
+
+    # the journal's sync listener: every coin deposited so far is on the disk now
+    def synced(self, seq):
+        with self.saving:
+            if self.deposited > self.channel.saved():
+                self.channel.done(self.deposited)
+
+    def get(self, timeout=None):
+        return self.events.get(timeout=timeout)
+
+    def drain(self):
+        coins = []
+        while True:
+            try:
+                coins.append(self.events.get_nowait())
+            except queue.Empty:
+                return coins
+
+    # marks the bank as closing, then takes out any coin that was being put in right then (drain() has them after).
+    # The coin process waits for SharedChannel.close() to know which coins were saved
+    def stop(self):
+        self.running = False
+        if self.channel.bell_writer is not None:
+            os.write(self.channel.bell_writer, b"\0")  # wakes the thread up so it sees it's stopped
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        INDEX.pack_into(self.channel.buf, CLOSED_AT, CLOSING)
+        time.sleep(CLOSE_GRACE)
+        self.move()
+
+
+# the coin process: joins the bank's shared memory, waiting for the bank to start if it hasn't yet
+def wait_for_bank(name=SEGMENT, lcd=None, interval=1.0):
+    told = False
+    while True:
+        try:
+            channel = SharedChannel.attach(name)
+            if not channel.closed:
+                return channel
+            channel.close()  # left over from a bank that's gone, the next bank makes it again
+        except FileNotFoundError:
+            pass
+        if not told:
+            tracing.event(tracing.WAITING)
+            if lcd is not None:
+                lcd.text("Waiting for bank", 1)
+            told = True
+        time.sleep(interval)
+
+
+# the coin process's side: sends each coin to whichever bank is running. If the bank closes (or is restarted, or
+# crashes) the coins it didn't save are sent again to the next one, so a coin is never lost in between
+class CoinSender:
+    def __init__(self, name=SEGMENT, lcd=None):
+        self.name = name
+        self.lcd = lcd
+        self.channel = None
+        self.unsent = []  # (when, pin, cents) waiting for a bank, oldest first
+
+    # sends one coin (waiting for a bank if there isn't one). Returns its number, for SharedChannel.balance_after()
+    def send(self, when, pin, cents):
+        self.unsent.append((when, pin, cents))
+        while self.unsent:
+            if self.channel is None:
+                self.channel = wait_for_bank(self.name, self.lcd)
+            try:
+                seq = self.channel.push(*self.unsent[0])
+            except ChannelClosed:
+                self.channel.wait_saved(self.channel.written)  # it's still saving the coins it took out
+                self.unsent[:0] = self.channel.unread()
+                self.channel.close()
+                self.channel = None
+                continue
+            self.unsent.pop(0)
+        return seq
+
+    # waits (up to timeout) for the bank to save every coin sent to it, then lets go of the shared memory. Returns the
+    # coins that weren't saved, as (when, pin, cents), oldest first
+    def close(self, timeout=CLOSE_WAIT):
+        lost = self.unsent
+        self.unsent = []
+        if self.channel is not None:
+            if not self.channel.wait_saved(self.channel.written, timeout):
+                lost[:0] = self.channel.unread()
+            self.channel.close()
+            self.channel = None
+        return lost
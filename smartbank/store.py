@@ -0,0 +1,291 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: SQLite storage for households with more than one child (or a whole fleet of piggy banks). Each account
+# has its own balance, savings goal and list of transactions. Accounts are looked up by name through an index, so
+# switching between them stays quick no matter how many accounts or transactions there are. Each account also keeps
+# its jar balances & percentages, and each transaction how much it changed each jar (see jars.py). The daily, weekly
+# and monthly totals (see rollups.py) are kept in their own table and updated in the same SQLite transaction.
+#####################################################################################################################
+
+import queue  # holds the connections that aren't being used
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from datetime import date
+
+from .jars import Jars, DEFAULT_RATIOS, SPEND, format_ratios, parse_ratios
+from .journal import DEPOSIT, WITHDRAW, ADJUST, GOAL, RATIOS, DEFAULT_GOAL, jar_split
+from .rollups import Rollups, PERIODS, bucket_keys
+
+DB_FILE = "smart_bank.db"
+POOL_SIZE = 4  # how many connections are shared between the threads that use the store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    balance INTEGER NOT NULL DEFAULT 0,
+    goal INTEGER NOT NULL DEFAULT {goal}
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    account_id INTEGER NOT NULL REFERENCES accounts(id),
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    amount INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_by_account ON transactions (account_id, id);
+CREATE TABLE IF NOT EXISTS rollups (
+    account_id INTEGER NOT NULL REFERENCES accounts(id),
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    deposits INTEGER NOT NULL,
+    withdrawals INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    give INTEGER NOT NULL,
+    save INTEGER NOT NULL,
+    spend INTEGER NOT NULL,
+    PRIMARY KEY (account_id, period, bucket)
+) WITHOUT ROWID;
+""".format(goal=DEFAULT_GOAL)
+
+# the jar columns, added to the tables above (also to databases made before there were jars)
+JAR_COLUMNS = [
+    ("accounts", "give INTEGER NOT NULL DEFAULT 0"),
+    ("accounts", "save INTEGER NOT NULL DEFAULT 0"),
+    ("accounts", "spend INTEGER NOT NULL DEFAULT 0"),
+    ("accounts", "ratios TEXT NOT NULL DEFAULT '{}'".format(format_ratios(DEFAULT_RATIOS))),
+    ("accounts", "carry TEXT NOT NULL DEFAULT '0,0,0'"),  # the jars' leftover cent fractions
+    ("transactions", "give INTEGER NOT NULL DEFAULT 0"),
+    ("transactions", "save INTEGER NOT NULL DEFAULT 0"),
+    ("transactions", "spend INTEGER NOT NULL DEFAULT 0"),
+]
+
+# the statements used over and over. sqlite3 keeps each one compiled per connection (keyed on the exact text), so
+# they are written once here and reused with ? placeholders instead of being built up each time
+FIND_ACCOUNT = ("SELECT id, name, balance, goal, give, save, spend, ratios, carry FROM accounts "
+                "WHERE name = ?")  # uses the UNIQUE index (O(log n))
+ADD_ACCOUNT = "INSERT INTO accounts (name, balance, goal) VALUES (?, ?, ?)"
+ADD_TRANSACTION = ("INSERT INTO transactions (account_id, time, kind, amount, give, save, spend) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)")
+CHANGE_BALANCE = ("UPDATE accounts SET balance = balance + ?, give = give + ?, save = save + ?, spend = spend + ?, "
+                  "carry = ? WHERE id = ?")
+SET_GOAL = "UPDATE accounts SET goal = ? WHERE id = ?"
+SET_RATIOS = "UPDATE accounts SET ratios = ?, carry = ? WHERE id = ?"
+ADD_TO_ROLLUP = ("INSERT INTO rollups VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?) "
+                 "ON CONFLICT (account_id, period, bucket) DO UPDATE SET deposits = deposits + excluded.deposits, "
+                 "withdrawals = withdrawals + excluded.withdrawals, count = count + 1, give = give + excluded.give, "
+                 "save = save + excluded.save, spend = spend + excluded.spend")
+ROLLUPS = ("SELECT period, bucket, deposits, withdrawals, count, give, save, spend FROM rollups "
+           "WHERE account_id = ?")
+FIND_NAMES = "SELECT name FROM accounts WHERE name >= ? AND name < ? ORDER BY name LIMIT ?"
+HISTORY = ("SELECT id, time, kind, amount FROM transactions WHERE account_id = ? AND id < ? "
+           "ORDER BY id DESC LIMIT ?")
+COUNT_ACCOUNTS = "SELECT COUNT(*) FROM accounts"
+
+
+# a few SQLite connections shared by every thread, so nothing opens a new connection per transaction
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.idle = queue.Queue()
+        self.all = []
+        for _ in range(size):
+            conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't wait on the writer, and writes are appends
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL is still crash-safe with this & syncs far less often
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.all.append(conn)
+            self.idle.put(conn)
+
+    # borrows a connection for a with block and gives it back after
+    @contextmanager
+    def connection(self):
+        conn = self.idle.get()
+        try:
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def close(self):
+        for conn in self.all:
+            conn.close()
+        self.all = []
+
+
+# all of the accounts in one database file
+class AccountStore:
+    def __init__(self, path=DB_FILE, pool_size=POOL_SIZE):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            had_rollups = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollups'").fetchone() is not None
+            conn.executescript(SCHEMA)
+            self.add_jar_columns(conn)
+            if not had_rollups:
+                self.build_rollups(conn)
+
+    # adds the jar columns to a database made before there were jars, splitting each account's balance between its
+    # jars once (only the first time it's opened)
+    def add_jar_columns(self, conn):
+        have = {(table, row[1]) for table in ("accounts", "transactions")
+                for row in conn.execute("PRAGMA table_info({})".format(table))}
+        missing = [(table, column) for table, column in JAR_COLUMNS if (table, column.split()[0]) not in have]
+        if not missing:
+            return
+        with conn:
+            for table, column in missing:
+                conn.execute("ALTER TABLE {} ADD COLUMN {}".format(table, column))
+            for account_id, balance in conn.execute("SELECT id, balance FROM accounts").fetchall():
+                jars = Jars.from_total(balance)
+                conn.execute("UPDATE accounts SET give = ?, save = ?, spend = ?, carry = ? WHERE id = ?",
+                             (*jars.balances, format_ratios(jars.carry), account_id))
+
+    # returns the account with this name, making it first if it doesn't exist yet (and create is True)
+    def account(self, name, create=True):
+        with self.pool.connection() as conn:
+            row = conn.execute(FIND_ACCOUNT, (name,)).fetchone()
+            if row is None:
+                if not create:
+                    raise KeyError(name)
+                with conn:
+                    conn.execute(ADD_ACCOUNT, (name, 0, DEFAULT_GOAL))
+                row = conn.execute(FIND_ACCOUNT, (name,)).fetchone()
+        return StoreAccount(self, *row)
+
+    # works out the rollups from every transaction (only for a database made before there were rollups)
+    def build_rollups(self, conn):
+        with conn:
+            rows = conn.execute("SELECT account_id, time, kind, amount, give, save, spend FROM transactions")
+            for row in rows.fetchall():
+                account_id, when, kind, cents, *split = row
+                self.add_to_rollups(conn, account_id, when, -cents if kind == WITHDRAW else cents, split)
+
+    # adds one transaction to its day, week & month
+    def add_to_rollups(self, conn, account_id, when, change, split):
+        deposits, withdrawals = (change, 0) if change >= 0 else (0, -change)
+        for period, key in zip(PERIODS, bucket_keys(date.fromtimestamp(when))):
+            conn.execute(ADD_TO_ROLLUP, (account_id, period, key, deposits, withdrawals, *split))
+
+    # the rollups for one account, read out of the rollups table (one row per day, week & month, not per transaction)
+    def rollups(self, account_id):
+        rollups = Rollups()
+        with self.pool.connection() as conn:
+            for period, key, *bucket in conn.execute(ROLLUPS, (account_id,)):
+                rollups.buckets[period][key] = bucket
+        return rollups
+
+    # saves one transaction and changes the balance & jars to match, all in the same SQLite transaction. carry is the
+    # account's jar fractions after it (saved with it so the next deposit splits the same way after a restart)
+    def post(self, account_id, kind, cents, split, carry, when=None):
+        if kind == DEPOSIT:
+            change = cents
+        elif kind == WITHDRAW:
+            change = -cents
+        elif kind == ADJUST:
+            change = cents
+        else:
+            raise ValueError("unknown transaction kind: {!r}".format(kind))
+        when = time.time() if when is None else when
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute(ADD_TRANSACTION, (account_id, when, kind, cents, *split))
+                conn.execute(CHANGE_BALANCE, (change, *split, format_ratios(carry), account_id))
+                self.add_to_rollups(conn, account_id, when, change, split)
+
+    def set_goal(self, account_id, cents):
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute(SET_GOAL, (cents, account_id))
+
+    def set_ratios(self, account_id, ratios):
+        with self.pool.connection() as conn:
+            with conn:
+                conn.execute(SET_RATIOS, (format_ratios(ratios), format_ratios((0,) * len(ratios)), account_id))
+
+    # account names starting with prefix, in order (for finding an account without listing all of them)
+    def names(self, prefix="", limit=20):
+        with self.pool.connection() as conn:
+            rows = conn.execute(FIND_NAMES, (prefix, prefix + "\U0010ffff", limit)).fetchall()
+        return [row[0] for row in rows]
+
+    # one page of an account's transactions, newest first, as (id, time, kind, cents). pass the smallest id from
+    # the last page as before_id to get the page before it
+    def history(self, account_id, limit=50, before_id=None):
+        with self.pool.connection() as conn:
+            return conn.execute(HISTORY, (account_id, 2 ** 63 - 1 if before_id is None else before_id,
+                                          limit)).fetchall()
+
+    def count(self):
+        with self.pool.connection() as conn:
+            return conn.execute(COUNT_ACCOUNTS).fetchone()[0]
+
+    def close(self):
+        self.pool.close()
+
+
+# one child's account. It works the same way as a Journal (balance, goal, append, set_goal, checkpoint and close),
+# so a Ledger can save to either one
+class StoreAccount:
+    def __init__(self, store, account_id, name, balance, goal, give, save, spend, ratios, carry):
+        self.store = store
+        self.id = account_id
+        self.name = name
+        self.balance = balance  # in cents
+        self.goal = goal  # in cents
+        self.jars = Jars(parse_ratios(ratios), (give, save, spend), [int(part) for part in carry.split(",")])
+        self.replayed = 0  # nothing to replay, SQLite already has the balance
+        self.pending = 0  # every transaction is committed right away, so none are ever waiting to be saved
+        self.sync_listeners = []  # never called, for the same reason
+        self.lock = threading.Lock()
+
+    def append(self, kind, cents, split=None):
+        if kind == GOAL:
+            self.set_goal(cents)
+            return
+        if kind == RATIOS:
+            self.set_ratios(split)
+            return
+        with self.lock:
+            jars = self.jars.copy()  # only changed once it's committed
+            split = jar_split(jars, kind, cents, split)
+            self.store.post(self.id, kind, cents, split, jars.carry)
+            jars.apply(split)
+            self.jars = jars
+            if kind == WITHDRAW:
+                self.balance -= cents
+            else:
+                self.balance += cents
+
+    def deposit(self, cents):
+        self.append(DEPOSIT, cents)
+
+    def withdraw(self, cents, jar=SPEND):
+        self.append(WITHDRAW, cents, self.jars.withdraw_split(cents, jar))
+
+    def adjust(self, cents, split=None):
+        if cents != 0 or split is not None:
+            self.append(ADJUST, cents, split)
+
+    def set_goal(self, cents):
+        self.store.set_goal(self.id, cents)
+        self.goal = cents
+
+    def set_ratios(self, ratios):
+        self.store.set_ratios(self.id, ratios)
+        self.jars.set_ratios(ratios)
+
+    # the daily/weekly/monthly totals for this account (see rollups.py)
+    def rollups(self):
+        return self.store.rollups(self.id)
+
+    # every transaction is already committed, so there's nothing more to do for these
+    def sync(self):
+        pass
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,444 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Sends each piggy bank's transactions to a hub (a computer in the house running
+# python -m smartbank.sync --hub), so a household with several banks or a parent dashboard can see them all. The
+# bank keeps counters that only ever go up (how much went in & came out, in total and for each jar), so the hub can
+# merge them by just keeping the biggest number it has seen for each one: nothing conflicts, and getting the same
+# batch twice (or out of order) changes nothing. Transactions are sent in batches (a few seconds' worth, compressed)
+# over TCP, and the hub answers each batch with the last transaction it has. Anything it hasn't answered for is kept
+# in the journal (see Journal.keep_after) and sent again after the Wi-Fi comes back, from where the hub left off.
+# Each journal has an epoch (a random id saved in its snapshot), so a bank whose journal was started over sends a new
+# one and the hub starts it over too, instead of ignoring it until it gets back past its old numbers.
+#   python -m smartbank.sync --hub [--host 0.0.0.0] [--token TOKEN] [--state smart_bank_hub.json]   runs the hub
+#   python -m smartbank --sync HOST[:PORT] [--sync-token TOKEN] [--device NAME]   runs a bank that syncs with it
+#####################################################################################################################
+
+import argparse
+import hmac
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+
+from . import metrics
+from .jars import JARS
+from .journal import DEPOSIT, WITHDRAW, ADJUST, write_atomic
+from .ledger import format_cents
+
+SYNC_PORT = 9106
+SYNC_FILE = "smart_bank_sync.json"  # the bank's counters, epoch and what the hub has, saved with each snapshot
+HUB_FILE = "smart_bank_hub.json"  # everything the hub knows, saved every COMPACT_EVERY changes
+LOG_SUFFIX = ".log"  # the hub's changes since then are added to a file with this on the end of HUB_FILE's name
+
+BATCH_SIZE = 50  # a batch is sent as soon as this many transactions are waiting
+BATCH_WAIT = 5.0  # or once the oldest one has waited this many seconds
+MAX_BATCH = 500  # most transactions in one message (so a long time offline doesn't make one huge message)
+RETRY_MIN = 1.0  # seconds before trying the hub again after the link drops, doubled each time it fails
+RETRY_MAX = 60.0
+TIMEOUT = 10.0  # seconds to wait for the hub to answer
+MAX_MESSAGE = 1 << 24  # bigger than any real message, anything bigger is a broken connection
+HISTORY = 1000  # transactions the hub keeps for each bank (the counters are what the totals come from)
+COMPACT_EVERY = 1000  # changes added to the hub's log before it's all saved in HUB_FILE and the log emptied
+
+# the counters: for the total and then each jar, how much went in and how much came out (so 2 per amount)
+FIELDS = ("total",) + JARS
+COUNTERS = 2 * len(FIELDS)
+
+SENT = metrics.counter("smartbank_sync_transactions_total", "Transactions sent to the hub")
+SENT_BYTES = metrics.counter("smartbank_sync_bytes_total", "Bytes sent to the hub")
+FAILURES = metrics.counter("smartbank_sync_failures_total", "Times the link to the hub dropped or couldn't connect")
+BATCH_TIME = metrics.histogram("smartbank_sync_batch_seconds", "Time to send a batch and get the hub's answer")
+
+
+# adds one transaction (its signed change and jar changes) to the counters
+def count(counters, change, split):
+    for field, amount in enumerate((change,) + tuple(split)):
+        if amount >= 0:
+            counters[2 * field] += amount
+        else:
+            counters[2 * field + 1] -= amount
+
+
+# merges two sets of counters from the same bank. They only go up, so the bigger one of each is the newest
+def merge(counters, other):
+    return [max(mine, theirs) for mine, theirs in zip(counters, other)]
+
+
+# the balance of the total and each jar from a set of counters
+def balances(counters):
+    return [counters[2 * field] - counters[2 * field + 1] for field in range(len(FIELDS))]
+
+
+# one message is its length (4 bytes) then zlib-compressed JSON. Returns how many bytes were sent
+def send_message(sock, message):
+    data = zlib.compress(json.dumps(message, separators=(",", ":")).encode())
+    sock.sendall(struct.pack(">I", len(data)) + data)
+    return len(data) + 4
+
+
+def recv_message(sock):
+    size, = struct.unpack(">I", recv_exactly(sock, 4))
+    if size > MAX_MESSAGE:
+        raise ValueError("message too big: {} bytes".format(size))
+    return json.loads(zlib.decompress(recv_exactly(sock, size)))
+
+
+def recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("the connection was closed")
+        data += chunk
+    return bytes(data)
+
+
+# the bank's side. It listens to the journal for new records, keeps the counters, and sends batches to the hub from
+# its own thread, so a slow or missing hub never holds up a coin
+class SyncClient:
+    def __init__(self, journal, host, port=SYNC_PORT, device=None, path=SYNC_FILE, batch_size=BATCH_SIZE,
+                 batch_wait=BATCH_WAIT, clock=time.monotonic, token=None):
+        self.journal = journal
+        self.host = host
+        self.port = port
+        self.device = device
+        self.token = token  # sent to the hub when connecting, if it was started with --token
+        self.epoch = journal.epoch  # sent to the hub when connecting, a new journal has a new one
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.clock = clock
+        self.counters = [0] * COUNTERS
+        self.seq = 0  # the journal record the counters are up to
+        self.acked = 0  # the last record the hub said it has
+        self.pending = []  # (seq, signed change, jar changes) of each transaction the hub doesn't have yet
+        self.waiting_since = None  # when the oldest pending transaction was added
+        self.sent_bytes = 0
+        self.connected = False
+        self.error = None  # why the last try to reach the hub failed (for --debug)
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.load()
+        journal.keep_after = self.acked
+        journal.record_listeners.append(self.recorded)
+        journal.checkpoint_listeners.append(self.save)
+
+    # reads the saved counters and catches up on the journal records written after them. The first time (or if
+    # they were saved for a journal that has since been started over, with another epoch), the counters start from
+    # the balance the journal already has (there are no transactions to send for it)
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            saved = data["device"], data["seq"], data["acked"], data["counters"]
+            epoch = data.get("epoch", self.epoch)  # saved before there were epochs, so for this journal
+        except (OSError, ValueError, KeyError):
+            saved = None
+        if saved is None or epoch != self.epoch:
+            self.device = self.device or (socket.gethostname() if saved is None else saved[0])
+            self.seq = self.acked = self.journal.seq
+            count(self.counters, self.journal.balance, self.journal.jars.balances)
+            return
+        device, self.seq, self.acked, self.counters = saved
+        self.device = self.device or device
+        for seq, kind, cents, split in self.journal.records(min(self.seq, self.acked)):
+            if kind in (DEPOSIT, WITHDRAW, ADJUST) and split is not None:
+                change = -cents if kind == WITHDRAW else cents
+                if seq > self.seq:
+                    count(self.counters, change, split)
+                if seq > self.acked:
+                    self.pending.append((seq, change, split))
+            self.seq = max(self.seq, seq)
+        if self.pending:
+            self.waiting_since = self.clock()
+
+    # saves the counters as of journal record seq (called by the journal when it takes a snapshot)
+    def save(self, seq):
+        with self.cond:
+            data = {"device": self.device, "epoch": self.epoch, "seq": self.seq, "acked": self.acked,
+                    "counters": list(self.counters)}
+        write_atomic(self.path, json.dumps(data))
+
+    # called by the journal after each record is written
+    def recorded(self, seq, kind, cents, split):
+        with self.cond:
+            self.seq = seq
+            if kind not in (DEPOSIT, WITHDRAW, ADJUST):
+                return
+            change = -cents if kind == WITHDRAW else cents
+            count(self.counters, change, split)
+            self.pending.append((seq, change, split))
+            if self.waiting_since is None:
+                self.waiting_since = self.clock()
+            if len(self.pending) >= self.batch_size:
+                self.cond.notify()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="sync", daemon=True)
+        self.thread.start()
+
+    # connects (again and again if it has to) and sends batches until it's stopped
+    def run(self):
+        delay = RETRY_MIN
+        while True:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=TIMEOUT) as sock:
+                    with self.cond:
+                        hello = {"device": self.device, "epoch": self.epoch, "counters": list(self.counters)}
+                    if self.token is not None:
+                        hello["token"] = self.token
+                    self.exchange(sock, hello)  # the hub answers with where it's up to, so it resumes from there
+                    self.connected = True
+                    self.error = None
+                    delay = RETRY_MIN
+                    while True:
+                        batch = self.next_batch()
+                        if batch is None:
+                            return
+                        self.exchange(sock, batch)
+            except (OSError, ValueError) as error:
+                FAILURES.add()
+                self.error = error
+            finally:
+                self.connected = False
+            with self.cond:
+                if not self.running:
+                    return  # stopped while the hub couldn't be reached, what's left is sent next time
+                self.cond.wait(delay)
+            delay = min(delay * 2, RETRY_MAX)
+
+    # waits until a batch is ready (full, waited long enough, or the bank is closing) and returns its message, or
+    # None once the bank is closing and everything has been sent
+    def next_batch(self):
+        with self.cond:
+            while True:
+                if self.pending:
+                    waited = self.clock() - self.waiting_since
+                    if not self.running or len(self.pending) >= self.batch_size or waited >= self.batch_wait:
+                        break
+                    self.cond.wait(self.batch_wait - waited)
+                elif not self.running:
+                    return None
+                else:
+                    self.cond.wait()
+            # seqs are sent as the step from the one before (mostly 1s, which compress to almost nothing)
+            deltas = []
+            previous = self.acked
+            for seq, change, split in self.pending[:MAX_BATCH]:
+                deltas.append([seq - previous, change] + list(split))
+                previous = seq
+            return {"device": self.device, "base": self.acked, "deltas": deltas, "counters": list(self.counters)}
+
+    # sends one message and handles the hub's answer (the last transaction it has). Raises ValueError if the hub
+    # turned it down (the token was wrong)
+    def exchange(self, sock, message):
+        begin = metrics.now()
+        sent = send_message(sock, message)
+        answer = recv_message(sock)
+        if "error" in answer:
+            raise ValueError("the hub said: {}".format(answer["error"]))
+        acked = answer["acked"]
+        BATCH_TIME.since(begin)
+        SENT_BYTES.add(sent)
+        with self.cond:
+            self.sent_bytes += sent
+            done = 0
+            while done < len(self.pending) and self.pending[done][0] <= acked:
+                done += 1
+            del self.pending[:done]
+            SENT.add(done)
+            self.acked = max(self.acked, acked)
+            self.journal.keep_after = self.acked
+            self.waiting_since = self.clock() if self.pending else None
+
+    # sends whatever is left (if the hub can be reached within TIMEOUT) and stops
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(TIMEOUT)
+            self.thread = None
+
+
+# the hub. It keeps the counters and the latest transactions of every bank that has synced with it. Each change is
+# added to the end of a log (one line of JSON, forced to disk before the bank is answered), and every COMPACT_EVERY
+# changes (and when it starts & stops) everything is saved in one file and the log emptied, like the bank's journal.
+# token, if given, has to be sent by each bank when it connects (--sync-token)
+class SyncHub:
+    def __init__(self, path=HUB_FILE, port=SYNC_PORT, host="127.0.0.1", on_change=None, token=None):
+        self.path = path
+        self.log_path = path + LOG_SUFFIX
+        self.token = token
+        self.on_change = on_change  # called with the device name after each batch (the CLI prints the totals)
+        self.devices = {}  # device -> {"epoch", "seq", "counters", "history"}
+        self.connections = set()  # the banks connected right now (closed when the hub stops)
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.devices = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.replay()
+        self.log = None
+        self.logged = 0  # changes in the log since it was last emptied
+        self.compact()
+        hub = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with hub.lock:
+                    hub.connections.add(self.request)
+                try:
+                    hello = recv_message(self.request)
+                    if not hub.allowed(hello):
+                        send_message(self.request, {"error": "wrong token"})
+                        return
+                    message = hello
+                    while True:  # the epoch is only sent with the hello, it's the same for the whole connection
+                        acked = hub.receive(message, hello.get("epoch"))
+                        send_message(self.request, {"acked": acked})
+                        message = recv_message(self.request)
+                except (OSError, ValueError, KeyError):
+                    pass  # the bank went away, it'll come back and carry on from its last answer
+                finally:
+                    with hub.lock:
+                        hub.connections.discard(self.request)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]  # the real port if 0 was asked for
+        self.thread = threading.Thread(target=self.server.serve_forever, name="sync-hub", daemon=True)
+        self.thread.start()
+
+    # whether a bank's hello has the token the hub was started with (if it was)
+    def allowed(self, hello):
+        if self.token is None:
+            return True
+        return hmac.compare_digest(str(hello.get("token", "")).encode(), self.token.encode())
+
+    # merges one message from a bank (a hello has no deltas) and returns the last transaction the hub has from it.
+    # epoch is the one the bank sent when it connected. A different one from what the hub has means the bank started
+    # counting over, so its counters & seqs start over here too (the transactions already in its history are kept)
+    def receive(self, message, epoch=None):
+        device = message["device"]
+        with self.lock:
+            state = self.devices.get(device)
+            restarted = state is None or state.get("epoch") != epoch
+            if restarted:
+                state = self.devices[device] = {"epoch": epoch, "seq": 0, "counters": [0] * COUNTERS,
+                                                "history": [] if state is None else state["history"]}
+            counters = merge(state["counters"], message["counters"])
+            added = []
+            seq = message.get("base", 0)
+            for delta in message.get("deltas", ()):
+                seq += delta[0]
+                if seq > state["seq"]:  # anything the hub already has is skipped
+                    added.append([seq] + delta[1:])
+                    state["seq"] = seq
+            if restarted or added or counters != state["counters"]:
+                state["counters"] = counters
+                state["history"].extend(added)
+                del state["history"][:-HISTORY]
+                self.write_log(device, state, added)
+            acked = state["seq"]
+        if self.on_change is not None and "deltas" in message:
+            self.on_change(device)
+        return acked
+
+    # adds one bank's change to the end of the log and forces it to disk, so the bank is only answered once the
+    # hub has it saved. Everything is saved (and the log emptied) once the log has COMPACT_EVERY changes in it
+    def write_log(self, device, state, added):
+        self.log.write(json.dumps({"device": device, "epoch": state["epoch"], "seq": state["seq"],
+                                   "counters": state["counters"], "added": added}, separators=(",", ":")) + "\n")
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.logged += 1
+        if self.logged >= COMPACT_EVERY:
+            self.compact()
+
+    # applies the changes in the log to what was read from the state file (the hub stopped without saving them).
+    # A half-written last line (the power went out) is left off
+    def replay(self):
+        try:
+            f = open(self.log_path, "r")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break
+                state = self.devices.setdefault(change["device"], {"history": []})
+                state.update(epoch=change["epoch"], seq=change["seq"], counters=change["counters"])
+                state["history"].extend(change["added"])
+                del state["history"][:-HISTORY]
+
+    # saves everything the hub knows in one file and empties the log
+    def compact(self):
+        write_atomic(self.path, json.dumps(self.devices, separators=(",", ":")))
+        if self.log is not None:
+            self.log.close()
+        self.log = open(self.log_path, "w")
+        self.logged = 0
+
+    # the balance of each bank (total then each jar) and of the whole household
+    def totals(self):
+        with self.lock:
+            each = {device: balances(state["counters"]) for device, state in self.devices.items()}
+        household = [sum(amounts) for amounts in zip(*each.values())] or [0] * len(FIELDS)
+        return each, household
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self.compact()
+            self.log.close()
+
+
+# "host" or "host:port" from the command line
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    if not host:
+        return text, SYNC_PORT
+    return host, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smartbank.sync", description="Smart Piggy Bank sync hub")
+    parser.add_argument("--hub", action="store_true", required=True, help="run the hub the banks sync with")
+    parser.add_argument("--port", type=int, default=SYNC_PORT)
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="the address to listen on (default: %(default)s, use 0.0.0.0 for the whole network)")
+    parser.add_argument("--token", help="the token every bank has to send (python -m smartbank --sync-token TOKEN)")
+    parser.add_argument("--state", default=HUB_FILE, metavar="FILE", help="where the hub saves what it knows")
+    args = parser.parse_args(argv)
+
+    def show(device):
+        each, household = hub.totals()
+        print("{}: {}  (household: {})".format(device, format_cents(each[device][0]), format_cents(household[0])))
+
+    hub = SyncHub(args.state, args.port, args.host, on_change=show, token=args.token)
+    print("hub listening on port {}".format(hub.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        hub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Records what the coin pins really did on a piggy bank and plays it back through the same input code
+# on a laptop. Bugs in the coin input (switch bounce, two coins pressed at once, a burst of coins) often only happen
+# on the physical bank, so the recorder saves every pin transition with its time in a small binary file (7 bytes
+# each), along with every coin the bank counted from them. Replaying a trace runs those transitions through
+# CoinInput or PulseInput as fast as they can go (a trace's own timestamps are used as the clock, so an hour of
+# coins takes a second or two) and checks the coins counted match the ones the bank counted. Made-up soak traces with
+# millions of presses (bounce included) are checked against the coins they were made from, with no hardware needed:
+#   python -m smartbank --record-trace coins.trace ...   records while the bank runs
+#   python -m smartbank.trace replay coins.trace         replays it and checks the coins match
+#   python -m smartbank.trace soak --presses 1000000     makes a soak trace, replays it and checks it (exits 1 if not)
+#####################################################################################################################
+
+import argparse
+import queue
+import random
+import struct
+import threading
+import time
+from collections import Counter
+
+from .coin_input import COIN_PINS, DEBOUNCE_MS, CoinInput, FakeGPIO
+from .pulse import ACCEPTOR_PIN, DENOMINATIONS, GAP_MS, PulseInput
+
+MAGIC = b"SPBT"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBd")  # magic, version, 1 if it's an acceptor, the acceptor pin, when it started (epoch)
+RECORD = struct.Struct("<IBH")  # microseconds since the record before it, pin (or COIN/GAP), level (or cents)
+COIN = 255  # a record for a coin the bank counted (the value is its cents)
+GAP = 254  # a record that's only there to move the time on (for gaps longer than a record can hold)
+MAX_DELTA = 0xFFFFFFFF  # about 71 minutes in microseconds
+CHUNK = RECORD.size * 8192  # records read from a trace at a time
+DRAIN_EVERY = 10000  # replayed transitions between taking the coins out of the queue (so a soak doesn't fill memory)
+BOUNCE_MS = 0.3  # how far apart the made-up bounces are
+
+
+# writes a trace file. Every record goes through one lock, since the GPIO thread and the acceptor's burst-ending
+# thread can both be adding to it
+class TraceWriter:
+    def __init__(self, path, acceptor_pin=None, clock=time.monotonic):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, acceptor_pin is not None, acceptor_pin or 0, time.time()))
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.last = None  # the time of the last record (in microseconds)
+        self.records = 0
+
+    def write(self, pin, value, when=None):
+        now = round((self.clock() if when is None else when) * 1e6)
+        with self.lock:
+            delta = 0 if self.last is None else max(now - self.last, 0)
+            self.last = now
+            while delta > MAX_DELTA:
+                self.file.write(RECORD.pack(MAX_DELTA, GAP, 0))
+                delta -= MAX_DELTA
+            self.file.write(RECORD.pack(delta, pin, value))
+            self.records += 1
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+# the GPIO module with a recorder in front of it. Every pin with edge detection is watched for both edges (what the
+# input code asked for is still only passed on for the edges it wanted), and the level is read in the callback to
+# know which one it was. Stops recording when the GPIO is cleaned up (CoinInput.stop() does that)
+class RecordingGPIO:
+    def __init__(self, gpio, writer):
+        self.gpio = gpio
+        self.writer = writer
+
+    def __getattr__(self, name):  # everything else (setup, input, the constants...) is the real GPIO's
+        return getattr(self.gpio, name)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        def seen(pin):
+            level = self.gpio.input(pin)
+            self.writer.write(pin, level)
+            if callback is not None and wanted(self.gpio, edge, level):
+                callback(pin)
+
+        self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=seen)
+
+    def cleanup(self, pin=None):
+        self.gpio.cleanup() if pin is None else self.gpio.cleanup(pin)
+        if pin is None:
+            self.writer.close()
+
+
+# whether an edge to level is one that detection on edge would have called back for
+def wanted(gpio, edge, level):
+    return edge == gpio.BOTH or (edge == gpio.RISING) == (level == 1)
+
+
+# the coin queue with a recorder in front of it, so the trace also has every coin the bank counted
+class RecordingQueue(queue.Queue):
+    def __init__(self, writer):
+        queue.Queue.__init__(self)
+        self.writer = writer
+
+    def put(self, item, block=True, timeout=None):
+        if not self.writer.file.closed:
+            self.writer.write(COIN, item.value)
+        queue.Queue.put(self, item, block, timeout)
+
+
+# starts recording coins (a CoinInput or PulseInput that hasn't been started yet) to a trace file
+def record(coins, path):
+    writer = TraceWriter(path, coins.pin if isinstance(coins, PulseInput) else None)
+    coins.gpio = RecordingGPIO(coins.gpio, writer)
+    coins.events = RecordingQueue(writer)
+    return writer
+
+
+# what a trace was recorded from: (True if it's an acceptor, the acceptor pin, when it started)
+def read_header(f):
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError("not a coin trace (too short)")
+    magic, version, acceptor, pin, started = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("not a coin trace")
+    if version != VERSION:
+        raise ValueError("coin trace version {} isn't supported".format(version))
+    return bool(acceptor), pin, started
+
+
+# every record in a trace after the header as (seconds since the first, pin or COIN, level or cents), a chunk at a
+# time. A half-written last record (the power went out) is left off
+def read_records(f):
+    now = 0
+    while True:
+        data = f.read(CHUNK)
+        usable = len(data) - len(data) % RECORD.size
+        for delta, pin, value in RECORD.iter_unpack(data[:usable]):
+            now += delta
+            if pin != GAP:
+                yield now / 1e6, pin, value
+        if len(data) < CHUNK:
+            return
+
+
+# a clock that's whatever time the trace is up to
+class TraceClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# FakeGPIO that calls back for every replayed edge, even if the level didn't change (a real pin can bounce faster
+# than its level is read, and the recording has what the callback saw)
+class ReplayGPIO(FakeGPIO):
+    def set_level(self, pin, level):
+        self.levels[pin] = level
+        if pin in self.callbacks:
+            edge, callback = self.callbacks[pin]
+            if callback is not None and wanted(self, edge, level):
+                callback(pin)
+
+
+# what a replay counted: coins, total cents, and how many of each value
+class Tally:
+    def __init__(self):
+        self.coins = 0
+        self.total = 0
+        self.values = Counter()
+
+    def add(self, cents):
+        self.coins += 1
+        self.total += cents
+        self.values[cents] += 1
+
+    def __eq__(self, other):
+        return self.values == other.values
+
+    def __str__(self):
+        return "{} coins, {} cents".format(self.coins, self.total)
+
+
+# runs pin transitions (time, pin, level) through a fresh CoinInput, or a PulseInput on acceptor_pin, with the
+# transitions' times as its clock. Returns the Tally of what was counted and how many transitions there were
+def replay(transitions, acceptor_pin=None, debounce_ms=DEBOUNCE_MS, gap_ms=GAP_MS):
+    clock = TraceClock()
+    gpio = ReplayGPIO()
+    if acceptor_pin is None:
+        coins = CoinInput(gpio, debounce_ms=debounce_ms, clock=clock)
+    else:
+        coins = PulseInput(gpio, acceptor_pin, gap_ms=gap_ms, clock=clock, timer=False)
+    coins.start()
+    tally = Tally()
+    count = 0
+    for when, pin, level in transitions:
+        clock.now = when
+        gpio.set_level(pin, level)
+        count += 1
+        if count % DRAIN_EVERY == 0:
+            for coin in coins.drain():
+                tally.add(coin.value)
+    coins.stop()  # ends a burst that was still being counted
+    for coin in coins.drain():
+        tally.add(coin.value)
+    return tally, count
+
+
+# replays a recorded trace. Returns (what the replay counted, what the bank counted, transitions replayed)
+def replay_file(path, debounce_ms=DEBOUNCE_MS, gap_ms=GAP_MS):
+    recorded = Tally()
+
+    def transitions(f):
+        for when, pin, value in read_records(f):
+            if pin == COIN:
+                recorded.add(value)
+            else:
+                yield when, pin, value
+
+    with open(path, "rb") as f:
+        acceptor, pin, started = read_header(f)
+        tally, count = replay(transitions(f), pin if acceptor else None, debounce_ms, gap_ms)
+    return tally, recorded, count
+
+
+# made-up coin button presses for these coin values (in cents): each press goes up, bounces bounces times, and comes
+# back down press_ms later, with gap_ms between presses. overlap is the chance a press happens at the same moment as
+# the one before it (on another coin's pin, like two coins dropped in at once)
+def synthetic_presses(values, press_ms=40.0, gap_ms=DEBOUNCE_MS + 10.0, bounces=0, overlap=0.0, seed=None):
+    pin_for = {value: pin for pin, (name, value) in COIN_PINS.items()}
+    rand = random.Random(seed)
+    now = 0.0
+    last_pin = None
+    waiting = []  # the last press's transitions, kept until it's known if the next press overlaps it
+    for value in values:
+        pin = pin_for[value]
+        overlapped = last_pin is not None and pin != last_pin and rand.random() < overlap
+        if overlapped:
+            now -= (press_ms + gap_ms) / 1000  # back to when the last press started
+        events = [(now, pin, 1)]
+        for bounce in range(bounces):  # the contacts chatter right after touching (well inside the debounce time)
+            events.append((now + (2 * bounce + 1) * BOUNCE_MS / 1000, pin, 0))
+            events.append((now + (2 * bounce + 2) * BOUNCE_MS / 1000, pin, 1))
+        events.append((now + press_ms / 1000, pin, 0))
+        if overlapped:
+            waiting = sorted(waiting + events)
+            last_pin = None  # never three at once, so the times only ever go forward
+        else:
+            yield from waiting
+            waiting = events
+            last_pin = pin
+        now += (press_ms + gap_ms) / 1000
+    yield from waiting
+
+
+# made-up coin acceptor pulses for these coin values (each pulse pulls the pin low for half of pulse_ms), gap_ms
+# between coins. The same timing as pulse.synthetic_trace, made one coin at a time so millions don't fill memory
+def synthetic_pulses(values, pin=ACCEPTOR_PIN, pulse_ms=1.0, gap_ms=GAP_MS * 2):
+    pulses_for = {value: count for count, (name, value) in DENOMINATIONS.items()}
+    now = 0.0
+    for value in values:
+        for _ in range(pulses_for[value]):
+            yield now, pin, 0
+            yield now + pulse_ms / 2000, pin, 1
+            now += pulse_ms / 1000
+        now += gap_ms / 1000 - pulse_ms / 1000
+
+
+# random coin values (the same as the buttons or acceptor take), lazily
+def random_values(count, seed=None):
+    rand = random.Random(seed)
+    choices = sorted(value for name, value in COIN_PINS.values())
+    for _ in range(count):
+        yield rand.choice(choices)
+
+
+# saves made-up transitions as a trace file (with the coins they were made from), to replay later or elsewhere
+def write_synthetic(path, values, transitions, acceptor_pin=None):
+    writer = TraceWriter(path, acceptor_pin)
+    for when, pin, level in transitions:
+        writer.write(pin, level, when)
+    end = 0.0 if writer.last is None else writer.last / 1e6
+    for value in values:
+        writer.write(COIN, value, end)
+    writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smartbank.trace", description="replay & soak coin input traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replaying = commands.add_parser("replay", help="replay a recorded trace and check the coins match")
+    replaying.add_argument("trace")
+    soak = commands.add_parser("soak", help="replay made-up presses and check every coin is counted")
+    soak.add_argument("--presses", type=int, default=100000, help="coins to make (default: %(default)s)")
+    soak.add_argument("--acceptor", action="store_true", help="coin acceptor pulses instead of the coin buttons")
+    soak.add_argument("--bounces", type=int, default=3, help="bounces after each button press (default: 3)")
+    soak.add_argument("--overlap", type=float, default=0.05, help="chance two buttons are pressed at once")
+    soak.add_argument("--seed", type=int, default=1)
+    soak.add_argument("--save", metavar="FILE", help="also save the made-up trace")
+    for command in (replaying, soak):
+        command.add_argument("--debounce-ms", type=float, default=DEBOUNCE_MS)
+        command.add_argument("--gap-ms", type=float, default=GAP_MS)
+    args = parser.parse_args(argv)
+
+    begin = time.perf_counter()
+    if args.command == "replay":
+        try:
+            tally, expected, count = replay_file(args.trace, args.debounce_ms, args.gap_ms)
+        except (OSError, ValueError) as error:
+            raise SystemExit("Can't replay {}: {}".format(args.trace, error))
+    else:
+        values = list(random_values(args.presses, args.seed))
+        expected = Tally()
+        for value in values:
+            expected.add(value)
+        pin = ACCEPTOR_PIN if args.acceptor else None
+        if args.acceptor:
+            transitions = synthetic_pulses(values, gap_ms=args.gap_ms * 2)
+        else:
+            transitions = synthetic_presses(values, bounces=args.bounces, overlap=args.overlap, seed=args.seed)
+        if args.save:
+            write_synthetic(args.save, values, transitions, pin)
+            tally, expected, count = replay_file(args.save, args.debounce_ms, args.gap_ms)
+        else:
+            tally, count = replay(transitions, pin, args.debounce_ms, args.gap_ms)
+    took = time.perf_counter() - begin
+    print("{} transitions replayed in {:.2f} s ({:.0f} per second)".format(count, took, count / took if took else 0))
+    print("counted:  {}".format(tally))
+    print("expected: {}".format(expected))
+    if tally != expected:
+        for value in sorted(set(tally.values) | set(expected.values)):
+            if tally.values[value] != expected.values[value]:
+                print("  {} cent coins: {} counted, {} expected".format(value, tally.values[value],
+                                                                       expected.values[value]))
+        raise SystemExit(1)
+    print("match")
+
+
+if __name__ == "__main__":
+    main()
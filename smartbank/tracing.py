@@ -0,0 +1,260 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Records what the piggy bank does (coins, deposits, withdrawals, clearing, goal changes, saves...) as
+# small typed events in a ring that's made once when the program starts (41 bytes per event, no text), so it can
+# stay on in the field: each event is one struct.pack_into(), and nothing is printed or saved unless it's asked for.
+# The newest events are written to a small binary file (smart_bank_events.bin) when something goes wrong, or when the
+# program gets SIGUSR1 (kill -USR1 <pid>), and SIGUSR2 switches the debug events on & off without a restart.
+#   python -m smartbank.tracing smart_bank_events.bin    prints a saved file as text
+# --debug prints each event as it's recorded, like the old DEBUG prints did.
+#####################################################################################################################
+
+import itertools
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+
+from . import journal
+
+CAPACITY = 16384  # events kept (the oldest are written over)
+EVENTS_FILE = "smart_bank_events.bin"
+
+# levels, like the logging module's
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+
+# the kinds of event. Each one has up to 3 numbers (a, b & c), what they are is in KINDS
+COIN = 1
+DEPOSIT = 2
+WITHDRAW = 3
+ADJUST = 4
+CLEAR = 5
+UNDO = 6
+REDO = 7
+GOAL = 8
+RATIOS = 9
+SAVE = 10
+ACCOUNT = 11
+APPROVAL = 12
+RULE = 13
+PAYOUT = 14
+WINDOW = 15
+BAD_ENTRY = 16
+ERROR_EVENT = 17
+OPEN = 18
+PARENT_API = 19
+SYNC = 20
+LCD = 21
+WAITING = 22
+UNSAVED = 23
+
+# kind -> (name, level, how it's printed)
+KINDS = {
+    COIN: ("coin", DEBUG, "{a} cents from pin {b}, on screen after {c} us"),
+    DEPOSIT: ("deposit", INFO, "+{a} cents, balance {b} (transaction {c})"),
+    WITHDRAW: ("withdraw", INFO, "{a} cents, balance {b} (transaction {c})"),
+    ADJUST: ("adjust", INFO, "{a} cents, balance {b} (transaction {c})"),
+    CLEAR: ("clear", INFO, "balance back to {b} from {a}"),
+    UNDO: ("undo", INFO, "transaction {c} taken back, balance {b}"),
+    REDO: ("redo", INFO, "transaction {c} done again, balance {b}"),
+    GOAL: ("goal", INFO, "new goal {a} cents"),
+    RATIOS: ("ratios", INFO, "give {a}% save {b}% spend {c}%"),
+    SAVE: ("save", INFO, "balance {a} & goal {b} saved"),
+    ACCOUNT: ("account", INFO, "switched account, balance {a}"),
+    APPROVAL: ("approval", INFO, "withdrawal {a} of {b} cents {c}"),
+    RULE: ("rule", INFO, "rule at {a} cents reached with {b} (transaction {c})"),
+    PAYOUT: ("payout", INFO, "allowance {a} & interest {b} cents for {c} period(s)"),
+    WINDOW: ("window", DEBUG, "{a} window opened"),
+    BAD_ENTRY: ("bad entry", WARNING, "the {a} window's box wasn't a number"),
+    ERROR_EVENT: ("error", ERROR, "unhandled error on thread {a}"),
+    OPEN: ("open", INFO, "{a} journal records replayed, total {b} cents, goal {c} cents"),
+    PARENT_API: ("parent api", INFO, "listening on port {a}"),
+    SYNC: ("sync", INFO, "{a} transactions not on the hub yet, {b} bytes sent"),
+    LCD: ("lcd", DEBUG, "{a} of {b} writes saved"),
+    WAITING: ("waiting", WARNING, "no bank to send coins to yet (python -m smartbank --shared bank)"),
+    UNSAVED: ("unsaved", ERROR, "{a} coins ({b} cents) weren't saved by the bank before the coin process stopped"),
+}
+NAMES = {name: kind for kind, (name, level, text) in KINDS.items()}
+
+# the numbers some events use instead of text
+WINDOWS = ("budget", "dollar", "goal", "percentage", "account")
+BUDGET_WINDOW, DOLLAR_WINDOW, GOAL_WINDOW, RATIOS_WINDOW, ACCOUNT_WINDOW = range(len(WINDOWS))
+DECISIONS = ("asked for", "approved", "denied", "dropped (another account is open)")
+ASKED, APPROVED, DENIED, DROPPED = range(len(DECISIONS))
+
+MAGIC = b"SPEV"
+VERSION = 1
+HEADER = struct.Struct("<4sBIdH")  # magic, version, events, wall clock - monotonic (s), reason length (then reason)
+RECORD = struct.Struct("<QqBqqq")  # seq, time (monotonic ns), kind, a, b, c (the same in the ring and the file)
+
+
+# the ring of events and what's recorded in it. There's one (TRACER) for the whole program
+class Tracer:
+    def __init__(self, capacity=CAPACITY, level=INFO):
+        self.capacity = capacity
+        self.ring = bytearray(RECORD.size * capacity)  # made once, every slot starts empty (seq 0)
+        self.counter = itertools.count(1)  # next() on it is atomic, so threads never get the same slot
+        self.wanted = [False] * (max(KINDS) + 1)  # by kind, so a skipped event is one list lookup
+        self.every = [1] * (max(KINDS) + 1)  # record 1 in every n of each kind (sampling)
+        self.seen = [0] * (max(KINDS) + 1)
+        self.echo = False  # print each event as it's recorded (--debug)
+        self.path = EVENTS_FILE
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = level
+        self.wanted = [kind in KINDS and KINDS[kind][1] >= level for kind in range(len(self.wanted))]
+
+    # records only 1 in every n events of one kind (1 records them all)
+    def sample(self, kind, every):
+        self.seen[kind] = 0
+        self.every[kind] = max(1, every)
+
+    def event(self, kind, a=0, b=0, c=0):
+        if not self.wanted[kind]:
+            return
+        if self.every[kind] > 1:
+            self.seen[kind] += 1
+            if self.seen[kind] % self.every[kind]:
+                return
+        seq = next(self.counter)
+        try:  # one C call, about half the time of setting 6 numbers one at a time
+            RECORD.pack_into(self.ring, (seq % self.capacity) * RECORD.size, seq, time.monotonic_ns(), kind, a, b, c)
+        except struct.error:  # a number too big for the ring isn't worth breaking a deposit over
+            return
+        if self.echo:
+            print(format_event(kind, a, b, c))
+
+    # the events still in the ring as (seq, time, kind, a, b, c), oldest first
+    def events(self):
+        ring = bytes(self.ring)  # a copy, so threads can keep recording while it's read
+        return sorted(record for record in RECORD.iter_unpack(ring) if record[0] != 0)
+
+    # writes the events to a binary file (written whole to a temporary file first, so it's never half written).
+    # reason is why (the error, or the signal)
+    def dump(self, reason="", path=None):
+        path = self.path if path is None else path
+        events = self.events()
+        reason = reason.encode("utf-8", "replace")[:65535]
+        data = [HEADER.pack(MAGIC, VERSION, len(events), time.time() - time.monotonic(), len(reason)), reason]
+        data.extend(RECORD.pack(*record) for record in events)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(b"".join(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        return path
+
+
+TRACER = Tracer()
+event = TRACER.event  # what the rest of the program calls: tracing.event(tracing.CLEAR, before, after)
+
+
+# ledger listener (added by the Bank): one event for every transaction, from the GUI and headless mode alike
+def changed(ledger, index):
+    if index is not None:
+        kind, change, balance, when = ledger.entry(index)
+        event(DEPOSIT if kind == journal.DEPOSIT else WITHDRAW if kind == journal.WITHDRAW else ADJUST, change, balance,
+              index)
+
+
+def format_event(kind, a, b, c):
+    name, level, text = KINDS.get(kind, ("kind {}".format(kind), 0, "{a} {b} {c}"))
+    if kind == WINDOW or kind == BAD_ENTRY:
+        a = WINDOWS[a] if 0 <= a < len(WINDOWS) else a
+    elif kind == APPROVAL:
+        c = DECISIONS[c] if 0 <= c < len(DECISIONS) else c
+    elif kind == ERROR_EVENT:
+        a = "main" if a == 0 else a
+    return "{}: {}".format(name, text.format(a=a, b=b, c=c))
+
+
+# sets the level, sampling & file from the command line, and dumps the ring on errors & signals. sample is a list of
+# "KIND=N" (like coin=10). Raises ValueError for an unknown level or kind
+def configure(level="info", sample=(), path=EVENTS_FILE, echo=False):
+    if level not in LEVELS:
+        raise ValueError("unknown trace level {!r}".format(level))
+    TRACER.set_level(DEBUG if echo else LEVELS[level])
+    TRACER.echo = echo
+    TRACER.path = path
+    for setting in sample:
+        name, _, every = setting.partition("=")
+        if name not in NAMES or not every.isdigit():
+            raise ValueError("not KIND=N with a known kind: {!r}".format(setting))
+        TRACER.sample(NAMES[name], int(every))
+    install()
+
+
+# dumps the ring when an error isn't caught (on any thread) and on SIGUSR1, and switches debug on & off on SIGUSR2
+def install():
+    old_hook = sys.excepthook
+    old_thread_hook = threading.excepthook
+
+    def excepthook(kind, error, traceback):
+        failed(error, 0)
+        old_hook(kind, error, traceback)
+
+    def thread_excepthook(args):
+        if args.exc_type is not SystemExit:
+            failed(args.exc_value, args.thread.ident if args.thread is not None else -1)
+        old_thread_hook(args)
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda number, frame: TRACER.dump("SIGUSR1"))
+        signal.signal(signal.SIGUSR2, lambda number, frame: toggle_debug())
+
+
+def toggle_debug():
+    TRACER.set_level(INFO if TRACER.level == DEBUG else DEBUG)
+
+
+# records an error that wasn't caught and saves the ring with it (also used for errors in the GUI's callbacks)
+def failed(error, thread=0):
+    event(ERROR_EVENT, thread)
+    try:
+        TRACER.dump("{}: {}".format(type(error).__name__, error))
+    except OSError:
+        pass  # a full disk shouldn't hide the error itself
+
+
+# reads a file written by dump() as (reason, wall clock - monotonic, [(seq, time, kind, a, b, c)])
+def read_dump(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, count, offset, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} isn't a Smart Piggy Bank events file".format(path))
+    reason = data[HEADER.size:HEADER.size + length].decode("utf-8", "replace")
+    start = HEADER.size + length
+    events = [RECORD.unpack_from(data, start + n * RECORD.size) for n in range(count)]
+    return reason, offset, events
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m smartbank.tracing",
+                                     description="prints the events saved by the Smart Piggy Bank")
+    parser.add_argument("file", nargs="?", default=EVENTS_FILE)
+    args = parser.parse_args(argv)
+    try:
+        reason, offset, events = read_dump(args.file)
+    except (OSError, ValueError, struct.error) as error:
+        raise SystemExit("can't read {}: {}".format(args.file, error))
+    print("{} events, saved because of: {}".format(len(events), reason or "(no reason given)"))
+    for seq, at, kind, a, b, c in events:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at / 1e9 + offset))
+        print("{} {:>8} {}".format(when, seq, format_event(kind, a, b, c)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Counts coins from photos (the camera plan from the first version). Each photo (or camera frame) is
+# shrunk to a working size, the coins are found as circles with OpenCV's Hough transform, and every circle's size is
+# matched against the real coin sizes at once with NumPy (no Python loop per coin). Frames are counted in batches on
+# a pool of threads (OpenCV lets go of the GIL while it works, so the Pi's 4 cores are all used), and everything
+# counted is put in the bank as one deposit (sent to the bank that's running with --shared bank if there is one, so
+# only that bank writes the journal). The coins go on a dark tray and the camera has to be at a fixed height,
+# so the size of a coin in pixels is measured once from a photo of one known coin:
+#   python -m smartbank.vision calibrate quarter.jpg --coin quarter
+#   python -m smartbank.vision count photos/ [--deposit] [--database FILE --account NAME]
+#   python -m smartbank.vision count --camera 0 --frames 5
+#   python -m smartbank.vision demo --coins 100        counts made-up trays of coins (no camera needed)
+# NumPy and OpenCV (pip install numpy opencv-python-headless) are only needed here, nowhere else in the bank.
+#####################################################################################################################
+
+import argparse
+import json
+import os
+import random
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .coin_input import COIN_PINS
+from .ledger import format_cents
+
+CALIBRATION_FILE = "smart_bank_vision.json"
+WIDTH = 1600  # photos are shrunk to this wide before looking for coins (a few tenths of a second on a pi 4)
+BATCH = 4  # frames given to a worker at a time
+TOLERANCE = 0.03  # how far (3%) a circle can be from a coin's size and still count as it (a dime & penny are 6% apart)
+BLUR = 5  # median blur size, so the coins' faces don't turn into circles of their own
+EDGES = 100  # Canny edge threshold for the Hough transform
+VOTES = 30  # how many votes a circle needs to be counted (lower finds more circles, and more that aren't coins)
+SEND_WAIT = 2.0  # how long to wait for the running bank to show the total with a deposit in it
+IMAGE_TYPES = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+# each coin's diameter in mm (US Mint sizes). The names & values are the same as the coin buttons
+DIAMETERS = {"Penny": 19.05, "Nickel": 21.21, "Dime": 17.91, "Quarter": 24.26, "Dollar": 26.49}
+COINS = [(name, value, DIAMETERS[name]) for name, value in sorted(COIN_PINS.values(), key=lambda coin: coin[1])]
+
+# what was found in one frame: how many of each coin value, and circles that didn't match any coin
+FrameCount = namedtuple("FrameCount", ["name", "coins", "unknown"])
+
+
+def need_opencv():
+    try:
+        import numpy
+        import cv2
+    except ImportError:
+        raise SystemExit("Counting coins from photos needs NumPy and OpenCV "
+                         "(pip install numpy opencv-python-headless).")
+    return cv2
+
+
+# a frame as grayscale at the working width, and how much it was shrunk by
+def prepare(image):
+    import cv2
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    scale = min(1.0, WIDTH / image.shape[1])
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.medianBlur(image, BLUR), scale
+
+
+# the circles in a frame as an array of (x, y, radius) in the frame's own pixels. pixels_per_mm is for the whole
+# frame, it's only used to know what size of circle to look for. The Hough transform finds where the coins are, but
+# its radius is only to the nearest pixel or so (a dime & a penny are only a few pixels apart), so each coin is
+# measured again as how far its centre is from the nearest dark pixel. That works for coins touching each other too,
+# (they make one blob of light pixels, so the box around the blob would be too big)
+def find_circles(image, pixels_per_mm):
+    import numpy as np
+    import cv2
+    gray, scale = prepare(image)
+    per_mm = pixels_per_mm * scale
+    smallest = min(diameter for name, value, diameter in COINS) * (1 - TOLERANCE) / 2 * per_mm
+    biggest = max(diameter for name, value, diameter in COINS) * (1 + TOLERANCE) / 2 * per_mm
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1, minDist=smallest * 1.5, param1=EDGES, param2=VOTES,
+                               minRadius=int(smallest), maxRadius=int(biggest + 1))
+    if circles is None:
+        return np.zeros((0, 3))
+    circles = circles[0].astype(float)
+    ret, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)  # coins light, the tray dark
+    distance = cv2.distanceTransform(mask, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    x = np.clip(circles[:, 0].round().astype(int), 1, gray.shape[1] - 2)
+    y = np.clip(circles[:, 1].round().astype(int), 1, gray.shape[0] - 2)
+    # the farthest of the 9 pixels around the Hough centre (it can be a pixel out), less half a pixel because the
+    # distance is to the middle of the dark pixel, not its edge
+    nearby = np.max([distance[y + dy, x + dx] for dy in (-1, 0, 1) for dx in (-1, 0, 1)], axis=0)
+    circles[:, 2] = np.where(nearby > 0, nearby - 0.5, circles[:, 2])
+    return circles / scale
+
+
+# which coin each circle is (an index into COINS), all at once. -1 for circles that aren't near any coin's size
+def classify(radii, pixels_per_mm):
+    import numpy as np
+    sizes = np.array([diameter for name, value, diameter in COINS])
+    diameters = np.asarray(radii, dtype=float) * 2 / pixels_per_mm
+    off = np.abs(diameters[:, None] / sizes[None, :] - 1)  # circles x coins, how far off each size it is
+    nearest = off.argmin(axis=1)
+    return np.where(off[np.arange(len(nearest)), nearest] <= TOLERANCE, nearest, -1)
+
+
+# counts the coins in one frame
+def count_frame(name, image, pixels_per_mm):
+    import numpy as np
+    circles = find_circles(image, pixels_per_mm)
+    kinds = classify(circles[:, 2], pixels_per_mm)
+    found = np.bincount(kinds[kinds >= 0], minlength=len(COINS))
+    return FrameCount(name, Counter({COINS[kind][1]: int(count) for kind, count in enumerate(found) if count}),
+                      int((kinds < 0).sum()))
+
+
+# counts one batch of (name, load) frames on a worker. load() gives the image, so files are read on the workers too
+def count_batch(batch, pixels_per_mm):
+    results = []
+    for name, load in batch:
+        image = load()
+        if image is None:
+            results.append(FrameCount(name, Counter(), 0))  # not an image OpenCV can read
+        else:
+            results.append(count_frame(name, image, pixels_per_mm))
+    return results
+
+
+# counts every frame from a source (an iterable of (name, load)) on a pool of threads, batch frames at a time. The
+# results come back in the same order as the frames
+def count_frames(frames, pixels_per_mm, workers=None, batch=BATCH):
+    batches = []
+    for frame in frames:
+        if not batches or len(batches[-1]) == batch:
+            batches.append([])
+        batches[-1].append(frame)
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        for results in pool.map(count_batch, batches, [pixels_per_mm] * len(batches)):
+            yield from results
+
+
+# the frames from a folder of photos (or one photo), in name order
+def folder_frames(path):
+    import cv2
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_TYPES))
+        paths = [os.path.join(path, name) for name in names]
+    else:
+        paths = [path]
+    return [(file, lambda file=file: cv2.imread(file)) for file in paths]
+
+
+# a few frames from a camera (OpenCV's camera number), read right away since a camera can't be read from two threads
+def camera_frames(index=0, count=1):
+    import cv2
+    camera = cv2.VideoCapture(index)
+    try:
+        if not camera.isOpened():
+            raise SystemExit("Can't open camera {}.".format(index))
+        frames = []
+        for number in range(count):
+            ok, image = camera.read()
+            if not ok:
+                break
+            frames.append(("camera {} frame {}".format(index, number), lambda image=image: image))
+        return frames
+    finally:
+        camera.release()
+
+
+# a fake camera: made-up photos of trays of coins (light coins on a dark tray, not touching), and the values of the
+# coins in each one so what's counted can be checked
+class FakeCamera:
+    def __init__(self, coins=100, frames=1, pixels_per_mm=3.0, width=WIDTH, height=1200, seed=None):
+        self.coins = coins
+        self.frames = frames
+        self.pixels_per_mm = pixels_per_mm
+        self.width = width
+        self.height = height
+        self.rand = random.Random(seed)
+        self.expected = []  # the coin values in each frame made so far
+
+    def frame(self):
+        import numpy as np
+        import cv2
+        image = np.full((self.height, self.width), 40, dtype=np.uint8)
+        placed = []  # (x, y, radius) so the coins don't overlap
+        values = []
+        while len(values) < self.coins:
+            name, value, diameter = self.rand.choice(COINS)
+            radius = diameter / 2 * self.pixels_per_mm
+            x = self.rand.uniform(radius + 2, self.width - radius - 2)
+            y = self.rand.uniform(radius + 2, self.height - radius - 2)
+            if all((x - other_x) ** 2 + (y - other_y) ** 2 > (radius + other + 4) ** 2
+                   for other_x, other_y, other in placed):
+                placed.append((x, y, radius))
+                values.append(value)
+                cv2.circle(image, (round(x), round(y)), round(radius), 200, -1, cv2.LINE_AA)
+        self.expected.append(values)
+        return image
+
+    def __iter__(self):
+        for number in range(self.frames):
+            image = self.frame()
+            yield "fake frame {}".format(number), lambda image=image: image
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    try:
+        with open(path) as f:
+            return float(json.load(f)["pixels_per_mm"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# works out pixels per mm from a photo of one coin (the biggest circle in it) and saves it
+def calibrate(image, coin, path=CALIBRATION_FILE):
+    import cv2
+    diameter = DIAMETERS[coin]
+    gray, scale = prepare(image)
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1, minDist=gray.shape[0], param1=EDGES, param2=VOTES,
+                               minRadius=gray.shape[0] // 20, maxRadius=gray.shape[0] // 2)
+    if circles is None:
+        raise ValueError("no coin found in the photo")
+    pixels_per_mm = float(circles[0][:, 2].max()) * 2 / scale / diameter
+    from .journal import write_atomic
+    write_atomic(path, json.dumps({"pixels_per_mm": pixels_per_mm, "coin": coin}) + "\n")
+    return pixels_per_mm
+
+
+# adds up what was counted in every frame
+def add_up(results):
+    coins = Counter()
+    unknown = 0
+    for result in results:
+        coins.update(result.coins)
+        unknown += result.unknown
+    return coins, unknown
+
+
+# puts everything counted in a bank as one deposit (one transaction however many coins there were)
+def deposit(ledger, coins):
+    total = sum(value * count for value, count in coins.items())
+    if total:
+        return ledger.deposit(total)
+
+
+# sends a deposit to the bank that's running (python -m smartbank --shared bank) as if it was one big coin, so that
+# bank is still the only one writing the journal. The deposit goes in the account that bank has open, so picking
+# another one (with --database or --account) is refused. Returns (whether a bank was running to send it to, the
+# bank's Balance after it or None if it hasn't shown it yet). Raises SystemExit if it can't be sent
+def send_deposit(total, picked_account=False):
+    from .shm import SharedChannel, ChannelClosed, SEGMENT
+    try:
+        channel = SharedChannel.attach(SEGMENT)
+    except FileNotFoundError:
+        return False, None
+    except RuntimeError as error:  # the coin process is sending the bank its coins, only one process can
+        raise SystemExit("Can't send the deposit to the bank: {}.".format(error))
+    try:
+        if channel.closed:  # left over from a bank that's gone
+            return False, None
+        if picked_account:
+            raise SystemExit("A bank is running, so the deposit goes in the account it has open. Leave out "
+                             "--database and --account.")
+        try:
+            seq = channel.push(time.monotonic(), 0, total)
+        except ChannelClosed:
+            raise SystemExit("The bank closed before the deposit could be sent, try again.")
+        balance = channel.balance_after(seq, timeout=SEND_WAIT)
+        if (balance is None or balance.applied < seq) and channel.closed and not channel.wait_saved(seq, SEND_WAIT):
+            raise SystemExit("The bank closed before it took the deposit, try again.")
+        return True, balance if balance is not None and balance.applied >= seq else None
+    finally:
+        channel.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m smartbank.vision", description="count coins from photos")
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrating = commands.add_parser("calibrate", help="measure the camera from a photo of one coin")
+    calibrating.add_argument("photo")
+    calibrating.add_argument("--coin", required=True, choices=[name.lower() for name in DIAMETERS])
+    counting = commands.add_parser("count", help="count the coins in photos or camera frames")
+    counting.add_argument("photos", nargs="?", help="a photo or a folder of them")
+    counting.add_argument("--camera", type=int, metavar="NUMBER", help="take the frames from this camera instead")
+    counting.add_argument("--frames", type=int, default=1, help="frames to take from the camera (default: 1)")
+    counting.add_argument("--deposit", action="store_true",
+                          help="put what was counted in the bank as one deposit (through the bank that's running, "
+                               "if there is one)")
+    counting.add_argument("--database", metavar="FILE", help="the accounts database (default: the journal)")
+    counting.add_argument("--account", help="the account to deposit in (with --database)")
+    demo = commands.add_parser("demo", help="count made-up trays of coins")
+    demo.add_argument("--coins", type=int, default=100, help="coins on each tray (default: %(default)s)")
+    demo.add_argument("--frames", type=int, default=8, help="trays (default: %(default)s)")
+    demo.add_argument("--seed", type=int, default=1)
+    for command in (counting, demo):
+        command.add_argument("--workers", type=int, help="threads counting frames (default: one per core)")
+    parser.add_argument("--calibration", default=CALIBRATION_FILE, metavar="FILE")
+    args = parser.parse_args(argv)
+    cv2 = need_opencv()
+
+    if args.command == "calibrate":
+        image = cv2.imread(args.photo)
+        if image is None:
+            raise SystemExit("Can't read {}.".format(args.photo))
+        try:
+            pixels_per_mm = calibrate(image, args.coin.capitalize(), args.calibration)
+        except ValueError as error:
+            raise SystemExit(str(error))
+        print("{:.2f} pixels per mm, saved in {}".format(pixels_per_mm, args.calibration))
+        return
+
+    if args.command == "demo":
+        camera = FakeCamera(args.coins, args.frames, seed=args.seed)
+        frames, pixels_per_mm = list(camera), camera.pixels_per_mm
+    else:
+        pixels_per_mm = load_calibration(args.calibration)
+        if pixels_per_mm is None:
+            raise SystemExit("Calibrate the camera first (python -m smartbank.vision calibrate PHOTO --coin COIN).")
+        if args.camera is not None:
+            frames = camera_frames(args.camera, args.frames)
+        elif args.photos:
+            frames = folder_frames(args.photos)
+        else:
+            parser.error("give photos or --camera")
+
+    begin = time.perf_counter()
+    results = list(count_frames(frames, pixels_per_mm, args.workers))
+    took = time.perf_counter() - begin
+    for result in results:
+        print("{}: {} coins, {} ({} not coins)".format(result.name, sum(result.coins.values()),
+                                                     format_cents(sum(v * n for v, n in result.coins.items())),
+                                                     result.unknown))
+    coins, unknown = add_up(results)
+    total = sum(value * count for value, count in coins.items())
+    print("{} frames in {:.0f} ms ({:.0f} ms a frame): {} coins, {}".format(
+        len(results), took * 1000, took * 1000 / max(len(results), 1), sum(coins.values()), format_cents(total)))
+
+    if args.command == "demo":
+        right = sum(Counter(values) == result.coins for values, result in zip(camera.expected, results))
+        print("{} of {} trays counted exactly".format(right, len(results)))
+    elif args.deposit and total:
+        sent, balance = send_deposit(total, bool(args.database or args.account))
+        if sent and balance is None:
+            print("Sent {} to the bank".format(format_cents(total)))
+        elif sent:
+            print("Deposited {}, the total is now {}".format(format_cents(total), format_cents(balance.total)))
+        else:  # no bank is sharing its coins. One that isn't (the GUI on its own) has the journal locked
+            from .bank import Bank, ACCOUNT
+            bank = Bank(database=args.database, account=args.account or ACCOUNT)
+            try:
+                bank.open()
+            except RuntimeError as error:
+                bank.close()
+                raise SystemExit("Can't deposit: {}. Start it with --shared bank so deposits can be sent to it, or "
+                                 "close it first.".format(error))
+            except ValueError as error:  # the journal can't be read
+                bank.close()
+                raise SystemExit("Can't deposit: {}.".format(error))
+            try:
+                deposit(bank.ledger, coins)
+                print("Deposited {}, the total is now {}".format(format_cents(total), bank.ledger.format_total()))
+            finally:
+                bank.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks the coin buttons without a Raspberry Pi: FakeGPIO stands in for the pins and the presses are
+# timed by a made-up clock, so switch bounce can be lined up to the millisecond.
+#   python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from smartbank.coin_input import CoinInput, FakeGPIO, COIN_PINS, DEBOUNCE_MS
+
+PENNY, NICKEL = 24, 22
+
+
+class CoinInputTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0  # the made-up clock, in seconds
+        self.gpio = FakeGPIO()
+        self.coins = CoinInput(self.gpio, clock=lambda: self.now)
+        self.coins.start()
+
+    def tearDown(self):
+        self.coins.stop()
+
+    # presses pin at this many milliseconds on the made-up clock
+    def press(self, pin, ms):
+        self.now = 100.0 + ms / 1000
+        self.gpio.press(pin)
+
+    def test_start_watches_every_pin(self):
+        self.assertEqual(self.gpio.mode, FakeGPIO.BCM)
+        self.assertEqual(set(self.gpio.callbacks), set(COIN_PINS))
+        for pin in COIN_PINS:
+            self.assertEqual(self.gpio.input(pin), 0)  # pulled down until pressed
+            self.assertEqual(self.gpio.callbacks[pin][0], FakeGPIO.RISING)
+
+    def test_press_queues_the_coin(self):
+        self.press(NICKEL, 0)
+        coins = self.coins.drain()
+        self.assertEqual(len(coins), 1)
+        self.assertEqual((coins[0].time, coins[0].pin, coins[0].name, coins[0].value), (100.0, NICKEL, "Nickel", 5))
+        self.assertEqual(self.coins.drain(), [])
+
+    # edges on the same pin closer together than the debounce time are bounce, anything after it is a new coin
+    def test_debounce(self):
+        self.press(PENNY, 0)
+        self.press(PENNY, 1)
+        self.press(PENNY, DEBOUNCE_MS - 1)
+        self.press(PENNY, DEBOUNCE_MS + 1)
+        self.assertEqual([coin.time for coin in self.coins.drain()], [100.0, 100.0 + (DEBOUNCE_MS + 1) / 1000])
+        self.assertEqual(self.coins.bounced, 2)
+
+    # the debounce time counts from the last coin taken, not the last bounce, so bouncing can't hold a coin off
+    def test_bounce_doesnt_move_the_window(self):
+        self.press(PENNY, 0)
+        self.press(PENNY, DEBOUNCE_MS - 10)
+        self.press(PENNY, DEBOUNCE_MS + 10)
+        self.assertEqual(len(self.coins.drain()), 2)
+        self.assertEqual(self.coins.bounced, 1)
+
+    # each pin has its own debounce time, so two different coins at once both count
+    def test_pins_debounce_on_their_own(self):
+        self.press(PENNY, 0)
+        self.press(NICKEL, 1)
+        self.assertEqual([coin.value for coin in self.coins.drain()], [1, 5])
+        self.assertEqual(self.coins.bounced, 0)
+
+    # only rising edges are coins (letting go of the button isn't another one)
+    def test_release_isnt_a_coin(self):
+        self.gpio.set_level(PENNY, 1)
+        self.now += 1
+        self.gpio.set_level(PENNY, 0)
+        self.assertEqual(len(self.coins.drain()), 1)
+
+    def test_stop_turns_off_the_callbacks(self):
+        self.coins.stop()
+        self.assertEqual(self.gpio.callbacks, {})
+        self.assertRaises(KeyError, self.gpio.press, PENNY)  # cleanup() wiped the pins too
+        self.coins.start()  # so tearDown has something to stop
+
+
+if __name__ == "__main__":
+    unittest.main()
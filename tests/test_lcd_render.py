@@ -0,0 +1,114 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks the LCD renderer on FakeLCD. A write can be held up (like a slow I2C write) while more text
+# comes in, so what gets coalesced is lined up exactly instead of depending on how fast the machine is, and writes can
+# be made to fail (the LCD came loose) to check the worker keeps going.
+#   python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from smartbank import tracing
+from smartbank.lcd_render import FakeLCD, LCDRenderer
+
+RATE = 1000  # writes per second, so the tests don't wait out the real rate limit
+
+
+# FakeLCD where a write can be held up until it's let go, or made to fail
+class SlowLCD(FakeLCD):
+    def __init__(self):
+        FakeLCD.__init__(self)
+        self.started = threading.Event()  # set when a write begins
+        self.go = threading.Event()  # writes wait for this
+        self.go.set()
+        self.failures = 0  # how many of the next writes fail
+        self.frames = []  # every line write, in order
+
+    def text(self, text, line):
+        self.started.set()
+        self.go.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise OSError("I2C write failed")
+        FakeLCD.text(self, text, line)
+        self.frames.append((line, text))
+
+
+class LCDRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.old = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        os.chdir(self.folder.name)  # a failed write dumps the traced events in the current folder
+        self.lcd = SlowLCD()
+        self.renderer = LCDRenderer(self.lcd, max_rate=RATE)
+
+    def tearDown(self):
+        self.lcd.go.set()
+        self.renderer.stop()
+        os.chdir(self.old)
+        self.folder.cleanup()
+
+    def test_text_is_written(self):
+        self.renderer.text("Deposited $0.25", 1)
+        self.renderer.text("Total: $1.00", 2)
+        self.assertTrue(self.renderer.flush())
+        self.assertEqual(self.lcd.lines, ["Deposited $0.25", "Total: $1.00"])
+
+    # text that comes in while a write is going on replaces what was asked for before it, only the newest is written
+    def test_coalescing(self):
+        self.lcd.go.clear()
+        self.renderer.text("first", 1)
+        self.assertTrue(self.lcd.started.wait(5))  # the worker is stuck writing "first"
+        for cents in range(100):
+            self.renderer.text("Total: {}".format(cents), 2)
+            self.renderer.text("Deposited {}".format(cents), 1)
+        self.lcd.go.set()
+        self.assertTrue(self.renderer.flush())
+        self.assertEqual(self.lcd.frames, [(1, "first"), (1, "Deposited 99"), (2, "Total: 99")])
+        self.assertEqual((self.renderer.requested, self.renderer.writes, self.renderer.saved()), (201, 3, 198))
+
+    # a line that's asked for again with the same text isn't written again
+    def test_unchanged_line_isnt_written(self):
+        self.renderer.text("Total: $1.00", 2)
+        self.assertTrue(self.renderer.flush())
+        self.renderer.text("Total: $1.00", 2)
+        self.renderer.text("Hi", 1)
+        self.assertTrue(self.renderer.flush())
+        self.assertEqual(self.lcd.frames, [(2, "Total: $1.00"), (1, "Hi")])
+
+    # a failed write doesn't stop the worker or leave it looking busy, it's traced (the events get dumped) and it's
+    # tried again
+    def test_write_failure(self):
+        self.lcd.failures = 3
+        self.renderer.text("still works", 1)
+        self.assertTrue(self.renderer.flush())
+        self.assertTrue(self.renderer.thread.is_alive())
+        self.assertFalse(self.renderer.writing)
+        self.assertEqual(self.lcd.lines[0], "still works")
+        self.assertEqual(self.renderer.errors, 0)
+        reason, offset, events = tracing.read_dump(tracing.EVENTS_FILE)
+        self.assertIn("I2C write failed", reason)
+        self.renderer.text("and again", 2)
+        self.assertTrue(self.renderer.flush())
+        self.assertEqual(self.lcd.lines, ["still works", "and again"])
+
+    # stopping writes what's left, and a write that keeps failing doesn't keep it from stopping
+    def test_stop(self):
+        self.renderer.text("bye", 1)
+        self.renderer.stop()
+        self.assertEqual(self.lcd.lines[0], "bye")
+        self.renderer = LCDRenderer(self.lcd, max_rate=RATE)
+        self.lcd.failures = 10 ** 6
+        self.renderer.text("never shown", 2)
+        self.renderer.stop()
+        self.assertFalse(self.renderer.thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
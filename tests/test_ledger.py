@@ -0,0 +1,190 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks the ledger with made-up random sessions of coins, withdrawals, undos, redos, clearing, goal and
+# percentage changes. After every step the running total has to be exactly what the transactions add up to, the jars
+# have to add up to the total, each jar's leftover fraction of a cent has to stay under a cent, and the undo & redo
+# stacks have to be what they should (and the total & jars what the transactions still on the undo stack add up to).
+# At the end the journal, read back the way the bank does at start up, has to give the same total, goal, jars &
+# leftovers. How many sessions (and how long each one is) can be turned up for a long run, and every run uses a new
+# seed unless one is given (a failure says which):
+#   python -m unittest discover tests
+#   SMARTBANK_TEST_SESSIONS=10000 SMARTBANK_TEST_STEPS=1000 SMARTBANK_TEST_SEED=42 python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from smartbank.jars import JARS
+from smartbank.journal import Journal
+from smartbank.ledger import Ledger, to_cents, format_cents
+
+SESSIONS = int(os.environ.get("SMARTBANK_TEST_SESSIONS", 20))
+STEPS = int(os.environ.get("SMARTBANK_TEST_STEPS", 300))
+SEED = int(os.environ.get("SMARTBANK_TEST_SEED", random.SystemRandom().randrange(2 ** 32)))
+COINS = (1, 5, 10, 25, 100)  # a penny, nickel, dime, quarter and dollar in cents
+RATIOS = ((10, 20, 70), (0, 0, 100), (33, 33, 34), (1, 1, 1), (5, 0, 3))
+
+
+class LedgerPropertyTest(unittest.TestCase):
+    def setUp(self):
+        self.old = os.getcwd()
+        self.folder = tempfile.TemporaryDirectory()
+        os.chdir(self.folder.name)  # the journal reads & writes the old save files in the current folder
+
+    def tearDown(self):
+        os.chdir(self.old)
+        self.folder.cleanup()
+
+    # a journal in the test's folder that takes a snapshot every so often, so replaying goes through both
+    def journal(self):
+        journal = Journal(sync_interval=None, snapshot_every=50)
+        journal.load()
+        return journal
+
+    def check_total(self, ledger, dollars):
+        self.assertEqual(ledger.total, ledger.opening + sum(ledger.amounts))
+        self.assertEqual(len(ledger.kinds), len(ledger.amounts))
+        self.assertEqual(len(ledger.balances), len(ledger.amounts))
+        self.assertEqual(len(ledger.times), len(ledger.amounts))
+        if len(ledger):
+            self.assertEqual(ledger.balances[-1], ledger.total)
+        self.assertEqual(Decimal(ledger.total) / 100, dollars)  # the same as adding up the dollars exactly
+        self.check_jars(ledger)
+
+    def check_jars(self, ledger):
+        whole = sum(ledger.jars.ratios)
+        self.assertEqual(sum(ledger.jars.balances), ledger.total)
+        self.assertEqual(sum(ledger.jars.carry), 0)  # the fractions only move between jars
+        for carry in ledger.jars.carry:
+            self.assertTrue(-whole <= carry < whole, "carry {} out of range".format(ledger.jars.carry))
+
+    # the undo stack is the transactions still counted (oldest first) and the redo stack the ones undone (newest
+    # last), so between them & the opening balance they give the total and every jar
+    def check_stacks(self, ledger, live, undone):
+        self.assertEqual(list(ledger.live), live)
+        self.assertEqual(list(ledger.undone), undone)
+        self.assertFalse(set(live) & set(undone))
+        self.assertEqual(live, sorted(live))
+        self.assertEqual(ledger.total, ledger.opening + sum(ledger.amounts[index] for index in live))
+        jars = list(ledger.opening_jars)
+        for index in live:
+            jars = [jar + change for jar, change in zip(jars, ledger.split(index))]
+        self.assertEqual(ledger.jars.balances, jars)
+
+    # one random session: mostly coins, some withdrawals from any jar, undos & redos (often a few in a row), a clear
+    # now & then and the odd new goal or percentages. live & undone are what the undo & redo stacks should be
+    def run_session(self, rand, ledger):
+        dollars = Decimal(ledger.total) / 100
+        live, undone = [], []
+        for _ in range(STEPS):
+            step = rand.random()
+            if step < 0.5:
+                cents = rand.choice(COINS + (rand.randint(1, 100000),))
+                live.append(ledger.deposit(cents))
+                undone = []
+            elif step < 0.62:
+                cents = rand.randint(1, 5000)
+                live.append(ledger.withdraw(cents, jar=rand.randrange(len(JARS))))
+                undone = []
+                cents = -cents
+            elif step < 0.8:
+                before = ledger.total
+                index = ledger.undo()
+                self.assertEqual(index, live[-1] if live else None)
+                if live:
+                    undone.append(live.pop())
+                cents = ledger.total - before
+            elif step < 0.94:
+                before = ledger.total
+                index = ledger.redo()
+                if undone:
+                    undone.pop()
+                    live.append(index)
+                else:
+                    self.assertIsNone(index)
+                cents = ledger.total - before
+            elif step < 0.97:
+                cents = ledger.opening - ledger.total
+                ledger.revert()  # what Clear does
+                live, undone = [], []
+            elif step < 0.985:
+                cents = 0
+                ledger.set_goal(rand.randint(1, 100000))
+            else:
+                cents = 0
+                ledger.set_ratios(rand.choice(RATIOS))
+            dollars += Decimal(cents) / 100
+            self.check_total(ledger, dollars)
+            self.check_stacks(ledger, live, undone)
+
+    def test_random_sessions(self):
+        rand = random.Random(SEED)
+        for session in range(SESSIONS):
+            with self.subTest(seed=SEED, session=session):
+                ledger = Ledger.from_journal(self.journal())
+                self.run_session(rand, ledger)
+                ledger.journal.close()
+
+                again = Ledger.from_journal(self.journal())  # what the next start up would load
+                self.assertEqual(again.total, ledger.total)
+                self.assertEqual(again.goal, ledger.goal)
+                self.assertEqual(again.jars.balances, ledger.jars.balances)
+                self.assertEqual(again.jars.carry, ledger.jars.carry)
+                self.assertEqual(again.jars.ratios, ledger.jars.ratios)
+                again.journal.close()
+
+    # undoing everything in a session puts every jar back to where it started, and redoing it all gets it back
+    def test_undo_and_redo_everything(self):
+        rand = random.Random(SEED)
+        for session in range(SESSIONS):
+            with self.subTest(seed=SEED, session=session):
+                ledger = Ledger.from_journal(self.journal())
+                start = list(ledger.jars.balances)
+                for _ in range(STEPS):
+                    if rand.random() < 0.8:
+                        ledger.deposit(rand.randint(1, 1000))
+                    else:
+                        ledger.withdraw(rand.randint(1, 1000), jar=rand.randrange(len(JARS)))
+                end = list(ledger.jars.balances)
+                while ledger.undo() is not None:
+                    self.check_jars(ledger)
+                self.assertEqual(ledger.jars.balances, start)
+                while ledger.redo() is not None:
+                    self.check_jars(ledger)
+                self.assertEqual(ledger.jars.balances, end)
+                ledger.journal.close()
+
+    # without its snapshot a compacted journal can't give the balance, unless it was emptied and the old save files
+    # (written next to it on every checkpoint) have it
+    def test_lost_snapshot(self):
+        os.mkdir("bank")
+        journal = Journal(os.path.join("bank", "journal.txt"), os.path.join("bank", "snapshot.txt"),
+                          sync_interval=None, snapshot_every=3)
+        journal.load()
+        for _ in range(5):
+            journal.deposit(100)
+        journal.close()
+        self.assertFalse(os.path.exists("smart_bank_balance.txt"))
+        os.remove(journal.snapshot_path)
+        self.assertRaises(ValueError, journal.load)
+        open(journal.path, "w").close()
+        self.assertEqual(journal.load(), (300, 500))
+        journal.close()
+
+    # every amount of cents comes back the same after being shown and typed in again
+    def test_format_round_trip(self):
+        rand = random.Random(SEED)
+        for _ in range(SESSIONS * STEPS):
+            cents = rand.randint(-10 ** 9, 10 ** 9)
+            with self.subTest(seed=SEED, cents=cents):
+                self.assertEqual(to_cents(format_cents(cents).replace("$", "")), cents)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks the coin acceptor decoder on made-up pulse timestamps: bursts turn into the right coins, noise
+# right after a pulse is thrown away, a quiet gap ends a coin, and bursts that match no coin are rejected. PulseInput
+# is run on FakeGPIO with a made-up clock too, the way a replayed trace drives it.
+#   python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from smartbank.coin_input import FakeGPIO
+from smartbank.pulse import PulseDecoder, PulseInput, DENOMINATIONS, GAP_MS, GLITCH_MS
+from smartbank.pulse import decode_trace, synthetic_trace
+
+MS = 0.001  # a millisecond in seconds, like the timestamps
+
+
+class PulseDecoderTest(unittest.TestCase):
+    # every coin in a long random trace comes out once and in order, even sent as fast as the acceptor can
+    def test_synthetic_trace(self):
+        rand = random.Random(7)
+        values = [rand.choice([value for name, value in DENOMINATIONS.values()]) for _ in range(500)]
+        coins, decoder = decode_trace(synthetic_trace(values, jitter_ms=0.3, seed=7))
+        self.assertEqual([coin.value for coin in coins], values)
+        self.assertEqual((decoder.glitches, decoder.rejected), (0, 0))
+
+    # a pulse sooner than the glitch time after the last one is noise, so a quarter with noise is still a quarter
+    def test_glitch(self):
+        decoder = PulseDecoder()
+        for when in (0, 1 * MS, 1 * MS + GLITCH_MS * MS / 2, 2 * MS, 3 * MS):
+            self.assertIsNone(decoder.feed(when))
+        self.assertEqual(decoder.glitches, 1)
+        self.assertEqual(decoder.finish().name, "Quarter")
+
+    # a pulse just inside the gap is part of the same coin, one just past it starts the next coin
+    def test_gap(self):
+        decoder = PulseDecoder()
+        self.assertIsNone(decoder.feed(0))
+        self.assertIsNone(decoder.feed(GAP_MS * MS * 0.99))
+        coin = decoder.feed(GAP_MS * MS * 0.99 + GAP_MS * MS * 1.01)
+        self.assertEqual((coin.name, coin.time), ("Nickel", 0))  # timed from its first pulse
+        self.assertEqual(decoder.count, 1)
+
+    # the last coin in a row is ended by the line staying quiet, which poll() and deadline() are for
+    def test_poll_ends_the_last_coin(self):
+        decoder = PulseDecoder()
+        self.assertIsNone(decoder.deadline())
+        decoder.feed(5.0)
+        self.assertEqual(decoder.deadline(), 5.0 + GAP_MS * MS)
+        self.assertIsNone(decoder.poll(5.0 + GAP_MS * MS / 2))
+        self.assertEqual(decoder.poll(5.0 + GAP_MS * MS * 2).name, "Penny")
+        self.assertIsNone(decoder.deadline())
+        self.assertIsNone(decoder.poll(10.0))
+
+    # a burst with a number of pulses that isn't in the table is rejected, and the coins either side still count
+    def test_reject(self):
+        times = synthetic_trace([1]) + [0.1 + index * MS for index in range(len(DENOMINATIONS) + 1)]
+        times += synthetic_trace([25], start=0.2)
+        coins, decoder = decode_trace(times)
+        self.assertEqual([coin.value for coin in coins], [1, 25])
+        self.assertEqual(decoder.rejected, 1)
+
+    def test_custom_table(self):
+        coins, decoder = decode_trace(synthetic_trace([200, 100], table={2: ("Loonie", 100), 4: ("Toonie", 200)}),
+                                      table={2: ("Loonie", 100), 4: ("Toonie", 200)})
+        self.assertEqual([coin.name for coin in coins], ["Toonie", "Loonie"])
+
+
+# PulseInput without its burst-ending thread, timed by a made-up clock, so the last coin is ended by stop()
+class PulseInputTest(unittest.TestCase):
+    def test_pulses_on_fake_gpio(self):
+        now = [0.0]
+        gpio = FakeGPIO()
+        coins = PulseInput(gpio, clock=lambda: now[0], timer=False)
+        coins.start()
+        for when in synthetic_trace([10, 5]) + [0.05, 0.05 + GLITCH_MS * MS / 2]:
+            now[0] = when
+            gpio.set_level(coins.pin, 0)  # the acceptor pulls the line low for each pulse
+            gpio.set_level(coins.pin, 1)
+        self.assertEqual([coin.value for coin in coins.drain()], [10, 5])
+        coins.stop()
+        self.assertEqual([coin.value for coin in coins.drain()], [1])
+        self.assertEqual(coins.bounced, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
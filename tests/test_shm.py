@@ -0,0 +1,119 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks the shared memory between the coin process and the bank, both ends in this one process. A coin
+# has to stay in the ring until the bank's journal has it on the disk, so a bank that closes or crashes before then
+# leaves it for the next bank, and the coin process waits for the bank to save its last coins when it stops.
+#   python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from multiprocessing import resource_tracker
+
+from smartbank.journal import Journal
+from smartbank.ledger import Ledger
+from smartbank.shm import CoinSender, SharedChannel, SharedCoins
+
+PENNY, QUARTER = 24, 25
+
+
+class SharedCoinsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.name = "smartbank_test_{}".format(os.getpid())
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    # closes a bank's shared memory. Before python 3.13, attach() (the coin process's side, in this same process
+    # here) took the bank's memory off this process's resource tracker, so it's put back before the bank removes it
+    def close(self, channel):
+        if channel.buf is not None:
+            if sys.version_info < (3, 13):
+                resource_tracker.register(channel.memory._name, "shared_memory")
+            channel.close()
+
+    # a bank's side: the shared memory, its coins and a journal (in its own folder) that's only forced to disk when
+    # it's asked to
+    def bank(self, name="bank"):
+        channel = SharedChannel.create(self.name)
+        self.addCleanup(self.close, channel)  # after the journal (cleanups go last to first)
+        coins = SharedCoins(channel)
+        folder = os.path.join(self.folder.name, name)
+        os.mkdir(folder)
+        journal = Journal(os.path.join(folder, "journal.txt"), os.path.join(folder, "snapshot.txt"), sync_interval=None)
+        journal.load()
+        ledger = Ledger.from_journal(journal)
+        ledger.subscribe(coins.publish)
+        journal.sync_listeners.append(coins.synced)
+        self.addCleanup(journal.close)
+        return channel, coins, ledger
+
+    # takes the coins out of the ring and deposits them, the way the GUI and headless mode do
+    def deposit(self, coins, ledger):
+        coins.move()
+        for coin in coins.drain():
+            ledger.deposit(coin.value)
+
+    def test_coin_stays_until_saved(self):
+        channel, coins, ledger = self.bank()
+        sender = SharedChannel.attach(self.name)
+        self.addCleanup(sender.close)
+        for cents in (1, 25, 25):
+            sender.push(time.monotonic(), PENNY, cents)
+        self.deposit(coins, ledger)
+        self.assertEqual(ledger.total, 51)
+        self.assertEqual(sender.balance().applied, 3)  # the total is shown right away
+        self.assertEqual(len(sender.unread()), 3)  # but the coins aren't safe yet
+        ledger.journal.sync()
+        self.assertEqual((sender.saved(), sender.unread()), (3, []))
+
+    # coins the bank took out but never saved go to the next bank (a new journal here, as the crashed bank's records
+    # that weren't on the disk yet are gone)
+    def test_unsaved_coins_go_to_the_next_bank(self):
+        channel, coins, ledger = self.bank()
+        sender = CoinSender(self.name)
+        sender.send(time.monotonic(), PENNY, 1)
+        sender.send(time.monotonic(), QUARTER, 25)
+        coins.move()
+        ledger.deposit(coins.get().value)  # the penny is in the journal, but not on the disk yet
+        ledger.journal.sync_listeners.remove(coins.synced)
+        self.close(channel)  # then it crashed
+
+        channel, coins, ledger = self.bank("next")
+        sender.send(time.monotonic(), QUARTER, 25)
+        self.deposit(coins, ledger)
+        self.assertEqual(ledger.total, 51)
+        ledger.journal.close()
+        self.assertEqual(sender.close(timeout=0), [])
+
+    # close() waits for the bank to save the coins it was sent, and gives back the ones it didn't
+    def test_close_waits_for_the_bank(self):
+        channel, coins, ledger = self.bank()
+        sender = CoinSender(self.name)
+        sender.send(time.monotonic(), QUARTER, 25)
+
+        def save():
+            time.sleep(0.05)
+            self.deposit(coins, ledger)
+            ledger.journal.sync()
+        saver = threading.Thread(target=save)
+        saver.start()
+        self.assertEqual(sender.close(timeout=5), [])
+        saver.join()
+        self.assertEqual(channel.saved(), 1)
+
+        sender = CoinSender(self.name)
+        sender.send(5.0, PENNY, 1)  # nobody takes this one out
+        self.assertEqual(sender.close(timeout=0.05), [(5.0, PENNY, 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
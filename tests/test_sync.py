@@ -0,0 +1,187 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks how the sync hub merges what the banks send it. Batches are handed to SyncHub.receive() the way
+# a connection would, so repeats, batches out of order and a bank whose journal started over can be lined up exactly.
+# One test runs a real bank (journal, ledger & SyncClient) against a hub over TCP on this computer, and one checks the
+# token the same way.
+#   python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from smartbank import sync
+from smartbank.journal import Journal
+from smartbank.ledger import Ledger
+from smartbank.sync import SyncClient, SyncHub, balances, count, merge, recv_message, send_message
+
+SPLIT = (10, 20, 70)  # how a dollar is split between the jars by default
+
+
+# a batch of deposits of a dollar each with these seqs, after base, with the counters as of the last one. counted is
+# how many dollars the bank had counted before this batch
+def batch(seqs, base, counted, device="kid"):
+    counters = [0] * sync.COUNTERS
+    for _ in range(counted + len(seqs)):
+        count(counters, 100, SPLIT)
+    deltas = []
+    previous = base
+    for seq in seqs:
+        deltas.append([seq - previous, 100] + list(SPLIT))
+        previous = seq
+    return {"device": device, "base": base, "deltas": deltas, "counters": counters}
+
+
+class SyncHubTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "hub.json")
+        self.hub = SyncHub(self.path, port=0)
+
+    def tearDown(self):
+        self.hub.stop()
+        self.folder.cleanup()
+
+    def seqs(self, device="kid"):
+        return [entry[0] for entry in self.hub.devices[device]["history"]]
+
+    def test_counters_merge_by_max(self):
+        self.assertEqual(merge([5, 0, 3, 9], [4, 1, 3, 10]), [5, 1, 3, 10])
+        counters = [0] * sync.COUNTERS
+        count(counters, 100, SPLIT)
+        count(counters, -30, (0, 0, -30))
+        self.assertEqual(balances(counters), [70, 10, 20, 40])
+
+    # a batch sent again (the answer got lost) or one that gets there late changes nothing
+    def test_seq_dedup(self):
+        self.assertEqual(self.hub.receive(batch([1, 2, 3], 0, 0), "a"), 3)
+        self.assertEqual(self.hub.receive(batch([1, 2, 3], 0, 0), "a"), 3)
+        self.assertEqual(self.hub.receive(batch([4, 5], 3, 3), "a"), 5)
+        self.assertEqual(self.hub.receive(batch([2, 3], 1, 1), "a"), 5)  # an old one, after the newer ones
+        self.assertEqual(self.seqs(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 500)
+
+    # seqs don't have to be one apart (records that aren't transactions, like goal changes, aren't sent)
+    def test_gaps_in_seqs(self):
+        self.assertEqual(self.hub.receive(batch([2, 5, 9], 0, 0), "a"), 9)
+        self.assertEqual(self.seqs(), [2, 5, 9])
+
+    # a hello only has the counters, and older counters from the same bank never take the totals back
+    def test_hello_merges_counters(self):
+        self.hub.receive(batch([1, 2], 0, 0), "a")
+        hello = batch([], 0, 1)
+        del hello["deltas"]
+        self.assertEqual(self.hub.receive(hello, "a"), 2)
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 200)
+
+    # a bank whose journal started over has a new epoch and starts from seq 1 again, which the hub takes
+    def test_new_epoch_starts_over(self):
+        self.hub.receive(batch([1, 2, 3], 0, 0), "a")
+        self.assertEqual(self.hub.receive(batch([1], 0, 0), "b"), 1)
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 100)
+        self.assertEqual(self.seqs(), [1, 2, 3, 1])  # what it had from before is still in the history
+        self.assertEqual(self.hub.receive(batch([2], 1, 1), "b"), 2)  # not skipped like a repeat
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 200)
+
+    # the household total adds up every bank
+    def test_totals(self):
+        self.hub.receive(batch([1, 2], 0, 0, "kid"), "a")
+        self.hub.receive(batch([1], 0, 0, "sister"), "b")
+        each, household = self.hub.totals()
+        self.assertEqual((each["kid"][0], each["sister"][0], household), (200, 100, [300, 30, 60, 210]))
+
+    # what the hub has is in its log until it's saved as a whole, and a hub that stopped without saving (the power
+    # went out) reads it back, leaving off a half-written last line
+    def test_log_replay(self):
+        self.hub.receive(batch([1, 2], 0, 0), "a")
+        self.hub.receive(batch([3], 2, 2), "a")
+        with open(self.path + sync.LOG_SUFFIX, "a") as f:
+            f.write('{"device":"kid","epo')
+        self.hub.server.shutdown()
+        self.hub.server.server_close()
+        self.hub = SyncHub(self.path, port=0)
+        self.assertEqual(self.seqs(), [1, 2, 3])
+        self.assertEqual(self.hub.devices["kid"]["epoch"], "a")
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 300)
+        self.assertEqual(os.path.getsize(self.path + sync.LOG_SUFFIX), 0)  # saved as a whole when it started
+
+    def test_compacts_the_log(self):
+        for seq in range(1, sync.COMPACT_EVERY + 3):
+            self.hub.receive(batch([seq], seq - 1, seq - 1), "a")
+        with open(self.path + sync.LOG_SUFFIX) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.hub.stop()
+        self.hub = SyncHub(self.path, port=0)
+        self.assertEqual(self.hub.devices["kid"]["seq"], sync.COMPACT_EVERY + 2)
+
+    # with a token, a connection that doesn't send it is turned away before anything it sent is merged
+    def test_token(self):
+        self.hub.stop()
+        self.hub = SyncHub(self.path, port=0, token="secret")
+        for token, answer in ((None, {"error": "wrong token"}), ("nope", {"error": "wrong token"}),
+                              ("secret", {"acked": 0})):
+            with socket.create_connection(("127.0.0.1", self.hub.port), timeout=5) as sock:
+                hello = batch([], 0, 1)
+                if token is not None:
+                    hello["token"] = token
+                send_message(sock, hello)
+                self.assertEqual(recv_message(sock), answer)
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 100)
+
+
+# a real bank sending to the hub over TCP, with the batches sent as soon as there's one transaction waiting
+class SyncClientTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.hub = SyncHub(self.file("hub.json"), port=0)
+
+    def tearDown(self):
+        self.hub.stop()
+        self.folder.cleanup()
+
+    def file(self, name):
+        return os.path.join(self.folder.name, name)
+
+    def bank(self):
+        journal = Journal(self.file("journal.txt"), self.file("snapshot.txt"), sync_interval=None)
+        journal.load()
+        client = SyncClient(journal, "127.0.0.1", self.hub.port, "kid", self.file("sync.json"), batch_size=1)
+        client.start()
+        return Ledger.from_journal(journal), client
+
+    # waits (a few seconds at most) until the hub has everything the bank sent
+    def wait_for(self, seq):
+        for _ in range(500):
+            if self.hub.devices.get("kid", {}).get("seq") == seq:
+                return
+            time.sleep(0.01)
+        self.fail("the hub never got to seq {}".format(seq))
+
+    def test_bank_started_over(self):
+        ledger, client = self.bank()
+        for _ in range(3):
+            ledger.deposit(100)
+        self.wait_for(3)
+        client.stop()
+        ledger.journal.close()
+
+        for name in ("journal.txt", "snapshot.txt", "smart_bank_balance.txt", "smart_bank_goal.txt"):
+            os.remove(self.file(name))  # the journal starts over, its seqs start at 1 again
+        ledger, client = self.bank()
+        self.assertNotEqual(client.epoch, self.hub.devices["kid"]["epoch"])
+        ledger.deposit(25)
+        self.wait_for(1)
+        client.stop()
+        ledger.journal.close()
+        self.assertEqual(self.hub.totals()[0]["kid"][0], 25)
+        self.assertEqual(self.hub.devices["kid"]["epoch"], client.epoch)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#####################################################################################################################
+# PROJECT NAME: Smart Piggy Bank
+# DESCRIPTION: Checks the coin trace recorder & player. Coins pressed on FakeGPIO (timed by a made-up clock) are
+# recorded, read back and replayed, and have to come out as the same coins the bank counted. A trace cut off part way
+# through a record (the power went out) has to read back up to the last whole record.
+#   python -m unittest discover tests
+#####################################################################################################################
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the folder with smartbank in it
+
+from smartbank import trace
+from smartbank.coin_input import CoinInput, FakeGPIO
+from smartbank.pulse import PulseInput, ACCEPTOR_PIN
+
+PENNY, QUARTER = 24, 25
+
+
+class TraceTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "coins.trace")
+        self.now = 0.0  # the made-up clock, in seconds
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def clock(self):
+        return self.now
+
+    # the records in the trace file, after its header
+    def records(self):
+        with open(self.path, "rb") as f:
+            trace.read_header(f)
+            return list(trace.read_records(f))
+
+    # presses some coins (with bounce) on a recorded CoinInput the way the bank does, and returns what it counted
+    def record_buttons(self):
+        gpio = FakeGPIO()
+        coins = CoinInput(gpio, clock=self.clock)
+        writer = trace.record(coins, self.path)
+        writer.clock = self.clock
+        coins.start()
+        for pin, bounces in ((PENNY, 0), (QUARTER, 2), (PENNY, 1), (QUARTER, 0)):
+            self.now += 0.5
+            gpio.set_level(pin, 1)
+            for _ in range(bounces):  # inside the debounce time, so they aren't coins
+                self.now += 0.001
+                gpio.set_level(pin, 0)
+                self.now += 0.001
+                gpio.set_level(pin, 1)
+            self.now += 0.04
+            gpio.set_level(pin, 0)
+        counted = [coin.value for coin in coins.drain()]
+        coins.stop()  # cleans up the GPIO, which closes the trace
+        self.assertTrue(writer.file.closed)
+        return counted
+
+    def test_record_and_replay_buttons(self):
+        counted = self.record_buttons()
+        self.assertEqual(counted, [1, 25, 1, 25])
+        records = self.records()
+        self.assertEqual([value for when, pin, value in records if pin == trace.COIN], counted)
+        self.assertEqual(len([record for record in records if record[1] != trace.COIN]), 14)  # every edge
+        self.assertAlmostEqual(records[0][0], 0.0)
+        self.assertAlmostEqual(records[-1][0], 1.5 + 0.04 * 4 + 0.002 * 3, places=5)  # made relative to the first
+
+        tally, recorded, count = trace.replay_file(self.path)
+        self.assertEqual(tally, recorded)
+        self.assertEqual((tally.coins, tally.total, count), (4, 52, 14))
+
+    # the acceptor's last coin is only ended once the line goes quiet (by stop() here), and it's recorded then too
+    def test_record_and_replay_acceptor(self):
+        gpio = FakeGPIO()
+        coins = PulseInput(gpio, clock=self.clock, timer=False)
+        writer = trace.record(coins, self.path)
+        writer.clock = self.clock
+        coins.start()
+        for when, pin, level in trace.synthetic_pulses([5, 100, 10]):
+            self.now = when
+            gpio.set_level(pin, level)
+        coins.stop()
+        tally, recorded, count = trace.replay_file(self.path)
+        self.assertEqual(tally, recorded)
+        self.assertEqual(tally.total, 115)
+        with open(self.path, "rb") as f:
+            self.assertEqual(trace.read_header(f)[:2], (True, ACCEPTOR_PIN))
+
+    # a trace cut off part way through a record reads back up to the last whole one, even past the first chunk
+    def test_read_records_truncation(self):
+        values = list(trace.random_values(4000, seed=3))
+        transitions = list(trace.synthetic_presses(values, bounces=1, seed=3))
+        trace.write_synthetic(self.path, values, transitions)
+        whole = self.records()
+        self.assertGreater(len(whole) * trace.RECORD.size, trace.CHUNK)
+        size = os.path.getsize(self.path)
+        for cut in (1, trace.RECORD.size - 1, trace.RECORD.size, trace.RECORD.size + 1):
+            with self.subTest(cut=cut):
+                with open(self.path, "r+b") as f:
+                    f.truncate(size - cut)
+                lost = -(-cut // trace.RECORD.size)  # every record the cut reaches into
+                self.assertEqual(self.records(), whole[:len(whole) - lost])
+        with open(self.path, "r+b") as f:
+            f.truncate(trace.HEADER.size - 1)
+        self.assertRaises(ValueError, trace.replay_file, self.path)
+
+    # gaps longer than a record can hold are made up of GAP records, which aren't read back as transitions
+    def test_long_gap(self):
+        writer = trace.TraceWriter(self.path)
+        writer.write(PENNY, 1, 0.0)
+        writer.write(PENNY, 0, 3 * trace.MAX_DELTA / 1e6)
+        writer.close()
+        self.assertEqual(writer.records, 2)
+        self.assertEqual(self.records(), [(0.0, PENNY, 1), (3 * trace.MAX_DELTA / 1e6, PENNY, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()